@@ -0,0 +1,173 @@
+import csv
+import logging
+import os
+import re
+from FonStorage import file_lock, write_atomic
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.keys'
+
+# Заголовок индекса фиксированной ширины, чтобы обновлять его на месте без перезаписи ключей.
+# Размер и mtime CSV выявляют изменения файла в обход индекса (правка вручную, другой скрипт)
+INDEX_HEADER = '#fon-keys v1 size={size:020d} mtime={mtime:020d} rows={rows:012d}\n'
+INDEX_HEADER_RE = re.compile(r'^#fon-keys v1 size=(\d{20}) mtime=(\d{20}) rows=(\d{12})$')
+
+
+def event_key(row, key_fields=('event_name', 'event_time')):
+    """Ключ события: только название + время (без котировок)"""
+    return '|'.join(row[field] for field in key_fields)
+
+
+class AppendOnlyCsv:
+    """CSV, в который только дописываются строки, с индексом ключей в файле рядом (<csv>.keys).
+
+    Индекс читается один раз на экземпляр; если CSV изменился в обход индекса,
+    индекс перестраивается одним проходом по CSV. Стоимость append зависит
+    от числа новых строк, а не от размера архива.
+    """
+
+    def __init__(self, path, fieldnames, key_fields=('event_name', 'event_time')):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.fieldnames = list(fieldnames)
+        self.key_fields = tuple(key_fields)
+        self.keys = None
+        self.row_count = 0
+        # Размер и mtime CSV, которым соответствуют загруженные ключи
+        self.loaded_stat = None
+
+    def _csv_stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_size, stat.st_mtime_ns
+        except FileNotFoundError:
+            return 0, 0
+
+    def load(self):
+        """Множество ключей существующих строк (из индекса или перестроенное по CSV)"""
+        if self.keys is not None:
+            return self.keys
+
+        size, mtime = self._csv_stat()
+        self.loaded_stat = (size, mtime)
+        if self._read_index(size, mtime):
+            logger.info(f"Индекс {self.index_path}: {len(self.keys)} ключей, строк в {self.path}: {self.row_count}")
+            return self.keys
+
+        self._rebuild_index(size)
+        return self.keys
+
+    def _read_index(self, size, mtime):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                match = INDEX_HEADER_RE.match(f.readline().rstrip('\n'))
+                if not match or int(match.group(1)) != size or int(match.group(2)) != mtime:
+                    logger.info(f"Индекс {self.index_path} устарел, перестраиваем")
+                    return False
+                self.keys = {line.rstrip('\n') for line in f if line.strip()}
+                self.row_count = int(match.group(3))
+                return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать индекс {self.index_path}: {e}")
+            return False
+
+    def _rebuild_index(self, size):
+        keys = set()
+        rows = 0
+        if size:
+            with open(self.path, 'r', encoding='utf-8-sig', newline='') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    rows += 1
+                    keys.add(event_key(row, self.key_fields))
+        self.keys = keys
+        self.row_count = rows
+
+        def write(f):
+            f.write(self._header())
+            for key in keys:
+                f.write(key + '\n')
+
+        write_atomic(self.index_path, write)
+        logger.info(f"Индекс {self.index_path} перестроен: {len(keys)} ключей, строк: {rows}")
+
+    def _header(self):
+        size, mtime = self._csv_stat()
+        return INDEX_HEADER.format(size=size, mtime=mtime, rows=self.row_count)
+
+    def _line_terminator(self):
+        """Разделитель строк существующего файла (новый файл - как у csv по умолчанию)"""
+        try:
+            with open(self.path, 'rb') as f:
+                head = f.read(4096)
+                if b'\r\n' in head:
+                    return '\r\n', True
+                if b'\n' in head:
+                    f.seek(-1, os.SEEK_END)
+                    return '\n', f.read(1) == b'\n'
+                return '\r\n', not head
+        except FileNotFoundError:
+            return '\r\n', True
+
+    def append(self, rows):
+        """Дописать строки с новыми ключами; возвращает список действительно добавленных строк.
+
+        Проверка ключей и дозапись идут под блокировкой файла: второй писатель
+        ждет первого и видит дописанные им ключи.
+        """
+        with file_lock(self.path):
+            # Файл мог дописать другой процесс после того, как ключи были прочитаны
+            if self.keys is not None and self._csv_stat() != self.loaded_stat:
+                self.keys = None
+            return self._append(rows)
+
+    def _append(self, rows):
+        keys = self.load()
+
+        new_rows = []
+        new_keys = {}
+        for row in rows:
+            key = event_key(row, self.key_fields)
+            if key not in keys and key not in new_keys:
+                new_keys[key] = None
+                new_rows.append(row)
+        if not new_rows:
+            return []
+
+        is_new_file = not self._csv_stat()[0]
+        terminator, ends_with_newline = self._line_terminator()
+        try:
+            with open(self.path, 'a', newline='', encoding='utf-8-sig') as csvfile:
+                if not ends_with_newline:
+                    csvfile.write(terminator)
+                writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames, lineterminator=terminator)
+                if is_new_file:
+                    writer.writeheader()
+                writer.writerows(new_rows)
+                csvfile.flush()
+                os.fsync(csvfile.fileno())
+        except Exception:
+            # Файл мог быть дописан частично - при следующем load индекс перестроится по CSV
+            self.keys = None
+            raise
+        keys.update(new_keys)
+        self.row_count += len(new_rows)
+        self.loaded_stat = self._csv_stat()
+
+        # Сначала ключи, затем заголовок: при сбое между ними индекс просто перестроится
+        with open(self.index_path, 'r+' if os.path.exists(self.index_path) else 'w+', encoding='utf-8') as f:
+            f.seek(0, os.SEEK_END)
+            if not f.tell():
+                f.write(self._header())
+            for key in new_keys:
+                f.write(key + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(self._header())
+            f.flush()
+            os.fsync(f.fileno())
+
+        return new_rows
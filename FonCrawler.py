@@ -0,0 +1,132 @@
+import logging
+import os
+import time
+from FonDriverPool import get_driver_pool
+from FonExtract import NETWORK_BACKEND
+from FonLean import enable_request_blocking
+from FonPageReadiness import (probe_page, classify_probe, ODDS_EVENT_SELECTOR, DEFAULT_QUIET_PERIOD,
+                              DEFAULT_TIMEOUT, DEFAULT_POLL_INTERVAL)
+from FonTournaments import get_tournament, load_parser_class, tournament_keys
+
+logger = logging.getLogger(__name__)
+
+# Сколько вкладок одной сессии грузится одновременно
+DEFAULT_MAX_TABS = int(os.environ.get('FONBET_MAX_TABS', 4))
+
+
+def open_tab(driver, url):
+    """Открытие адреса в новой вкладке без ожидания загрузки; возвращает дескриптор вкладки.
+
+    Вкладка открывается пустой: блокировка запросов облегченного режима действует
+    на одну вкладку, и ее нужно включить до начала загрузки страницы.
+    """
+    before = set(driver.window_handles)
+    driver.execute_script("window.open('about:blank', '_blank');")
+    opened = [handle for handle in driver.window_handles if handle not in before]
+    if not opened:
+        raise RuntimeError(f"Не удалось открыть вкладку для {url}")
+    driver.switch_to.window(opened[0])
+    if getattr(driver, 'lean', False):
+        enable_request_blocking(driver)
+    driver.execute_script("window.location.href = arguments[0];", url)
+    return opened[0]
+
+
+def parse_tab(driver, key, backend=None, quiet_period=DEFAULT_QUIET_PERIOD, save=True):
+    """Разбор текущей вкладки парсером турнира; возвращает (событий, новых)"""
+    tournament = get_tournament(key)
+    parser_class = load_parser_class(tournament['odds_parser'])
+    parser = parser_class(driver=driver, backend=backend, quiet_period=quiet_period, tournament=key)
+
+    # Сбор событий при прокрутке выполняет сам parse_all_events
+    events_data = parser.parse_all_events()
+    new_events = 0
+    if save and events_data:
+        _, new_events = parser.save_to_csv(events_data)
+    return len(events_data), new_events
+
+
+def crawl_tournaments(keys=None, driver=None, headless=True, max_tabs=DEFAULT_MAX_TABS, backend=None,
+                      save=True, quiet_period=DEFAULT_QUIET_PERIOD, timeout=DEFAULT_TIMEOUT,
+                      poll_interval=DEFAULT_POLL_INTERVAL):
+    """Обход страниц линии турниров в параллельных вкладках одной сессии браузера.
+
+    Вкладки грузятся одновременно, каждая разбирается, как только на ней появились
+    события и DOM затих. Возвращает {турнир: {'events', 'new', 'state', 'ready_after', 'parse_time'}}.
+    """
+    if backend == NETWORK_BACKEND:
+        # Журнал производительности общий для всех вкладок сессии
+        raise ValueError("Бэкенд network не поддерживается при обходе во вкладках")
+
+    pending = list(keys or tournament_keys())
+    for key in pending:
+        get_tournament(key)
+
+    own_driver = driver is None
+    if own_driver:
+        driver = get_driver_pool(headless).acquire()
+
+    home = driver.current_window_handle
+    open_tabs = {}
+    results = {}
+    started = time.monotonic()
+
+    try:
+        while pending or open_tabs:
+            while pending and len(open_tabs) < max(1, max_tabs):
+                key = pending.pop(0)
+                url = get_tournament(key)['odds_url']
+                handle = open_tab(driver, url)
+                open_tabs[handle] = (key, time.monotonic())
+                logger.info(f"Вкладка {key}: {url}")
+
+            finished = 0
+            for handle, (key, opened) in list(open_tabs.items()):
+                driver.switch_to.window(handle)
+                state = classify_probe(probe_page(driver, ODDS_EVENT_SELECTOR), ODDS_EVENT_SELECTOR, quiet_period)
+                ready_after = time.monotonic() - opened
+                if state is None and ready_after < timeout:
+                    continue
+
+                parse_started = time.monotonic()
+                try:
+                    events, new_events = parse_tab(driver, key, backend, quiet_period, save)
+                except Exception as e:
+                    logger.error(f"Ошибка при разборе вкладки {key}: {e}")
+                    events, new_events, state = 0, 0, 'error'
+                results[key] = {
+                    'events': events,
+                    'new': new_events,
+                    'state': state or 'timeout',
+                    'ready_after': ready_after,
+                    'parse_time': time.monotonic() - parse_started,
+                }
+                logger.info(f"Турнир {key}: событий {events}, новых {new_events} "
+                            f"(готовность {ready_after:.2f} с, разбор {results[key]['parse_time']:.2f} с)")
+
+                driver.close()
+                del open_tabs[handle]
+                driver.switch_to.window(home)
+                finished += 1
+
+            if open_tabs and not finished:
+                time.sleep(poll_interval)
+
+    finally:
+        for handle in list(open_tabs):
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception as e:
+                logger.debug(f"Не удалось закрыть вкладку: {e}")
+        try:
+            driver.switch_to.window(home)
+        except Exception as e:
+            logger.debug(f"Не удалось вернуться на исходную вкладку: {e}")
+        if own_driver:
+            driver.quit()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Обход турниров завершен за {elapsed:.2f} с: {len(results)} турниров, "
+                f"событий {sum(r['events'] for r in results.values())}")
+    return results
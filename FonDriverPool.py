@@ -0,0 +1,285 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+from FonLean import DEFAULT_LEAN, NavigationBaseline, apply_lean_prefs, enable_request_blocking, report_navigation
+from FonProfile import DEFAULT_PROFILE, apply_profile, claim_profile_dir, release_profile_dir
+
+logger = logging.getLogger(__name__)
+
+# Размер пула и количество страниц до пересоздания сессии можно переопределить через окружение
+DEFAULT_POOL_SIZE = int(os.environ.get('FONBET_POOL_SIZE', 2))
+DEFAULT_MAX_PAGES = int(os.environ.get('FONBET_POOL_MAX_PAGES', 50))
+DEFAULT_ACQUIRE_TIMEOUT = 300
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+
+def build_chrome_options(headless=False, network_capture=False, lean=DEFAULT_LEAN, profile_dir=None):
+    """Общие настройки Chrome для всех парсеров"""
+    options = Options()
+    if profile_dir:
+        # Постоянный профиль: cookies согласия и дисковый кеш сохраняются между запусками
+        apply_profile(options, profile_dir)
+    if lean:
+        # Облегченный профиль: без картинок и уведомлений (шрифты и счетчики блокируются через CDP)
+        apply_lean_prefs(options)
+    if network_capture:
+        # Журнал производительности DevTools для перехвата ответов линии (FonNetwork)
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    if headless:
+        options.add_argument('--headless')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument(f'--user-agent={USER_AGENT}')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1920,1080')
+    return options
+
+
+@lru_cache(maxsize=None)
+def get_chromedriver_path():
+    """Путь к chromedriver (ChromeDriverManager вызывается один раз на процесс)"""
+    return ChromeDriverManager().install()
+
+
+def create_driver(headless=False, network_capture=False, lean=DEFAULT_LEAN, profile_dir=None):
+    """Холодный старт нового экземпляра Chrome"""
+    service = webdriver.chrome.service.Service(get_chromedriver_path())
+    options = build_chrome_options(headless, network_capture, lean, profile_dir)
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    if lean:
+        enable_request_blocking(driver)
+    return driver
+
+
+class PooledDriver:
+    """Сессия браузера, выданная пулом.
+
+    Ведет себя как обычный WebDriver, но quit() возвращает сессию в пул,
+    а не закрывает браузер. Каждый вызов get() учитывается для пересоздания
+    сессии после max_pages страниц.
+    """
+
+    def __init__(self, pool, driver, profile_dir=None):
+        self._pool = pool
+        self._driver = driver
+        self.profile_dir = profile_dir
+        self.pages = 0
+        self.leased = False
+        # Замер последней навигации (байты, время загрузки, экономия облегченного режима)
+        self.last_navigation = {}
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    @property
+    def lean(self):
+        """Облегченный режим пула (блокировку запросов новых вкладок включает FonCrawler.open_tab)"""
+        return self._pool.lean
+
+    def get(self, url):
+        self.pages += 1
+        result = self._driver.get(url)
+        self.last_navigation = report_navigation(self._driver, url, self._pool.lean, self._pool.baseline)
+        return result
+
+    def quit(self):
+        """Возврат сессии в пул"""
+        self._pool.release(self)
+
+    def is_alive(self):
+        """Проверка, что браузер еще отвечает"""
+        try:
+            self._driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def reset(self):
+        """Закрытие лишних вкладок, чтобы следующий арендатор получил чистую сессию"""
+        handles = self._driver.window_handles
+        for handle in handles[1:]:
+            self._driver.switch_to.window(handle)
+            self._driver.close()
+        self._driver.switch_to.window(handles[0])
+
+    def close_browser(self):
+        """Настоящее закрытие браузера"""
+        try:
+            self._driver.quit()
+        except Exception as e:
+            logger.debug(f"Ошибка при закрытии браузера: {e}")
+        if self.profile_dir:
+            release_profile_dir(self.profile_dir)
+
+
+class DriverPool:
+    """Пул из N прогретых сессий Chrome с проверкой здоровья и пересозданием после K страниц"""
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_pages=DEFAULT_MAX_PAGES, headless=False, network_capture=False,
+                 lean=DEFAULT_LEAN, profile=DEFAULT_PROFILE):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.headless = headless
+        self.network_capture = network_capture
+        self.lean = lean
+        self.profile = profile
+        # Свободные сессии (последняя возвращенная выдается первой) и счетчик запущенных браузеров;
+        # _available будит ожидающих аренды при возврате сессии и при освобождении места в пуле
+        self._idle = []
+        self._created = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._closed = False
+        # Базовые замеры облегченного режима, общие для всех сессий пула
+        self.baseline = NavigationBaseline()
+
+    def _new_session(self):
+        # Каждой сессии - свой постоянный профиль: один каталог не может открыть два Chrome
+        profile_dir = claim_profile_dir() if self.profile else None
+        try:
+            driver = create_driver(self.headless, self.network_capture, self.lean, profile_dir)
+        except Exception:
+            if profile_dir:
+                release_profile_dir(profile_dir)
+            raise
+        logger.info(f"Пул WebDriver: запущен новый браузер (headless={self.headless}, lean={self.lean}, "
+                    f"профиль={profile_dir or 'временный'})")
+        return PooledDriver(self, driver, profile_dir)
+
+    def warm(self, count=None):
+        """Заранее запустить браузеры, чтобы первые аренды не платили за холодный старт"""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    break
+                self._created += 1
+            try:
+                session = self._new_session()
+            except Exception:
+                self._forget_slot()
+                raise
+            self._put_idle(session)
+
+    def acquire(self, timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        """Аренда сессии: свободная из пула, новая (если лимит не исчерпан) или ожидание освобождения"""
+        deadline = time.monotonic() + timeout
+        while True:
+            session = None
+            with self._available:
+                # Ждем, пока вернут сессию или освободится место (сессию пересоздали или закрыли)
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Пул WebDriver уже закрыт")
+                    if self._idle:
+                        session = self._idle.pop()
+                        break
+                    if self._created < self.size:
+                        self._created += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Пул WebDriver: за {timeout} с не освободилась ни одна сессия "
+                                           f"(размер пула {self.size}, задается FONBET_POOL_SIZE)")
+                    self._available.wait(remaining)
+
+            if session is None:
+                try:
+                    session = self._new_session()
+                except Exception:
+                    self._forget_slot()
+                    raise
+
+            if session.is_alive():
+                session.leased = True
+                return session
+
+            logger.warning("Пул WebDriver: сессия не отвечает, пересоздаем")
+            self._discard(session)
+
+    def release(self, session):
+        """Возврат сессии в пул (или ее пересоздание после max_pages страниц)"""
+        if not session.leased:
+            return
+        session.leased = False
+
+        if self._closed:
+            self._discard(session)
+            return
+
+        if self.max_pages and session.pages >= self.max_pages:
+            logger.info(f"Пул WebDriver: сессия отработала {session.pages} страниц, пересоздаем")
+            self._discard(session)
+            return
+
+        try:
+            session.reset()
+        except Exception as e:
+            logger.warning(f"Пул WebDriver: не удалось очистить сессию ({e}), пересоздаем")
+            self._discard(session)
+            return
+
+        self._put_idle(session)
+
+    def _put_idle(self, session):
+        with self._available:
+            self._idle.append(session)
+            self._available.notify()
+
+    def _forget_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _discard(self, session):
+        session.close_browser()
+        self._forget_slot()
+
+    def close(self):
+        """Закрытие всех свободных браузеров пула"""
+        with self._available:
+            self._closed = True
+            sessions, self._idle = self._idle, []
+            # Ожидающие аренды получат RuntimeError вместо таймаута
+            self._available.notify_all()
+        for session in sessions:
+            self._discard(session)
+        self.baseline.save()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_driver_pool(headless=False, network_capture=False, lean=DEFAULT_LEAN):
+    """Общий на процесс пул (отдельный для видимого и headless режима, перехвата сети и облегченного профиля)"""
+    key = (headless, network_capture, lean)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = DriverPool(headless=headless, network_capture=network_capture, lean=lean)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_all_pools)
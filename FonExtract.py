@@ -0,0 +1,251 @@
+import logging
+import os
+import soupsieve as sv
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# Построители дерева BeautifulSoup. lxml (есть в requirements) заметно быстрее html.parser,
+# html.parser остается запасным вариантом, если lxml не установлен
+HTML_BACKENDS = ('lxml', 'html.parser')
+
+# Извлечение скриптом внутри страницы (FonScriptExtract): в Python приходит компактный JSON,
+# а готовый HTML (офлайн-воспроизведение, фрагменты результатов) разбирается построителем по умолчанию
+SCRIPT_BACKEND = 'script'
+# Котировки из перехваченных JSON-ответов линии (FonNetwork), HTML - только запасной путь
+NETWORK_BACKEND = 'network'
+EXTRACTION_BACKENDS = HTML_BACKENDS + (SCRIPT_BACKEND, NETWORK_BACKEND)
+
+try:
+    import lxml  # noqa: F401
+    _LXML_AVAILABLE = True
+except ImportError:
+    _LXML_AVAILABLE = False
+
+DEFAULT_BACKEND = os.environ.get('FONBET_HTML_BACKEND') or ('lxml' if _LXML_AVAILABLE else 'html.parser')
+
+
+def resolve_backend(backend=None):
+    """Проверка имени бэкенда извлечения с откатом на html.parser"""
+    backend = backend or DEFAULT_BACKEND
+    if backend not in EXTRACTION_BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд извлечения: {backend}")
+    if backend == 'lxml' and not _LXML_AVAILABLE:
+        logger.warning("lxml не установлен, используется html.parser")
+        return 'html.parser'
+    return backend
+
+
+def tree_builder(backend=None):
+    """Построитель дерева BeautifulSoup для бэкенда извлечения"""
+    backend = resolve_backend(backend)
+    if backend not in HTML_BACKENDS:
+        return 'lxml' if _LXML_AVAILABLE else 'html.parser'
+    return backend
+
+
+def make_soup(page_source, backend=None):
+    """Построение дерева страницы выбранным бэкендом"""
+    return BeautifulSoup(page_source, tree_builder(backend))
+
+
+def compile_selectors(selectors):
+    """Компиляция CSS-селекторов один раз на процесс: список (строка, скомпилированный селектор)"""
+    return [(selector, sv.compile(selector)) for selector in selectors]
+
+
+def select_first_text(element, compiled_selectors):
+    """Текст первого непустого элемента по списку селекторов (в порядке приоритета)"""
+    for _, selector in compiled_selectors:
+        found = selector.select_one(element)
+        if found:
+            text = found.text.strip()
+            if text:
+                return text
+    return None
+
+
+# --- Страница линии (котировки) ---
+
+ODDS_EVENT_SELECTORS = compile_selectors([
+    '[class*="sport-base-event"]',
+    '[class*="sport-event"]',
+    '[class*="event-block"]',
+    '.sport-base-event--W4qkO'
+])
+
+EVENT_NAME_SELECTORS = compile_selectors([
+    'a[class*="sport-event__name"]',
+    'div[class*="event-name"]',
+    'span[class*="event-name"]'
+])
+
+EVENT_TIME_SELECTORS = compile_selectors([
+    'span[class*="event-block-planned-time"]',
+    'span[class*="time"]',
+    'div[class*="time"]'
+])
+
+# Классы ячеек коэффициентов внутри блока события
+FACTOR_CELL_CLASS = 'factor-value--zrkpK'
+COMPLEX_CELL_CLASS = 'table-component-factor-value_complex'
+PARAM_CELL_CLASS = 'table-component-factor-value_param'
+VALUE_CLASS = 'value--OUKql'
+PARAM_CLASS = 'param--qbIN_'
+
+# Рынки в порядке колонок CSV
+MARKET_FIELDS = [
+    'odds_1', 'odds_x', 'odds_2',
+    'odds_1x', 'odds_12', 'odds_x2',
+    'fora_1', 'fora_2',
+    'total_value', 'total_over', 'total_under'
+]
+
+
+def read_factor_cells(event_element):
+    """Однократный обход блока события.
+
+    Возвращает (cells, values): ячейки коэффициентов в порядке документа
+    и тексты всех значений коэффициентов. Для ячейки запоминается первый
+    вложенный параметр и первое вложенное значение (None, если их нет).
+    """
+    cells = []
+    values = []
+    cells_by_element = {}
+
+    for tag in event_element.find_all(['div', 'span']):
+        classes = tag.get('class') or ()
+
+        if tag.name == 'div':
+            is_factor = FACTOR_CELL_CLASS in classes
+            is_complex = COMPLEX_CELL_CLASS in classes
+            is_param = PARAM_CELL_CLASS in classes
+            if is_factor or is_complex or is_param:
+                cell = {'factor': is_factor, 'complex': is_complex, 'param_cell': is_param,
+                        'param': None, 'value': None}
+                cells.append(cell)
+                cells_by_element[id(tag)] = cell
+            continue
+
+        if VALUE_CLASS in classes:
+            key = 'value'
+        elif PARAM_CLASS in classes:
+            key = 'param'
+        else:
+            continue
+
+        text = tag.text
+        if key == 'value':
+            values.append(text.strip())
+
+        # Глубина вложенности ограничена, поэтому подъем к ячейкам-предкам не портит линейность
+        for parent in tag.parents:
+            if parent is event_element:
+                break
+            cell = cells_by_element.get(id(parent))
+            if cell is not None and cell[key] is None:
+                cell[key] = text
+
+    return cells, values
+
+
+def assign_markets(cells, values, clean):
+    """Раскладка ячеек по рынкам 1X2, двойной шанс, форы и тотал по позиции и типу ячейки"""
+    # Основные котировки (1, X, 2) - первые три значения
+    main_odds = values[:3] if len(values) >= 3 else ["", "", ""]
+
+    # Двойные шансы (1X, 12, X2) - следующие три значения
+    double_chance_odds = values[3:6] if len(values) >= 6 else ["", "", ""]
+
+    # Форы - первые две комплексные ячейки с параметром и значением
+    fora = ["", ""]
+    complex_cells = [cell for cell in cells if cell['complex']]
+    for i, cell in enumerate(complex_cells[:2]):
+        if cell['param'] is not None and cell['value'] is not None:
+            fora[i] = f"{clean(cell['param'])} {cell['value'].strip()}"
+
+    # Тотал - ячейка с параметром, следующие две ячейки коэффициентов - Over и Under
+    total_value = ""
+    total_over = ""
+    total_under = ""
+    factor_cells = [cell for cell in cells if cell['factor']]
+    factor_positions = {id(cell): idx for idx, cell in enumerate(factor_cells)}
+    for cell in cells:
+        if not cell['param_cell'] or cell['param'] is None:
+            continue
+        total_value = clean(cell['param'])
+
+        idx = factor_positions.get(id(cell))
+        if idx is None:
+            continue
+        if idx + 1 < len(factor_cells) and factor_cells[idx + 1]['value'] is not None:
+            total_over = factor_cells[idx + 1]['value'].strip()
+        if idx + 2 < len(factor_cells) and factor_cells[idx + 2]['value'] is not None:
+            total_under = factor_cells[idx + 2]['value'].strip()
+
+    # АЛЬТЕРНАТИВНЫЙ МЕТОД: поиск по позиции после двойных шансов
+    if not fora[0] and not fora[1] and len(values) >= 9:
+        # Позиции 6-7 могут быть форами, 8-10 - тоталы
+        fora = [values[6], values[7]]
+        total_value = "5.5"  # Стандартное значение для хоккея
+        total_over = values[8]
+        if len(values) > 9:
+            total_under = values[9]
+
+    return {
+        'odds_1': main_odds[0],
+        'odds_x': main_odds[1],
+        'odds_2': main_odds[2],
+        'odds_1x': double_chance_odds[0],
+        'odds_12': double_chance_odds[1],
+        'odds_x2': double_chance_odds[2],
+        'fora_1': fora[0],
+        'fora_2': fora[1],
+        'total_value': total_value,
+        'total_over': total_over,
+        'total_under': total_under
+    }
+
+
+# --- Страница результатов ---
+
+RESULTS_EVENT = sv.compile('div.results-event--Me6XJ')
+
+TEAM_NAME_SELECTORS = compile_selectors([
+    'div.results-event-team__name--lRkNU div.overflowed-text--JHSWr',
+    'div.results-event-team__caption--Ra_Se',
+    'div[class*="event-team__name"]'
+])
+
+SCORE_SELECTORS = compile_selectors([
+    'div.results-scoreBlock__score--XvlMM._summary--Jt8Ej._bold--JaGTY',
+    'div[class*="scoreBlock__score"][class*="_summary"]',
+    'div.results-scoreBlock__score--XvlMM'
+])
+
+OVERTIME_BLOCK = sv.compile('div.results-scoreBlock--aHrej.results-scoreBoard__sum-subEvents--_LZ3a')
+SCORE_BLOCK = sv.compile('div.results-scoreBlock--aHrej')
+SCORE_CELL = sv.compile('div.results-scoreBlock__score--XvlMM')
+SUMMARY_SCORE_CELL = sv.compile('div.results-scoreBlock__score--XvlMM._summary--Jt8Ej')
+
+
+def select_team_names(event_element):
+    """Названия двух команд блока результата (пустой список, если не найдены)"""
+    for _, selector in TEAM_NAME_SELECTORS:
+        name_elements = selector.select(event_element)
+        if name_elements and len(name_elements) >= 2:
+            return [elem.get_text(strip=True) for elem in name_elements[:2]]
+    return []
+
+
+def select_final_scores(event_element):
+    """Последние две ячейки счета по списку селекторов (как их отдает страница, без проверки)"""
+    final_scores = []
+    for _, selector in SCORE_SELECTORS:
+        score_elements = selector.select(event_element)
+        if score_elements and len(score_elements) >= 2:
+            # Берем последние два элемента (финальный счет)
+            final_scores = [elem.get_text(strip=True) for elem in score_elements[-2:]]
+            if all(score.isdigit() for score in final_scores):
+                break
+    return final_scores
@@ -0,0 +1,105 @@
+import difflib
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from FonTeams import LOOKALIKES
+
+# "(победитель)" в ключах матчей с овертаймом/буллитами
+WINNER_SUFFIX_RE = re.compile(r'\s*\([^()]*\)\s*$')
+
+# Порог похожести difflib, как в прежнем find_best_match
+DEFAULT_THRESHOLD = 0.7
+# Сколько кандидатов с наибольшим числом общих триграмм сравниваются через difflib
+DEFAULT_TOP_K = 5
+
+
+@lru_cache(maxsize=16384)
+def fold_name(name):
+    """Нижний регистр, латинские двойники -> кириллица, схлопнутые пробелы"""
+    return ' '.join(name.lower().translate(LOOKALIKES).split())
+
+
+@lru_cache(maxsize=16384)
+def base_name(name):
+    """Нормализованное название без "(победитель)": "A — B (A)" и "A — B" дают одну форму"""
+    return fold_name(WINNER_SUFFIX_RE.sub('', name))
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramMatcher:
+    """Нечеткий поиск названия события среди кандидатов через индекс триграмм.
+
+    Кандидаты нормализуются один раз; варианты с "(победитель)" сводятся к базовой
+    форме и не удваивают индекс, а "A — B" находит "A — B (A)" точным совпадением.
+    difflib считается только для top_k кандидатов с наибольшим числом общих триграмм.
+    SequenceMatcher кандидата создается один раз: разбор второй строки (самая дорогая
+    часть difflib) переиспользуется всеми поисками по этому индексу.
+    """
+
+    def __init__(self, candidates):
+        self.forms = []
+        # исходное название -> SequenceMatcher с нормализованным названием в seq2
+        self.sequences = {}
+        self._lock = threading.Lock()
+        # базовая форма -> исходные названия в порядке появления
+        self.originals = {}
+        self.index = {}
+        for candidate in candidates:
+            form = base_name(candidate)
+            if form not in self.originals:
+                self.originals[form] = []
+                form_id = len(self.forms)
+                self.forms.append(form)
+                for gram in trigrams(form):
+                    self.index.setdefault(gram, []).append(form_id)
+            self.originals[form].append(candidate)
+
+    def shortlist(self, form, top_k=DEFAULT_TOP_K):
+        shared = Counter()
+        for gram in trigrams(form):
+            shared.update(self.index.get(gram, ()))
+        return [self.forms[form_id] for form_id, _ in shared.most_common(top_k)]
+
+    def _sequence(self, candidate):
+        sequence = self.sequences.get(candidate)
+        if sequence is None:
+            sequence = self.sequences[candidate] = difflib.SequenceMatcher(None, b=fold_name(candidate))
+        return sequence
+
+    def best_match(self, event_name, threshold=DEFAULT_THRESHOLD, top_k=DEFAULT_TOP_K):
+        """Исходное название кандидата, наиболее похожего на event_name, или None"""
+        form = base_name(event_name)
+        if form in self.originals:
+            return self.originals[form][0]
+
+        # Похожесть считается по полным названиям, как раньше, чтобы порог не сдвигался
+        query = fold_name(event_name)
+        best_match = None
+        best_ratio = 0
+        shortlist = self.shortlist(form, top_k)
+        # Индекс из get_matcher общий на процесс, а set_seq1 меняет SequenceMatcher кандидата
+        with self._lock:
+            for candidate_form in shortlist:
+                for candidate in self.originals[candidate_form]:
+                    sequence = self._sequence(candidate)
+                    sequence.set_seq1(query)
+                    ratio = sequence.ratio()
+                    if ratio > best_ratio and ratio > threshold:
+                        best_ratio = ratio
+                        best_match = candidate
+        return best_match
+
+
+@lru_cache(maxsize=64)
+def _matcher(candidates):
+    return TrigramMatcher(candidates)
+
+
+def get_matcher(candidates):
+    """Индекс для набора кандидатов (повторные поиски по той же дате используют готовый индекс)"""
+    return _matcher(tuple(candidates))
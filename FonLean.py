@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+from FonStorage import file_lock, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Облегченный профиль включен по умолчанию; FONBET_LEAN=0 возвращает полную загрузку страниц
+DEFAULT_LEAN = os.environ.get('FONBET_LEAN', '1') not in ('0', 'false', 'no')
+
+# Блокируемые на уровне браузера ресурсы: картинки, шрифты, видео, счетчики и реклама
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*mc.yandex.ru*', '*top-fwz1.mail.ru*', '*connect.facebook.net*', '*vk.com/rtrg*',
+    '*hotjar.com*', '*criteo.com*', '*adfox.ru*',
+]
+
+
+def _env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+def blocked_url_patterns(allowlist=None, extra=None):
+    """Итоговый список шаблонов блокировки.
+
+    allowlist - шаблоны, которые не блокировать (например, '*.svg', если понадобятся иконки),
+    extra - дополнительные шаблоны. По умолчанию берутся из FONBET_LEAN_ALLOW и FONBET_LEAN_BLOCK.
+    """
+    allowlist = set(_env_list('FONBET_LEAN_ALLOW') if allowlist is None else allowlist)
+    extra = _env_list('FONBET_LEAN_BLOCK') if extra is None else extra
+    patterns = [pattern for pattern in BLOCKED_URL_PATTERNS + list(extra) if pattern not in allowlist]
+    return list(dict.fromkeys(patterns))
+
+
+def apply_lean_prefs(options):
+    """Настройки Chrome без загрузки картинок и уведомлений"""
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    })
+    return options
+
+
+def enable_request_blocking(driver, patterns=None):
+    """Блокировка запросов по шаблонам через CDP.
+
+    Network.setBlockedURLs действует на текущую вкладку (все ее навигации):
+    для вкладок, открытых через window.open, блокировку нужно включать отдельно.
+    """
+    patterns = blocked_url_patterns() if patterns is None else patterns
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        logger.info(f"Облегченный режим: блокируется шаблонов {len(patterns)}")
+        return True
+    except Exception as e:
+        logger.warning(f"Не удалось включить блокировку запросов: {e}")
+        return False
+
+
+# --- Статистика навигаций ---
+
+# Базовые замеры без облегченного режима по адресам страниц
+BASELINE_FILE = os.environ.get('FONBET_LEAN_BASELINE', 'lean_baseline.json')
+
+NAVIGATION_STATS_JS = """
+var nav = performance.getEntriesByType('navigation')[0];
+var resources = performance.getEntriesByType('resource');
+var bytes = nav ? (nav.transferSize || 0) : 0;
+for (var i = 0; i < resources.length; i++) {
+    bytes += resources[i].transferSize || 0;
+}
+return {
+    bytes: bytes,
+    requests: resources.length + 1,
+    load_ms: nav ? nav.loadEventEnd - nav.startTime : 0,
+    dom_ms: nav ? nav.domContentLoadedEventEnd - nav.startTime : 0
+};
+"""
+
+def _baseline_key(url):
+    return url.split('?', 1)[0]
+
+
+def load_baseline(path=BASELINE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать базовые замеры {path}: {e}")
+        return {}
+
+
+def collect_navigation_stats(driver):
+    """Байты, число запросов и время загрузки последней навигации по Performance API"""
+    try:
+        return driver.execute_script(NAVIGATION_STATS_JS) or {}
+    except Exception as e:
+        logger.debug(f"Не удалось получить статистику навигации: {e}")
+        return {}
+
+
+class NavigationBaseline:
+    """Базовые замеры пула: файл читается один раз, новые замеры копятся в памяти
+    и записываются в save() (при закрытии пула), только если что-то изменилось."""
+
+    def __init__(self, path=BASELINE_FILE):
+        self.path = path
+        self._data = None
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def _loaded(self):
+        if self._data is None:
+            self._data = load_baseline(self.path)
+        return self._data
+
+    def get(self, key):
+        with self._lock:
+            return self._loaded().get(key)
+
+    def record(self, key, stats):
+        with self._lock:
+            data = self._loaded()
+            if data.get(key) != stats:
+                data[key] = stats
+                self._changed.add(key)
+
+    def save(self):
+        """Запись измененных замеров поверх файла (его могли обновить другие процессы)"""
+        with self._lock:
+            if not self._changed:
+                return
+            try:
+                with file_lock(self.path):
+                    merged = load_baseline(self.path)
+                    merged.update({key: self._data[key] for key in self._changed})
+                    write_atomic(self.path, lambda f: json.dump(merged, f, ensure_ascii=False, indent=2))
+                self._changed.clear()
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить базовые замеры {self.path}: {e}")
+
+
+def report_navigation(driver, url, lean, baseline):
+    """Замер навигации: без облегченного режима обновляет базу, в облегченном - считает экономию.
+
+    baseline - NavigationBaseline пула. Возвращает словарь замера (для облегченного
+    режима с полями saved_bytes и saved_ms, если есть база).
+    """
+    stats = collect_navigation_stats(driver)
+    if not stats:
+        return stats
+
+    key = _baseline_key(url)
+    if not lean:
+        baseline.record(key, stats)
+        logger.info(f"Навигация {key}: {stats['bytes'] / 1024:.0f} KB, запросов {stats['requests']}, "
+                    f"загрузка {stats['load_ms']:.0f} мс (базовый замер)")
+        return stats
+
+    reference = baseline.get(key)
+    if reference:
+        stats['saved_bytes'] = reference['bytes'] - stats['bytes']
+        stats['saved_ms'] = reference['load_ms'] - stats['load_ms']
+        logger.info(f"Навигация {key}: {stats['bytes'] / 1024:.0f} KB, загрузка {stats['load_ms']:.0f} мс; "
+                    f"экономия {stats['saved_bytes'] / 1024:.0f} KB и {stats['saved_ms']:.0f} мс "
+                    f"относительно полного профиля")
+    else:
+        logger.info(f"Навигация {key}: {stats['bytes'] / 1024:.0f} KB, запросов {stats['requests']}, "
+                    f"загрузка {stats['load_ms']:.0f} мс (базового замера нет, FONBET_LEAN=0 для записи)")
+    return stats
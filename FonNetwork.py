@@ -0,0 +1,221 @@
+import base64
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Ответы линии fon.bet: полный пакет events/list и последующие дельты с тем же форматом
+LINE_URL_MARKERS = ('/events/list', '/events/listBase')
+
+# Коды исходов в customFactors
+FACTOR_1 = 921
+FACTOR_X = 922
+FACTOR_2 = 923
+FACTOR_1X = 924
+FACTOR_12 = 1571
+FACTOR_X2 = 925
+FACTOR_FORA_1 = 927
+FACTOR_FORA_2 = 928
+FACTOR_TOTAL_OVER = 930
+FACTOR_TOTAL_UNDER = 931
+
+_SIMPLE_FACTORS = {
+    FACTOR_1: 'odds_1',
+    FACTOR_X: 'odds_x',
+    FACTOR_2: 'odds_2',
+    FACTOR_1X: 'odds_1x',
+    FACTOR_12: 'odds_12',
+    FACTOR_X2: 'odds_x2',
+}
+
+
+def is_line_response(url, mime_type=''):
+    """Похож ли ответ на пакет линии (JSON events/list)"""
+    return 'json' in (mime_type or 'json') and any(marker in url for marker in LINE_URL_MARKERS)
+
+
+def drain_performance_log(driver):
+    """Чтение и сброс накопленного журнала производительности (перед новой навигацией)"""
+    try:
+        return driver.get_log('performance')
+    except Exception as e:
+        logger.debug(f"Журнал производительности недоступен: {e}")
+        return []
+
+
+def capture_line_payloads(driver):
+    """Тела ответов линии из журнала производительности Chrome в порядке получения.
+
+    Требует сессию с goog:loggingPrefs {'performance': 'ALL'} (см. FonDriverPool).
+    """
+    request_ids = []
+    for entry in drain_performance_log(driver):
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        if message.get('method') != 'Network.responseReceived':
+            continue
+        params = message.get('params', {})
+        response = params.get('response', {})
+        if is_line_response(response.get('url', ''), response.get('mimeType', '')):
+            request_ids.append((params.get('requestId'), response.get('url', '')))
+
+    payloads = []
+    for request_id, url in request_ids:
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception as e:
+            # Тело могло быть уже вытеснено из буфера DevTools
+            logger.debug(f"Не удалось получить тело ответа {url}: {e}")
+            continue
+        text = body.get('body', '')
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8')
+        payloads.append(text)
+
+    logger.info(f"Перехвачено ответов линии: {len(payloads)}")
+    return payloads
+
+
+def dump_line_payloads(payloads):
+    """Снимок ответов линии в формате JSON Lines: по ответу на строку.
+
+    Тело, которое не разбирается как JSON, пропускается и не делает нечитаемым весь снимок.
+    """
+    lines = []
+    for payload in payloads:
+        try:
+            data = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+        except ValueError:
+            logger.debug("Ответ линии не является JSON, в снимок не записываем")
+            continue
+        lines.append(json.dumps(data, ensure_ascii=False))
+    return ''.join(line + '\n' for line in lines)
+
+
+def load_line_payloads(text):
+    """Ответы линии из снимка: JSON Lines или прежний формат (один JSON-массив)"""
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, list) else [data]
+    except ValueError:
+        pass
+
+    payloads = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            payloads.append(json.loads(line))
+        except ValueError:
+            logger.warning(f"Строка {number} снимка ответов линии не является JSON, пропускаем")
+    return payloads
+
+
+def _format_odds(value):
+    if value is None or value == '':
+        return ""
+    try:
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _factor_param(factor):
+    """Параметр форы/тотала: строка pt или p в сотых долях"""
+    if factor.get('pt') not in (None, ''):
+        return str(factor['pt'])
+    if factor.get('p') is not None:
+        value = factor['p'] / 100
+        return f"{value:+g}" if factor['f'] in (FACTOR_FORA_1, FACTOR_FORA_2) else f"{value:g}"
+    return ""
+
+
+def merge_line_payloads(payloads):
+    """Сведение полного пакета и дельт: события по id, коэффициенты по (событие, код исхода).
+
+    Возвращает (события по id в порядке появления, коэффициенты события по коду, сегменты по id).
+    """
+    events = {}
+    factors = {}
+    segments = {}
+    pending = list(payloads)
+    while pending:
+        payload = pending.pop(0)
+        if isinstance(payload, (str, bytes)):
+            try:
+                payload = json.loads(payload)
+            except ValueError:
+                logger.debug("Ответ линии не является JSON, пропускаем")
+                continue
+        if isinstance(payload, list):
+            # Снимок с несколькими ответами одной страницы (см. save_snapshot в парсерах)
+            pending[:0] = payload
+            continue
+        if not isinstance(payload, dict):
+            continue
+
+        for sport in payload.get('sports') or []:
+            segments[sport.get('id')] = sport
+        for event in payload.get('events') or []:
+            events.setdefault(event.get('id'), {}).update(event)
+        for custom in payload.get('customFactors') or []:
+            event_factors = factors.setdefault(custom.get('e'), {})
+            for factor in custom.get('factors') or []:
+                if factor.get('f') is not None:
+                    event_factors[factor['f']] = factor
+
+    return events, factors, segments
+
+
+def decode_line_payload(payloads, tournament_ids=None, parse_timestamp=None):
+    """Строки событий в формате save_to_csv из JSON-ответов линии.
+
+    payloads - один ответ или список (полный пакет и дельты; строки JSON или словари).
+    tournament_ids - id сегментов турнира; если ни одно событие к ним не относится,
+    возвращаются все матчи (дальше их отфильтрует парсер по командам).
+    """
+    if isinstance(payloads, (str, bytes, dict)):
+        payloads = [payloads]
+    events, factors, segments = merge_line_payloads(payloads)
+
+    # Только матчи верхнего уровня: у периодов и спецставок есть parentId
+    matches = [event for event in events.values()
+               if event.get('team1') and event.get('team2') and not event.get('parentId')]
+    if tournament_ids:
+        wanted = {int(tournament_id) for tournament_id in tournament_ids}
+        in_tournament = [event for event in matches if event.get('sportId') in wanted]
+        if in_tournament:
+            matches = in_tournament
+        else:
+            logger.info(f"В ответах линии нет событий сегментов {sorted(wanted)} "
+                        f"(известно сегментов: {len(segments)}), берем все матчи")
+
+    parse_timestamp = parse_timestamp or datetime.now().strftime("%d.%m.%Y %H:%M:%S")
+    rows = []
+    for event in matches:
+        event_factors = factors.get(event.get('id'), {})
+        row = {
+            'parse_timestamp': parse_timestamp,
+            'event_name': f"{event['team1']} — {event['team2']}",
+            'event_time': (datetime.fromtimestamp(event['startTime']).strftime("%d.%m.%Y %H:%M")
+                           if event.get('startTime') else "Время не найдено"),
+        }
+        for code, field in _SIMPLE_FACTORS.items():
+            row[field] = _format_odds(event_factors.get(code, {}).get('v'))
+
+        # Форы в формате DOM-парсера: "параметр коэффициент"
+        for code, field in ((FACTOR_FORA_1, 'fora_1'), (FACTOR_FORA_2, 'fora_2')):
+            factor = event_factors.get(code)
+            row[field] = f"{_factor_param(factor)} {_format_odds(factor.get('v'))}".strip() if factor else ""
+
+        over = event_factors.get(FACTOR_TOTAL_OVER)
+        under = event_factors.get(FACTOR_TOTAL_UNDER)
+        row['total_value'] = _factor_param(over or under or {'f': FACTOR_TOTAL_OVER})
+        row['total_over'] = _format_odds(over.get('v')) if over else ""
+        row['total_under'] = _format_odds(under.get('v')) if under else ""
+        rows.append(row)
+
+    return rows
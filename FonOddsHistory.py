@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+from bisect import bisect_right
+from datetime import datetime
+from FonAppendCsv import event_key
+from FonExtract import MARKET_FIELDS
+from FonStorage import file_lock
+
+logger = logging.getLogger(__name__)
+
+EVENT_TIME_FORMAT = "%d.%m.%Y %H:%M"
+# Время опроса в истории хранится в ISO: строки сравниваются как даты
+HISTORY_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# Полная запись рынков события через каждые N дельт: восстановление читает не больше N+1 строк
+DEFAULT_KEYFRAME_INTERVAL = int(os.environ.get('FONBET_HISTORY_KEYFRAME', 20))
+
+
+def format_history_time(value):
+    if isinstance(value, datetime):
+        return value.strftime(HISTORY_TIME_FORMAT)
+    return value
+
+
+def kickoff_time(key):
+    """Время начала события из ключа 'название|dd.mm.yyyy HH:MM' (None, если не распознано)"""
+    try:
+        return datetime.strptime(key.rsplit('|', 1)[1], EVENT_TIME_FORMAT)
+    except (IndexError, ValueError):
+        return None
+
+
+class OddsHistory:
+    """История котировок в JSONL: на каждый опрос пишутся только изменившиеся рынки события.
+
+    Строка файла: {"key": ..., "ts": ..., "odds": {...}} - дельта к предыдущему состоянию,
+    с "kf": 1 - полный снимок рынков (ключевой кадр). Ключевой кадр пишется при первом
+    появлении события и через каждые keyframe_interval дельт, поэтому котировки на любой
+    момент восстанавливаются чтением нескольких строк по смещениям из индекса.
+    """
+
+    def __init__(self, path, fields=MARKET_FIELDS, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.path = path
+        self.fields = list(fields)
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.size = None
+        # key -> (времена записей, смещения строк, номера последних ключевых кадров)
+        self.index = {}
+        # key -> последнее состояние рынков и число дельт после ключевого кадра
+        self.latest = {}
+        self.since_keyframe = {}
+
+    def _file_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def load(self):
+        """Индекс записей и последние состояния.
+
+        Первый вызов читает файл целиком, следующие - только строки, дописанные
+        после прочитанного (другим процессом); укороченный файл перечитывается заново.
+        """
+        size = self._file_size()
+        if self.size == size:
+            return self
+
+        rebuild = self.size is None or size < self.size
+        if rebuild:
+            self.index, self.latest, self.since_keyframe = {}, {}, {}
+            self.size = 0
+        offset = self.size
+        if size > offset:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Строка еще дописывается или оборвана сбоем: разбирается при следующей загрузке
+                        break
+                    if line.strip():
+                        try:
+                            self._index_record(json.loads(line), offset)
+                        except (ValueError, KeyError) as e:
+                            logger.warning(f"Пропущена поврежденная запись истории {self.path} @{offset}: {e}")
+                    offset += len(line)
+        self.size = offset
+        if rebuild:
+            logger.info(f"История котировок {self.path}: событий {len(self.index)}")
+        return self
+
+    def _index_record(self, record, offset):
+        key = record['key']
+        times, offsets, keyframes = self.index.setdefault(key, ([], [], []))
+        times.append(record['ts'])
+        offsets.append(offset)
+        if record.get('kf'):
+            keyframes.append(len(times) - 1)
+            self.latest[key] = dict(record['odds'])
+            self.since_keyframe[key] = 0
+        else:
+            self.latest.setdefault(key, {}).update(record['odds'])
+            self.since_keyframe[key] = self.since_keyframe.get(key, 0) + 1
+
+    def record(self, events, polled_at=None):
+        """Запись опроса: для каждого события - ключевой кадр или дельта изменившихся рынков.
+
+        Неизменившиеся события не пишутся. Возвращает число записанных строк.
+        Дельты считаются под блокировкой файла от состояния с учетом записей других процессов.
+        """
+        ts = format_history_time(polled_at or datetime.now())
+        with file_lock(self.path):
+            self.load()
+            records = self._diff(events, ts)
+            if records:
+                self._append(records)
+
+        if not records:
+            return 0
+        keyframes = sum(1 for record in records if record.get('kf'))
+        logger.info(f"История котировок {self.path}: записей {len(records)} "
+                    f"(ключевых кадров {keyframes}, дельт {len(records) - keyframes})")
+        return len(records)
+
+    def _diff(self, events, ts):
+        records = []
+        for event in events:
+            key = event_key(event)
+            odds = {field: event.get(field, '') for field in self.fields}
+            previous = self.latest.get(key)
+            if previous == odds:
+                continue
+            if previous is None or self.since_keyframe.get(key, 0) >= self.keyframe_interval:
+                records.append({'key': key, 'ts': ts, 'kf': 1, 'odds': odds})
+            else:
+                changed = {field: value for field, value in odds.items() if previous.get(field) != value}
+                records.append({'key': key, 'ts': ts, 'odds': changed})
+        return records
+
+    def _append(self, records):
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            if offset != self.size:
+                # В конце файла строка, оборванная сбоем: закрываем ее, при чтении она пропускается
+                f.write(b'\n')
+                offset += 1
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+                f.write(line)
+                self._index_record(record, offset)
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.size = offset
+
+    def _read_records(self, offsets):
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def odds_at(self, key, when=None):
+        """Котировки события на момент when (datetime или ISO-строка; None - последние известные)"""
+        self.load()
+        entry = self.index.get(key)
+        if not entry:
+            return None
+        if when is None:
+            return dict(self.latest[key])
+
+        times, offsets, keyframes = entry
+        position = bisect_right(times, format_history_time(when)) - 1
+        if position < 0:
+            return None
+
+        # Последний ключевой кадр не позже нужной записи, затем дельты до нее
+        start = keyframes[bisect_right(keyframes, position) - 1] if keyframes and keyframes[0] <= position else 0
+        odds = {}
+        for record in self._read_records(offsets[start:position + 1]):
+            odds.update(record['odds'])
+        return odds
+
+    def closing_odds(self, key):
+        """Последние котировки до начала события (по времени из ключа)"""
+        kickoff = kickoff_time(key)
+        if kickoff is None:
+            return self.odds_at(key)
+        return self.odds_at(key, kickoff)
+
+    def iter_states(self, key):
+        """Движение котировок: (время опроса, состояние рынков после него) по всем записям события"""
+        self.load()
+        entry = self.index.get(key)
+        if not entry:
+            return
+        times, offsets, _ = entry
+        odds = {}
+        for ts, record in zip(times, self._read_records(offsets)):
+            if record.get('kf'):
+                odds = {}
+            odds.update(record['odds'])
+            yield ts, dict(odds)
+
+    def keys(self):
+        self.load()
+        return list(self.index)
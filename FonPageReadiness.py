@@ -0,0 +1,105 @@
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Контейнеры событий на страницах линии и результатов
+ODDS_EVENT_SELECTOR = '[class*="sport-base-event"]'
+RESULTS_EVENT_SELECTOR = 'div.results-event--Me6XJ'
+
+# Сколько DOM должен "молчать", чтобы считать страницу дорисованной
+DEFAULT_QUIET_PERIOD = float(os.environ.get('FONBET_QUIET_PERIOD', 0.5))
+DEFAULT_TIMEOUT = 15
+DEFAULT_POLL_INTERVAL = 0.1
+
+# Если документ загружен и давно не меняется, а контейнеров так и нет -
+# дальше ждать бессмысленно (например, на дату нет матчей)
+EMPTY_PAGE_GRACE = 2.0
+
+# Наблюдатель ставится один раз на документ и запоминает время последней мутации.
+# reset (arguments[1]) начинает отсчет тишины заново: после клика или поиска старая
+# тишина DOM ничего не говорит о том, дорисован ли ответ на действие
+PROBE_JS = """
+if (!window.__fonMutationObserver) {
+    window.__fonLastMutation = performance.now();
+    window.__fonMutationObserver = new MutationObserver(function () {
+        window.__fonLastMutation = performance.now();
+    });
+    window.__fonMutationObserver.observe(document.documentElement, {
+        childList: true, subtree: true, characterData: true
+    });
+}
+var selector = arguments[0];
+if (arguments[1]) {
+    window.__fonLastMutation = performance.now();
+}
+return {
+    ready_state: document.readyState,
+    count: selector ? document.querySelectorAll(selector).length : 0,
+    idle_ms: performance.now() - window.__fonLastMutation
+};
+"""
+
+
+def probe_page(driver, selector=None, reset=False):
+    """Однократный опрос страницы: readyState, число контейнеров selector и время тишины DOM (мс).
+
+    reset=True сбрасывает время последней мутации на момент опроса.
+    """
+    try:
+        return driver.execute_script(PROBE_JS, selector, reset) or {}
+    except Exception as e:
+        logger.debug(f"Не удалось опросить состояние страницы: {e}")
+        return {}
+
+
+def classify_probe(probe, selector=None, quiet_period=DEFAULT_QUIET_PERIOD):
+    """Состояние по результату опроса: 'ready', 'empty' (затихла без контейнеров) или None (ждем дальше)"""
+    quiet_ms = quiet_period * 1000
+    loaded = probe.get('ready_state') == 'complete'
+    idle_ms = probe.get('idle_ms', 0)
+    count = probe.get('count', 0)
+
+    if loaded and idle_ms >= quiet_ms and (selector is None or count > 0):
+        return 'ready'
+
+    if selector and loaded and count == 0 and idle_ms >= max(quiet_ms, EMPTY_PAGE_GRACE * 1000):
+        return 'empty'
+
+    return None
+
+
+def wait_for_page_ready(driver, selector=None, quiet_period=DEFAULT_QUIET_PERIOD,
+                        timeout=DEFAULT_TIMEOUT, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Ожидание готовности страницы вместо фиксированных пауз.
+
+    Возвращает управление, как только на странице есть контейнеры selector
+    (если он задан) и DOM не менялся quiet_period секунд. Тишина отсчитывается
+    от начала ожидания, а не от последней мутации до него: сразу после перехода,
+    клика или поиска страница еще может показывать прежнее содержимое.
+    Возвращает кортеж (готова ли страница, фактическое время ожидания в секундах).
+    """
+    started = time.monotonic()
+    reset = True
+
+    while True:
+        waited = time.monotonic() - started
+        probe = probe_page(driver, selector, reset=reset)
+        reset = False
+        state = classify_probe(probe, selector, quiet_period)
+        count = probe.get('count', 0)
+
+        if state == 'ready':
+            logger.info(f"Страница готова за {waited:.2f} с (элементов: {count})")
+            return True, waited
+
+        if state == 'empty':
+            logger.info(f"Страница затихла без элементов {selector} за {waited:.2f} с")
+            return False, waited
+
+        if waited >= timeout:
+            logger.warning(f"Страница не стала готовой за {timeout} с (элементов: {count})")
+            return False, waited
+
+        time.sleep(poll_interval)
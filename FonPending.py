@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from FonAppendCsv import event_key
+from FonFuzzy import WINNER_SUFFIX_RE
+from FonTime import EVENT_TIME_FORMAT
+from FonStorage import file_lock, read_csv, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Окно, в котором результат события еще можно получить (как в should_process_event парсеров результатов):
+# раньше SETTLE_AFTER после начала матч может быть не завершен, позже SETTLE_WINDOW событие не обрабатывается
+SETTLE_AFTER = timedelta(hours=2)
+SETTLE_WINDOW = timedelta(days=3)
+
+
+def event_kickoff(row):
+    try:
+        return datetime.strptime(row['event_time'], EVENT_TIME_FORMAT)
+    except (KeyError, ValueError):
+        return None
+
+
+def settled_keys(row):
+    """Ключи, под которыми строка файла результатов закрывает событие линии (с "(победитель)" и без).
+
+    "(победитель)" парсеры результатов дописывают к названию матчей с овертаймом/буллитами.
+    """
+    key = event_key(row)
+    base = WINNER_SUFFIX_RE.sub('', row['event_name'])
+    return {key, event_key(dict(row, event_name=base))}
+
+
+class PendingIndex:
+    """Индекс нерассчитанных событий лиги: JSON {"fieldnames": [...], "events": {ключ: строка линии}}.
+
+    Парсер линии добавляет новые события, парсер результатов удаляет рассчитанные
+    и вышедшие из окна расчета, поэтому прогон результатов читает только строки,
+    которые еще можно рассчитать, а не весь архив линии. Если индекса нет, он
+    один раз строится по CSV линии и результатов.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fieldnames = []
+        self.events = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """События из файла индекса (перечитывается при каждом вызове).
+
+        Поврежденный файл - ValueError: пустой индекс вместо него записывать нельзя,
+        иначе все нерассчитанные события пропадут, а индекс так и не перестроится.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self.events = {}
+            return self.events
+        if not isinstance(data, dict) or not isinstance(data.get('events'), dict):
+            raise ValueError("нет словаря events")
+        self.fieldnames = data.get('fieldnames', [])
+        self.events = data['events']
+        return self.events
+
+    def save(self):
+        """Запись индекса через временный файл"""
+        write_atomic(self.path, lambda f: json.dump({'fieldnames': self.fieldnames, 'events': self.events}, f,
+                                                    ensure_ascii=False))
+
+    def update(self, add=(), remove=(), fieldnames=None):
+        """Добавить строки и удалить ключи поверх текущего содержимого файла.
+
+        Файл перечитывается под блокировкой непосредственно перед записью, чтобы
+        не затереть события, добавленные парсером линии во время прогона результатов.
+        """
+        with file_lock(self.path):
+            try:
+                self.load()
+            except ValueError as e:
+                # Файл не трогаем: следующий прогон результатов перестроит индекс по CSV
+                logger.warning(f"Индекс {self.path} поврежден ({e}), изменения не записаны, "
+                               f"он будет перестроен при следующем расчете")
+                return 0
+            if fieldnames:
+                self.fieldnames = list(fieldnames)
+            for row in add:
+                self.events[event_key(row)] = dict(row)
+            for key in remove:
+                self.events.pop(key, None)
+            self.save()
+        return len(self.events)
+
+    def add(self, rows, fieldnames=None):
+        """Новые события линии. Пока индекса нет, они попадут в него при первичном построении по CSV"""
+        if not self.exists():
+            return 0
+        return self.update(add=rows, fieldnames=fieldnames)
+
+    def bootstrap(self, odds_path, results_path, is_settled, now=None):
+        """Первичное построение по CSV линии без строк, уже рассчитанных в файле результатов.
+
+        События старше окна расчета в индекс не попадают.
+        """
+        now = now or datetime.now()
+        settled = set()
+        if results_path and os.path.exists(results_path):
+            for row in read_csv(results_path)[1]:
+                if is_settled(row):
+                    settled.update(settled_keys(row))
+
+        # Под блокировкой CSV линии: событие, дописанное во время построения, либо попадет
+        # в прочитанный снимок, либо будет добавлено парсером линии уже в готовый индекс
+        events = {}
+        with file_lock(odds_path):
+            fieldnames, rows = read_csv(odds_path)
+            for row in rows:
+                key = event_key(row)
+                kickoff = event_kickoff(row)
+                if key in settled or is_settled(row) or kickoff is None or now - kickoff > SETTLE_WINDOW:
+                    continue
+                events[key] = row
+
+            self.fieldnames = fieldnames
+            self.events = events
+            with file_lock(self.path):
+                self.save()
+        logger.info(f"Индекс {self.path} построен по {odds_path}: нерассчитанных событий {len(events)}")
+        return events
+
+    def open(self, odds_path, results_path, is_settled):
+        """События индекса; при первом запуске или после повреждения файла индекс строится по CSV.
+
+        FileNotFoundError - нет CSV линии.
+        """
+        if self.exists():
+            try:
+                return self.load()
+            except ValueError as e:
+                logger.warning(f"Индекс {self.path} поврежден ({e}), перестраиваем по {odds_path}")
+                return self.bootstrap(odds_path, results_path, is_settled)
+        logger.info(f"Индекс {self.path} не найден, строим по {odds_path}")
+        return self.bootstrap(odds_path, results_path, is_settled)
+
+    def partition(self, now=None):
+        """Разбиение событий индекса: (готовые к расчету, ключи вышедших из окна расчета)"""
+        now = now or datetime.now()
+        due = {}
+        expired = []
+        for key, row in self.events.items():
+            kickoff = event_kickoff(row)
+            if kickoff is None or now - kickoff > SETTLE_WINDOW:
+                expired.append(key)
+            elif now - kickoff >= SETTLE_AFTER:
+                due[key] = row
+        return due, expired
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from FonDriverPool import get_driver_pool
+from FonExtract import NETWORK_BACKEND
+from FonPageReadiness import DEFAULT_QUIET_PERIOD
+from FonStorage import write_atomic
+from FonTime import EVENT_TIME_FORMAT
+from FonTournaments import get_tournament, load_parser_class, tournament_keys
+
+logger = logging.getLogger(__name__)
+
+STATUS_FILE = os.environ.get('FONBET_POLL_STATUS', 'poll_status.json')
+STATUS_TIME_FORMAT = "%d.%m.%Y %H:%M:%S"
+
+# Интервал опроса по времени до ближайшего начала матча: (не дальше чем, интервал в секундах)
+POLL_SCHEDULE = [
+    (timedelta(hours=1), 120),
+    (timedelta(hours=6), 300),
+    (timedelta(hours=24), 900),
+    (timedelta(hours=72), 1800),
+]
+# Нет матчей в ближайшие дни или линия пуста
+IDLE_INTERVAL = int(os.environ.get('FONBET_POLL_IDLE', 3600))
+MIN_INTERVAL = int(os.environ.get('FONBET_POLL_MIN', 60))
+# Последний опрос перед началом матча - за минуту до него, чтобы записать закрывающие котировки
+CLOSING_MARGIN = 60
+
+
+def next_interval(kickoffs, now=None):
+    """Пауза до следующего опроса (секунды) по ближайшему будущему началу матча"""
+    now = now or datetime.now()
+    upcoming = [kickoff for kickoff in kickoffs if kickoff > now]
+    if not upcoming:
+        return IDLE_INTERVAL
+
+    until = min(upcoming) - now
+    interval = IDLE_INTERVAL
+    for horizon, seconds in POLL_SCHEDULE:
+        if until <= horizon:
+            interval = seconds
+            break
+
+    # Закрывающий опрос (за CLOSING_MARGIN до начала) не пропускается, даже если до него меньше MIN_INTERVAL
+    seconds_until = until.total_seconds()
+    before_closing = seconds_until - CLOSING_MARGIN
+    if 0 < before_closing < interval:
+        return max(1, int(before_closing))
+    if seconds_until < interval:
+        # Закрывающий опрос уже был: следующие матчи не откладываются дальше MIN_INTERVAL
+        return MIN_INTERVAL
+    return max(MIN_INTERVAL, int(interval))
+
+
+def event_kickoffs(events_data):
+    kickoffs = []
+    for event in events_data:
+        try:
+            kickoffs.append(datetime.strptime(event['event_time'], EVENT_TIME_FORMAT))
+        except (KeyError, ValueError):
+            continue
+    return kickoffs
+
+
+def write_status(status, path=STATUS_FILE):
+    """Состояние опроса в JSON (атомарная запись, чтобы читатель не увидел половину файла)"""
+    try:
+        write_atomic(path, lambda f: json.dump(status, f, ensure_ascii=False, indent=2))
+    except Exception as e:
+        logger.warning(f"Не удалось записать состояние опроса {path}: {e}")
+
+
+def read_status(path=STATUS_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать состояние опроса {path}: {e}")
+        return None
+
+
+class OddsPoller:
+    """Периодический сбор линии турниров в одной сессии браузера.
+
+    Парсеры создаются один раз и живут между циклами, поэтому индексы CSV и истории
+    котировок читаются один раз на процесс. Браузер арендуется из пула на цикл:
+    между циклами он остается запущенным и прогретым.
+    """
+
+    def __init__(self, keys=None, headless=True, backend=None, quiet_period=DEFAULT_QUIET_PERIOD,
+                 status_file=STATUS_FILE):
+        self.keys = list(keys or tournament_keys())
+        for key in self.keys:
+            get_tournament(key)
+        self.headless = headless
+        self.backend = backend
+        self.quiet_period = quiet_period
+        self.status_file = status_file
+        self.pool = get_driver_pool(headless, network_capture=backend == NETWORK_BACKEND)
+        self.parsers = {}
+        self.stop_event = threading.Event()
+        self.status = {
+            'pid': os.getpid(),
+            'started': datetime.now().strftime(STATUS_TIME_FORMAT),
+            'tournaments': self.keys,
+            'cycles': 0,
+            'last_cycle': None,
+            'next_poll': None,
+            'interval': None,
+        }
+
+    def get_parser(self, key, driver):
+        parser = self.parsers.get(key)
+        if parser is None:
+            parser_class = load_parser_class(get_tournament(key)['odds_parser'])
+            parser = parser_class(driver=driver, backend=self.backend, quiet_period=self.quiet_period,
+                                  tournament=key)
+            self.parsers[key] = parser
+        parser.driver = driver
+        return parser
+
+    def poll_tournament(self, key, driver):
+        parser = self.get_parser(key, driver)
+
+        started = time.monotonic()
+        parser.navigate()
+        navigated = time.monotonic()
+        events_data = parser.parse_all_events()
+        parsed = time.monotonic()
+        total, new_events = parser.save_to_csv(events_data) if events_data else (0, 0)
+        saved = time.monotonic()
+
+        return events_data, {
+            'events': len(events_data),
+            'new': new_events,
+            'total': total,
+            'navigate_time': round(navigated - started, 3),
+            'parse_time': round(parsed - navigated, 3),
+            'save_time': round(saved - parsed, 3),
+        }
+
+    def run_cycle(self):
+        """Один проход по всем турнирам; возвращает времена начала матчей на линии"""
+        cycle_started = datetime.now()
+        started = time.monotonic()
+        results = {}
+        kickoffs = []
+
+        driver = self.pool.acquire()
+        try:
+            for key in self.keys:
+                try:
+                    events_data, results[key] = self.poll_tournament(key, driver)
+                    kickoffs.extend(event_kickoffs(events_data))
+                    logger.info(f"Опрос {key}: событий {results[key]['events']}, новых {results[key]['new']} "
+                                f"(переход {results[key]['navigate_time']:.2f} с, "
+                                f"разбор {results[key]['parse_time']:.2f} с, запись {results[key]['save_time']:.2f} с)")
+                except Exception as e:
+                    logger.error(f"Ошибка при опросе {key}: {e}")
+                    results[key] = {'error': str(e)}
+        finally:
+            # Сессия возвращается в пул и остается запущенной до следующего цикла
+            driver.quit()
+            for parser in self.parsers.values():
+                parser.driver = None
+
+        self.status['cycles'] += 1
+        self.status['last_cycle'] = {
+            'started': cycle_started.strftime(STATUS_TIME_FORMAT),
+            'duration': round(time.monotonic() - started, 3),
+            'tournaments': results,
+        }
+        return kickoffs
+
+    def run(self, max_cycles=None, once=False):
+        """Цикл опроса до остановки (stop() или сигнал), числа циклов max_cycles или одного прохода"""
+        logger.info(f"Запуск опроса линии: {', '.join(self.keys)}")
+        try:
+            while not self.stop_event.is_set():
+                kickoffs = self.run_cycle()
+                if once or (max_cycles and self.status['cycles'] >= max_cycles):
+                    self.status['next_poll'] = None
+                    write_status(self.status, self.status_file)
+                    break
+
+                interval = next_interval(kickoffs)
+                upcoming = [kickoff for kickoff in kickoffs if kickoff > datetime.now()]
+                self.status['interval'] = interval
+                self.status['nearest_kickoff'] = min(upcoming).strftime(EVENT_TIME_FORMAT) if upcoming else None
+                self.status['next_poll'] = (datetime.now() + timedelta(seconds=interval)).strftime(STATUS_TIME_FORMAT)
+                write_status(self.status, self.status_file)
+                logger.info(f"Цикл {self.status['cycles']} за {self.status['last_cycle']['duration']:.2f} с, "
+                            f"следующий через {interval} с")
+
+                self.stop_event.wait(interval)
+        finally:
+            self.status['stopped'] = datetime.now().strftime(STATUS_TIME_FORMAT)
+            write_status(self.status, self.status_file)
+            logger.info("Опрос линии остановлен")
+        return self.status
+
+    def stop(self):
+        self.stop_event.set()
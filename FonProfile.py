@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlparse
+from selenium.webdriver.common.by import By
+from FonPageReadiness import wait_for_page_ready, DEFAULT_QUIET_PERIOD
+from FonStorage import file_lock, try_lock, unlock, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Постоянные профили Chrome: cookies согласия и дисковый кеш переживают перезапуск.
+# FONBET_PROFILE=0 возвращает одноразовые профили
+DEFAULT_PROFILE = os.environ.get('FONBET_PROFILE', '1') not in ('0', 'false', 'no')
+PROFILE_ROOT = os.path.abspath(os.environ.get('FONBET_PROFILE_DIR', '.chrome_profiles'))
+# Имена cookies, появившихся после принятия баннера, по доменам
+CONSENT_FILE = os.path.join(PROFILE_ROOT, 'consent.json')
+
+# Кнопки баннера cookies: один CSS-запрос и один XPath-запрос вместо перебора селекторов
+CONSENT_CSS = 'button[class*="cookie"], button[class*="accept"], div[class*="cookie"] button'
+CONSENT_XPATH = ('//button[contains(text(), "Принять") or contains(text(), "Accept") '
+                 'or contains(text(), "Согласен")]')
+
+# Каталоги профилей, занятые этим процессом: путь -> файл-замок slot-N.lock
+_claimed = {}
+_claimed_lock = threading.Lock()
+
+
+def profile_in_use(path):
+    """Профиль занят Chrome, запущенным не через пул (SingletonLock указывает на живой процесс).
+
+    Дополнительная проверка к замку slot-N.lock; на Windows SingletonLock не символическая
+    ссылка, и проверка всегда отвечает "свободен".
+    """
+    lock_path = os.path.join(path, 'SingletonLock')
+    if not os.path.lexists(lock_path):
+        return False
+    try:
+        # Ссылка вида "<хост>-<pid>"
+        pid = int(os.readlink(lock_path).rsplit('-', 1)[1])
+        os.kill(pid, 0)
+        return True
+    except (OSError, ValueError, IndexError):
+        # Блокировка осталась после аварийного завершения - профиль свободен
+        return False
+
+
+def claim_profile_dir(root=PROFILE_ROOT):
+    """Свободный каталог профиля slot-N.
+
+    Слот занимается эксклюзивной блокировкой slot-N.lock, которая держится, пока
+    сессия жива (release_profile_dir или завершение процесса): проверка и занятие
+    атомарны, и два парсера не получат один профиль.
+    """
+    os.makedirs(root, exist_ok=True)
+    with _claimed_lock:
+        slot = 0
+        while True:
+            path = os.path.join(root, f'slot-{slot}')
+            slot += 1
+            if path in _claimed:
+                continue
+            handle = try_lock(path)
+            if handle is None:
+                continue
+            if profile_in_use(path):
+                unlock(handle)
+                continue
+            os.makedirs(path, exist_ok=True)
+            _claimed[path] = handle
+            return path
+
+
+def release_profile_dir(path):
+    with _claimed_lock:
+        handle = _claimed.pop(path, None)
+    if handle:
+        unlock(handle)
+
+
+def apply_profile(options, profile_dir):
+    options.add_argument(f'--user-data-dir={profile_dir}')
+    return options
+
+
+def load_consent(path=CONSENT_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать маркеры согласия {path}: {e}")
+        return {}
+
+
+def save_consent(domain, cookie_names, path=CONSENT_FILE):
+    """Маркер согласия домена; чтение и запись под блокировкой, чтобы не потерять маркеры других сессий"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with file_lock(path):
+            consent = load_consent(path)
+            consent[domain] = sorted(cookie_names)
+            write_atomic(path, lambda f: json.dump(consent, f, ensure_ascii=False, indent=2))
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить маркеры согласия {path}: {e}")
+
+
+def _domain(driver):
+    return urlparse(driver.current_url).hostname or ''
+
+
+def _cookie_names(driver):
+    return {cookie['name'] for cookie in driver.get_cookies()}
+
+
+def has_consent(driver):
+    """Cookies согласия для текущего домена уже есть в браузере"""
+    names = load_consent().get(_domain(driver))
+    return bool(names) and set(names) <= _cookie_names(driver)
+
+
+def accept_cookies(driver, quiet_period=DEFAULT_QUIET_PERIOD):
+    """Принятие баннера cookies; при сохраненном согласии сразу возвращает True.
+
+    После первого клика запоминаются имена появившихся cookies: в постоянном
+    профиле они сохраняются, и баннер больше не ищется.
+    """
+    if has_consent(driver):
+        logger.debug("Согласие на cookies уже дано, баннер не ищем")
+        return True
+
+    before = _cookie_names(driver)
+    # Ждем, пока DOM затихнет, чтобы окно cookies успело появиться
+    wait_for_page_ready(driver, quiet_period=quiet_period, timeout=5)
+
+    buttons = driver.find_elements(By.CSS_SELECTOR, CONSENT_CSS) + driver.find_elements(By.XPATH, CONSENT_XPATH)
+    for button in buttons:
+        if button.is_displayed():
+            button.click()
+            logger.info("Cookies приняты")
+            wait_for_page_ready(driver, quiet_period=quiet_period, timeout=5)
+            added = _cookie_names(driver) - before
+            if added:
+                save_consent(_domain(driver), added)
+            return True
+    return False
@@ -0,0 +1,92 @@
+import glob
+import logging
+import os
+import time
+from datetime import datetime
+from FonNetwork import load_line_payloads
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATTERN = '*.html'
+# Снимки ответов линии: JSON Lines (*.jsonl) и прежние JSON-массивы (*.json)
+FEED_PATTERN = '*.json*'
+
+
+def save_snapshot(directory, prefix, page_source, extension='html'):
+    """Сохранение page_source (или JSON-ответа линии) для последующего офлайн-воспроизведения"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(directory, f"{prefix}_{timestamp}.{extension}")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(page_source)
+        logger.info(f"Снимок страницы сохранен: {path}")
+        return path
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить снимок страницы: {e}")
+        return None
+
+
+def iter_snapshots(directory, pattern=SNAPSHOT_PATTERN):
+    """Снимки страниц из каталога в порядке имен: (путь, html)"""
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield path, f.read()
+
+
+def _replay(directory, extract, pattern):
+    stats = {
+        'pages': 0,
+        'items': 0,
+        'empty_pages': [],
+        'per_page': {},
+        'elapsed': 0.0,
+    }
+
+    for path, page_source in iter_snapshots(directory, pattern):
+        started = time.perf_counter()
+        items = extract(page_source)
+        stats['elapsed'] += time.perf_counter() - started
+
+        name = os.path.basename(path)
+        stats['pages'] += 1
+        stats['items'] += len(items)
+        stats['per_page'][name] = len(items)
+        if not items:
+            # Пустая страница в архиве снимков - частый признак смены верстки
+            stats['empty_pages'].append(name)
+
+    elapsed = stats['elapsed']
+    stats['pages_per_sec'] = stats['pages'] / elapsed if elapsed else 0.0
+    logger.info(f"Воспроизведено страниц: {stats['pages']}, извлечено: {stats['items']}, "
+                f"время извлечения: {elapsed:.3f} с")
+    return stats
+
+
+def replay_odds(parser, directory, pattern=SNAPSHOT_PATTERN):
+    """Прогон parse_all_events по сохраненным страницам линии без браузера"""
+    return _replay(directory, lambda page_source: parser.parse_all_events(page_source=page_source), pattern)
+
+
+def replay_feed(parser, directory, pattern=FEED_PATTERN):
+    """Прогон разбора записанных JSON-ответов линии (бэкенд network) без браузера и сети"""
+    return _replay(directory, lambda text: parser.parse_all_events(payloads=load_line_payloads(text)), pattern)
+
+
+def replay_results(parser, directory, pattern=SNAPSHOT_PATTERN):
+    """Прогон parse_all_match_results_on_page по сохраненным страницам результатов без браузера"""
+    return _replay(directory,
+                   lambda page_source: parser.parse_all_match_results_on_page(page_source=page_source),
+                   pattern)
+
+
+def format_replay_stats(stats):
+    """Текстовый отчет для management-команд"""
+    lines = [
+        f"Страниц: {stats['pages']}",
+        f"Извлечено записей: {stats['items']}",
+        f"Время извлечения: {stats['elapsed']:.3f} с ({stats['pages_per_sec']:.1f} стр/с)",
+    ]
+    if stats['empty_pages']:
+        lines.append(f"Страницы без записей ({len(stats['empty_pages'])}): {', '.join(stats['empty_pages'])}")
+    return '\n'.join(lines)
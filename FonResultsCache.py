@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from FonPending import SETTLE_WINDOW
+from FonStorage import file_lock, write_atomic
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get('FONBET_RESULTS_CACHE_DIR', 'results_cache')
+# Дата, где есть матчи без итогового счета, перезагружается не чаще, чем раз в TTL секунд
+DEFAULT_TTL = int(os.environ.get('FONBET_RESULTS_CACHE_TTL', 1800))
+# Страница даты может стать окончательной только после этого запаса от конца дня
+# (поздние матчи заканчиваются уже следующей датой)
+FINAL_AFTER = timedelta(hours=6)
+# Даты старше окна расчета (с запасом на ту же поправку FINAL_AFTER) больше не запрашиваются и удаляются при записи
+KEEP_DAYS = SETTLE_WINDOW + timedelta(days=1)
+
+CACHE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def is_final_page(page_date, complete, now=None):
+    """Результаты даты больше не изменятся: у всех матчей итоговый счет и день давно закончился"""
+    now = now or datetime.now()
+    day_end = datetime(page_date.year, page_date.month, page_date.day) + timedelta(days=1)
+    return complete and now >= day_end + FINAL_AFTER
+
+
+class ResultsCache:
+    """Кеш разобранных страниц результатов на диске: <каталог>/<лига>.json, записи по датам.
+
+    Окончательные даты отдаются всегда, остальные - пока не истек TTL.
+    """
+
+    def __init__(self, league, directory=CACHE_DIR, ttl=DEFAULT_TTL):
+        self.league = league
+        self.path = os.path.join(directory, f'{league}.json')
+        self.ttl = ttl
+        self.entries = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кеш результатов {self.path}: {e}")
+            return {}
+
+    def load(self):
+        if self.entries is None:
+            self.entries = self._read()
+        return self.entries
+
+    def get(self, page_date, now=None):
+        """Результаты даты из кеша или None, если дату нужно загрузить"""
+        entry = self.load().get(page_date.isoformat())
+        if not entry:
+            return None
+        if entry['final']:
+            return entry['results']
+
+        now = now or datetime.now()
+        fetched = datetime.strptime(entry['fetched'], CACHE_TIME_FORMAT)
+        if now - fetched < timedelta(seconds=self.ttl):
+            return entry['results']
+        return None
+
+    def put(self, page_date, results, complete, now=None):
+        now = now or datetime.now()
+        final = is_final_page(page_date, complete, now)
+        with self._lock:
+            self.load()[page_date.isoformat()] = {
+                'results': results,
+                'final': final,
+                'fetched': now.strftime(CACHE_TIME_FORMAT),
+            }
+        return final
+
+    def save(self, now=None):
+        """Запись кеша под блокировкой файла.
+
+        Записи, сохраненные другими процессами после загрузки, не теряются: по каждой
+        дате остается окончательная или более свежая запись. Даты вне окна расчета удаляются.
+        """
+        if self.entries is None:
+            return
+        oldest = ((now or datetime.now()) - KEEP_DAYS).date().isoformat()
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with self._lock, file_lock(self.path):
+                entries = self._read()
+                for page_date, entry in self.entries.items():
+                    current = entries.get(page_date)
+                    if current is None or (entry['final'], entry['fetched']) > (current['final'], current['fetched']):
+                        entries[page_date] = entry
+                self.entries = {page_date: entry for page_date, entry in entries.items() if page_date >= oldest}
+                write_atomic(self.path, lambda f: json.dump(self.entries, f, ensure_ascii=False, indent=1,
+                                                            sort_keys=True))
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить кеш результатов {self.path}: {e}")
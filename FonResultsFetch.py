@@ -0,0 +1,121 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from FonDriverPool import get_driver_pool
+
+logger = logging.getLogger(__name__)
+
+# Сколько дат загружается одновременно (каждая - в своей сессии браузера из пула)
+DEFAULT_RESULTS_WORKERS = int(os.environ.get('FONBET_RESULTS_WORKERS', 2))
+
+
+def clone_parser(parser):
+    """Копия парсера результатов с собственной сессией браузера из того же пула"""
+    return type(parser)(
+        headless=parser.headless,
+        driver_pool=parser.driver_pool,
+        quiet_period=parser.quiet_period,
+        snapshot_dir=parser.snapshot_dir,
+        backend=parser.backend,
+        tournament=parser.tournament['key'],
+        workers=parser.workers,
+        # Кешем управляет основной парсер
+        use_cache=False,
+    )
+
+
+def fetch_results_by_date(parser, dates, workers=None):
+    """Результаты матчей за несколько дат, загружаемые параллельно.
+
+    Первая сессия - сессия самого парсера, остальные арендуются клонами парсера
+    из пула и возвращаются в него по окончании. Число потоков ограничено
+    размером пула, чтобы клоны не ждали друг друга. Даты из кеша результатов
+    парсера (окончательные или свежие) не загружаются. Возвращает
+    {дата: результаты страницы} или {дата: None}, если дату открыть не удалось.
+    """
+    cache = parser.results_cache
+    results = {}
+    pending = []
+    for event_date in dates:
+        cached = cache.get(event_date) if cache else None
+        if cached is None:
+            pending.append(event_date)
+        else:
+            results[event_date] = cached
+    if results:
+        logger.info(f"Даты из кеша результатов: {', '.join(str(d) for d in results)}")
+
+    dates = pending
+    if not dates:
+        return results
+
+    pool = parser.driver_pool or get_driver_pool(parser.headless)
+    workers = max(1, min(workers or DEFAULT_RESULTS_WORKERS, pool.size, len(dates)))
+
+    idle = queue.Queue()
+    idle.put(parser)
+    clones = []
+    clones_lock = threading.Lock()
+
+    def lease():
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            clone = clone_parser(parser)
+            with clones_lock:
+                clones.append(clone)
+            return clone
+
+    def fetch(event_date):
+        # Аренда тоже может не удаться (пул занят другими сессиями, ошибка запуска браузера):
+        # тогда пропускается только эта дата, а не весь прогон
+        worker = None
+        try:
+            worker = lease()
+            started = time.monotonic()
+            if not worker.navigate_to_date(event_date):
+                logger.error(f"Не удалось перейти на дату {event_date}")
+                return event_date, None
+            worker.accept_cookies_if_present()
+            date_results = worker.parse_all_match_results_on_page()
+            complete = worker.last_page_complete
+            logger.info(f"Дата {event_date}: результатов {len(date_results)} за {time.monotonic() - started:.2f} с"
+                        f"{'' if complete else ' (есть матчи без итогового счета)'}")
+            return event_date, (date_results, complete)
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке результатов за {event_date}: {e}")
+            return event_date, None
+        finally:
+            if worker is not None:
+                idle.put(worker)
+
+    started = time.monotonic()
+    try:
+        if workers == 1:
+            fetched = [fetch(event_date) for event_date in dates]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fetched = list(executor.map(fetch, dates))
+    finally:
+        for clone in clones:
+            if clone.driver:
+                # Для сессии из пула quit() возвращает браузер в пул
+                clone.driver.quit()
+                clone.driver = None
+
+    for event_date, page in fetched:
+        if page is None:
+            results[event_date] = None
+            continue
+        date_results, complete = page
+        results[event_date] = date_results
+        if cache and date_results:
+            cache.put(event_date, date_results, complete)
+    if cache:
+        cache.save()
+
+    logger.info(f"Загружено дат: {len(fetched)} за {time.monotonic() - started:.2f} с (потоков {workers})")
+    return results
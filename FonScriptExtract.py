@@ -0,0 +1,165 @@
+from FonExtract import (ODDS_EVENT_SELECTORS, EVENT_NAME_SELECTORS, EVENT_TIME_SELECTORS, FACTOR_CELL_CLASS,
+                        COMPLEX_CELL_CLASS, PARAM_CELL_CLASS, VALUE_CLASS, PARAM_CLASS)
+
+# Извлечение событий линии внутри страницы. Повторяет read_factor_cells из FonExtract:
+# ячейки коэффициентов в порядке документа и тексты всех значений, но без передачи HTML
+ODDS_EXTRACTOR_JS = """
+var blockSelector = arguments[0];
+var nameSelectors = arguments[1];
+var timeSelectors = arguments[2];
+var cls = arguments[3];
+// Только блоки, пересекающие окно (шаг сбора при прокрутке)
+var visibleOnly = arguments[4];
+
+function firstText(root, selectors) {
+    for (var i = 0; i < selectors.length; i++) {
+        var found = root.querySelector(selectors[i]);
+        if (found) {
+            var text = found.textContent.trim();
+            if (text) {
+                return text;
+            }
+        }
+    }
+    return null;
+}
+
+var events = [];
+document.querySelectorAll(blockSelector).forEach(function (block) {
+    if (visibleOnly) {
+        var rect = block.getBoundingClientRect();
+        if (rect.bottom < 0 || rect.top > window.innerHeight) {
+            return;
+        }
+    }
+    var cells = [];
+    var values = [];
+    var cellByElement = new Map();
+
+    block.querySelectorAll('div, span').forEach(function (el) {
+        var list = el.classList;
+        if (el.tagName === 'DIV') {
+            var isFactor = list.contains(cls.factor);
+            var isComplex = list.contains(cls.complex);
+            var isParam = list.contains(cls.param_cell);
+            if (isFactor || isComplex || isParam) {
+                var cell = {factor: isFactor, complex: isComplex, param_cell: isParam, param: null, value: null};
+                cells.push(cell);
+                cellByElement.set(el, cell);
+            }
+            return;
+        }
+
+        var key = list.contains(cls.value) ? 'value' : (list.contains(cls.param) ? 'param' : null);
+        if (!key) {
+            return;
+        }
+        var text = el.textContent;
+        if (key === 'value') {
+            values.push(text.trim());
+        }
+        for (var parent = el.parentElement; parent && parent !== block; parent = parent.parentElement) {
+            var owner = cellByElement.get(parent);
+            if (owner && owner[key] === null) {
+                owner[key] = text;
+            }
+        }
+    });
+
+    events.push({
+        name: firstText(block, nameSelectors),
+        time: firstText(block, timeSelectors),
+        cells: cells,
+        values: values
+    });
+});
+return events;
+"""
+
+# На странице результатов достаточно передать только блоки событий вместо всего документа
+RESULTS_FRAGMENT_JS = """
+var blocks = document.querySelectorAll(arguments[0]);
+var html = [];
+blocks.forEach(function (block) { html.push(block.outerHTML); });
+return '<html><body>' + html.join('') + '</body></html>';
+"""
+
+# HTML блоков линии, пересекающих окно, по каждому селектору (шаг сбора при прокрутке
+# для HTML-бэкендов: разбор остается в Python, но без выгрузки всего документа)
+VISIBLE_FRAGMENTS_JS = """
+var fragments = [];
+arguments[0].forEach(function (selector) {
+    var html = [];
+    document.querySelectorAll(selector).forEach(function (block) {
+        var rect = block.getBoundingClientRect();
+        if (rect.bottom < 0 || rect.top > window.innerHeight) {
+            return;
+        }
+        html.push(block.outerHTML);
+    });
+    if (html.length) {
+        fragments.push([selector, '<html><body>' + html.join('') + '</body></html>']);
+    }
+});
+return fragments;
+"""
+
+# Проверка содержимого страницы без выгрузки page_source в Python
+PAGE_CONTAINS_JS = """
+var html = document.documentElement.innerHTML;
+var lower = html.toLowerCase();
+for (var i = 0; i < arguments[0].length; i++) {
+    if (lower.indexOf(arguments[0][i]) !== -1) { return true; }
+}
+for (var j = 0; j < arguments[1].length; j++) {
+    if (html.indexOf(arguments[1][j]) !== -1) { return true; }
+}
+return false;
+"""
+
+_CELL_CLASSES = {
+    'factor': FACTOR_CELL_CLASS,
+    'complex': COMPLEX_CELL_CLASS,
+    'param_cell': PARAM_CELL_CLASS,
+    'value': VALUE_CLASS,
+    'param': PARAM_CLASS,
+}
+
+
+def extract_odds_blocks(driver, block_selector, visible_only=False):
+    """Компактные данные блоков линии по селектору за один вызов execute_script.
+
+    Каждый элемент: {'name', 'time', 'cells', 'values'}; cells и values в формате read_factor_cells.
+    visible_only=True - только блоки, попадающие в окно.
+    """
+    return driver.execute_script(
+        ODDS_EXTRACTOR_JS,
+        block_selector,
+        [selector for selector, _ in EVENT_NAME_SELECTORS],
+        [selector for selector, _ in EVENT_TIME_SELECTORS],
+        _CELL_CLASSES,
+        visible_only,
+    ) or []
+
+
+def iter_odds_blocks(driver, visible_only=False):
+    """Блоки линии по селекторам в порядке приоритета: (селектор, список блоков)"""
+    for selector, _ in ODDS_EVENT_SELECTORS:
+        blocks = extract_odds_blocks(driver, selector, visible_only)
+        if blocks:
+            yield selector, blocks
+
+
+def extract_results_fragment(driver, block_selector):
+    """HTML только блоков результатов (для разбора тем же кодом, что и полный page_source)"""
+    return driver.execute_script(RESULTS_FRAGMENT_JS, block_selector)
+
+
+def extract_visible_fragments(driver, selectors):
+    """HTML видимых блоков по селекторам в порядке приоритета: [(селектор, html)]"""
+    return [tuple(fragment) for fragment in driver.execute_script(VISIBLE_FRAGMENTS_JS, list(selectors)) or []]
+
+
+def page_contains(driver, lowercase_markers=(), exact_markers=()):
+    """Есть ли на странице хотя бы один маркер (поиск выполняется в браузере)"""
+    return bool(driver.execute_script(PAGE_CONTAINS_JS, list(lowercase_markers), list(exact_markers)))
@@ -0,0 +1,67 @@
+import logging
+import os
+from FonPageReadiness import wait_for_page_ready, ODDS_EVENT_SELECTOR, DEFAULT_QUIET_PERIOD
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SCROLLS = int(os.environ.get('FONBET_MAX_SCROLLS', 50))
+# Шаг прокрутки в долях высоты окна: небольшое перекрытие, чтобы не пропустить блок на границе экрана
+DEFAULT_STEP_RATIO = 0.9
+# Ожидание дорисовки после шага: новые блоки либо появляются быстро, либо их нет
+STEP_TIMEOUT = 5
+# Сколько шагов подряд без новых событий нужно, чтобы прекратить прокрутку:
+# один пустой шаг бывает, когда ленивые строки не успели смонтироваться
+EMPTY_STEPS_TO_STOP = 2
+
+# Отсчет тишины DOM начинается с прокрутки, а не с последней мутации до нее
+SCROLL_STEP_JS = """
+var before = window.scrollY;
+window.scrollBy(0, Math.max(1, Math.floor(window.innerHeight * arguments[0])));
+window.__fonLastMutation = performance.now();
+return window.scrollY - before;
+"""
+
+
+def harvest_while_scrolling(driver, extract, key_func, selector=ODDS_EVENT_SELECTOR,
+                            quiet_period=DEFAULT_QUIET_PERIOD, max_scrolls=DEFAULT_MAX_SCROLLS,
+                            step_ratio=DEFAULT_STEP_RATIO):
+    """Сбор событий по экранам при прокрутке страницы.
+
+    extract() возвращает события, видимые сейчас; строки, которые виртуализированный
+    список убрал из DOM, остаются собранными. Прокрутка останавливается после
+    EMPTY_STEPS_TO_STOP шагов подряд без новых ключей или в конце страницы.
+    Возвращает события в порядке появления.
+    """
+    harvested = {}
+
+    def take():
+        new_keys = 0
+        for item in extract():
+            key = key_func(item)
+            if key not in harvested:
+                harvested[key] = item
+                new_keys += 1
+        return new_keys
+
+    driver.execute_script("window.scrollTo(0, 0);")
+    take()
+
+    scrolls = 0
+    empty_steps = 0
+    while scrolls < max_scrolls:
+        moved = driver.execute_script(SCROLL_STEP_JS, step_ratio)
+        scrolls += 1
+        if not moved:
+            logger.info("Достигнут конец страницы")
+            break
+
+        wait_for_page_ready(driver, selector, quiet_period=quiet_period, timeout=STEP_TIMEOUT)
+        new_keys = take()
+        logger.info(f"Прокрутка {scrolls}: новых событий {new_keys}, всего {len(harvested)}")
+        empty_steps = 0 if new_keys else empty_steps + 1
+        if empty_steps >= EMPTY_STEPS_TO_STOP:
+            break
+
+    driver.execute_script("window.scrollTo(0, 0);")
+    logger.info(f"Сбор при прокрутке завершен: прокруток {scrolls}, событий {len(harvested)}")
+    return list(harvested.values())
@@ -0,0 +1,190 @@
+import logging
+import shutil
+import numpy as np
+import pandas as pd
+from FonFuzzy import WINNER_SUFFIX_RE
+from FonStorage import file_lock, write_atomic, CSV_ENCODING
+
+logger = logging.getLogger(__name__)
+
+WIN = 'WIN'
+LOSS = 'LOSS'
+# Возврат ставки: фора или тотал сыграли ровно по линии
+PUSH = 'PUSH'
+
+# Рынок (колонка с коэффициентом) -> колонка исхода. Коэффициенты остаются числами,
+# исход хранится отдельно: WIN, LOSS, PUSH или пусто (не рассчитан / рынка не было в линии)
+OUTCOME_COLUMNS = {
+    'odds_1': 'res_1',
+    'odds_x': 'res_x',
+    'odds_2': 'res_2',
+    'odds_1x': 'res_1x',
+    'odds_12': 'res_12',
+    'odds_x2': 'res_x2',
+    'fora_1': 'res_fora_1',
+    'fora_2': 'res_fora_2',
+    'total_over': 'res_over',
+    'total_under': 'res_under',
+}
+OUTCOME_FIELDS = list(OUTCOME_COLUMNS.values())
+
+# Линия тотала, если в строке ее нет (как в прежнем update_odds_with_results)
+DEFAULT_TOTAL = 5.5
+
+# "3:2", "2:1 OT (Команда)", "4:3 Б (Команда)"
+_RESULT_RE = r'^\s*(\d+)\s*:\s*(\d+)\s*(OT|ОТ|Б)?'
+# НХЛ хранит ничью основного времени, а победителя овертайма - в названии события: "A — B (A)"
+# (WINNER_SUFFIX_RE из FonFuzzy)
+# Фора "параметр коэффициент": "-1.5 1.82", "+1.5 1.98"; без параметра фору не рассчитать
+_FORA_RE = r'^\s*([+-]?\d+(?:\.\d+)?)\s+\d'
+# Прежний формат файлов результатов: исход дописан перед коэффициентом ("WIN 2.40")
+_LEGACY_MARKER_RE = r'^\s*(WIN|LOSS)\s+'
+LEGACY_MARKED = ('odds_1', 'odds_x', 'odds_2', 'total_over', 'total_under')
+
+
+def _column(frame, name):
+    if name not in frame:
+        return pd.Series('', index=frame.index)
+    return frame[name].fillna('').astype(str)
+
+
+def _number(series):
+    return pd.to_numeric(series.str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype=float)
+
+
+def _margin_outcome(margin, offered):
+    """Исход ставки по знаку запаса: > 0 - WIN, < 0 - LOSS, 0 - PUSH (NaN - не рассчитана)"""
+    outcome = np.select([margin > 0, margin < 0, margin == 0], [WIN, LOSS, PUSH], default='')
+    return np.where(offered, outcome, '')
+
+
+def _binary_outcome(won, settled, offered):
+    return np.where(settled & offered, np.where(won, WIN, LOSS), '')
+
+
+def settle_frame(frame):
+    """Расчет всех рынков для таблицы строк с match_result за одну векторную операцию.
+
+    Исходы 1X2 и двойного шанса считаются по основному времени (матч с овертаймом
+    или буллитами - ничья), форы и тоталы - по сохраненному счету, как и раньше.
+    Колонки исходов дописываются в frame; строки без разборчивого счета остаются
+    нерассчитанными.
+    """
+    parts = _column(frame, 'match_result').str.extract(_RESULT_RE)
+    home = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)
+    away = pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=float)
+    settled = ~np.isnan(home) & ~np.isnan(away)
+    extra_time = parts[2].notna().to_numpy() | _column(frame, 'event_name').str.contains(WINNER_SUFFIX_RE).to_numpy()
+
+    # Разница основного времени: 1 - победа хозяев, 0 - ничья, -1 - победа гостей
+    regular = np.where(extra_time, 0.0, np.sign(home - away))
+
+    offered = {market: (_column(frame, market).str.strip() != '').to_numpy() for market in OUTCOME_COLUMNS}
+    for market, won in (('odds_1', regular > 0), ('odds_x', regular == 0), ('odds_2', regular < 0),
+                        ('odds_1x', regular >= 0), ('odds_12', regular != 0), ('odds_x2', regular <= 0)):
+        frame[OUTCOME_COLUMNS[market]] = _binary_outcome(won, settled, offered[market])
+
+    line = _number(_column(frame, 'total_value'))
+    line = np.where(np.isnan(line), DEFAULT_TOTAL, line)
+    goals = home + away
+    frame['res_over'] = _margin_outcome(goals - line, offered['total_over'])
+    frame['res_under'] = _margin_outcome(line - goals, offered['total_under'])
+
+    for market, sign in (('fora_1', 1), ('fora_2', -1)):
+        handicap = _number(_column(frame, market).str.replace('−', '-', regex=False).str.extract(_FORA_RE)[0])
+        frame[OUTCOME_COLUMNS[market]] = _margin_outcome(sign * (home - away) + handicap, offered[market])
+
+    return frame
+
+
+def settle_rows(rows):
+    """Расчет пачки строк (словарей csv.DictReader) за один проход; исходы записываются в сами строки"""
+    if not rows:
+        return rows
+    frame = settle_frame(pd.DataFrame.from_records(rows))
+    outcomes = frame[OUTCOME_FIELDS].to_dict('records')
+    for row, outcome in zip(rows, outcomes):
+        row.update(outcome)
+    return rows
+
+
+def with_outcome_fields(fieldnames):
+    """Заголовок файла результатов с колонками исходов после match_result"""
+    fieldnames = [name for name in fieldnames if name not in OUTCOME_FIELDS]
+    if 'match_result' not in fieldnames:
+        fieldnames.append('match_result')
+    return fieldnames + OUTCOME_FIELDS
+
+
+def has_legacy_marker(row):
+    """В коэффициентах строки остался исход старого формата ("WIN 2.40")"""
+    return any(str(row.get(field) or '').lstrip().startswith((WIN, LOSS)) for field in LEGACY_MARKED)
+
+
+def has_outcome(row):
+    """Строка уже рассчитана: заполнены колонки исходов (или WIN/LOSS в коэффициентах старого формата)"""
+    if any(row.get(field) for field in OUTCOME_FIELDS):
+        return True
+    return has_legacy_marker(row)
+
+
+def needs_migration(rows):
+    """Строки файла результатов еще в старом формате (нет колонок исходов или остались пометки WIN/LOSS)"""
+    if not rows:
+        return False
+    return not set(OUTCOME_FIELDS) <= rows[0].keys() or any(has_legacy_marker(row) for row in rows)
+
+
+def migrate_frame(frame):
+    """Перевод таблицы старого формата: WIN/LOSS убираются из коэффициентов, все рынки рассчитываются заново.
+
+    Возвращает (таблица, число очищенных ячеек, число строк, где новый исход основных
+    рынков расходится с прежней пометкой - например, PUSH вместо двух WIN на тотале по линии).
+    """
+    cleaned = 0
+    legacy = {}
+    for market in OUTCOME_COLUMNS:
+        if market not in frame:
+            continue
+        values = _column(frame, market)
+        if market in LEGACY_MARKED:
+            legacy[market] = values.str.extract(_LEGACY_MARKER_RE)[0].fillna('')
+        stripped = values.str.replace(_LEGACY_MARKER_RE, '', regex=True)
+        cleaned += int((stripped != values).sum())
+        frame[market] = stripped
+
+    settle_frame(frame)
+
+    changed = np.zeros(len(frame), dtype=bool)
+    for market, marks in legacy.items():
+        marked = (marks != '').to_numpy()
+        changed |= marked & (frame[OUTCOME_COLUMNS[market]].to_numpy() != marks.to_numpy())
+    return frame, cleaned, int(changed.sum())
+
+
+def migrate_rows(rows):
+    """Перевод строк старого формата в памяти (для чтения непереведенного файла; сам файл не меняется)"""
+    if not rows:
+        return rows
+    frame, _, _ = migrate_frame(pd.DataFrame.from_records(rows).fillna(''))
+    return frame.to_dict('records')
+
+
+def migrate_results_file(path, dry_run=False):
+    """Перевод файла *_results_final.csv на колонки исходов (исходный файл сохраняется как .bak)"""
+    # Под блокировкой файла: парсер результатов не перепишет его между чтением и заменой
+    with file_lock(path):
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False, encoding=CSV_ENCODING)
+        migrated = not set(OUTCOME_FIELDS) - set(frame.columns)
+        frame, cleaned, changed = migrate_frame(frame)
+        frame = frame[with_outcome_fields(list(frame.columns))]
+
+        # Повторный запуск не трогает уже переведенный файл (и его .bak)
+        if migrated and not cleaned:
+            return {'rows': len(frame), 'cleaned': 0, 'changed': 0, 'migrated': True}
+
+        if not dry_run:
+            shutil.copy2(path, f"{path}.bak")
+            write_atomic(path, lambda f: frame.to_csv(f, index=False), encoding=CSV_ENCODING, newline='')
+            logger.info(f"Файл {path} переведен на колонки исходов, прежняя версия: {path}.bak")
+    return {'rows': len(frame), 'cleaned': cleaned, 'changed': changed, 'migrated': False}
@@ -0,0 +1,200 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка первого байта файла-замка через msvcrt
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCK_SUFFIX = '.lock'
+CSV_ENCODING = 'utf-8-sig'
+# Права нового файла данных (временный файл mkstemp создается с 0600)
+DEFAULT_MODE = 0o644
+# Windows не дает заменить файл, пока он открыт в другой программе (Excel, просмотрщик):
+# os.replace повторяется с паузой, всего около 30 с
+REPLACE_ATTEMPTS = 60
+REPLACE_DELAY = 0.5
+
+# Замки, уже взятые текущим потоком: путь -> глубина вложенности
+_held = threading.local()
+
+
+def lock_path(path):
+    return path + LOCK_SUFFIX
+
+
+def _try_acquire(f):
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _acquire(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            f.seek(0)
+            # LK_LOCK ждет освобождения сам, но сдается через ~10 с - тогда ждем дальше
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _release(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path):
+    """Эксклюзивная рекомендательная блокировка файла данных (замок - <файл>.lock).
+
+    Писатели из разных процессов и потоков встают в очередь: ожидание блокирующее,
+    без повторных попыток по таймеру. Повторный вход в том же потоке не блокируется.
+    """
+    held = _held.__dict__.setdefault('paths', {})
+    key = os.path.abspath(path)
+    if key in held:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    with open(lock_path(path), 'a+b') as f:
+        if not _try_acquire(f):
+            logger.info(f"Файл {path} занят другим процессом, ожидаем освобождения")
+            _acquire(f)
+        held[key] = 1
+        try:
+            yield
+        finally:
+            del held[key]
+            _release(f)
+
+
+def try_lock(path):
+    """Неблокирующая эксклюзивная блокировка <path>.lock на произвольный срок.
+
+    Возвращает открытый файл-замок или None, если замок занят. Освобождается
+    unlock() или завершением процесса (в том числе аварийным).
+    """
+    f = open(lock_path(path), 'a+b')
+    if _try_acquire(f):
+        return f
+    f.close()
+    return None
+
+
+def unlock(handle):
+    try:
+        _release(handle)
+    finally:
+        handle.close()
+
+
+def is_locked(path):
+    """Идет ли сейчас запись в файл (замок взят кем-то другим)"""
+    if os.path.abspath(path) in _held.__dict__.get('paths', {}):
+        return True
+    try:
+        with open(lock_path(path), 'rb+') as f:
+            if not _try_acquire(f):
+                return True
+            _release(f)
+            return False
+    except FileNotFoundError:
+        return False
+
+
+def _replace(src, dst):
+    """os.replace с повторами на Windows, пока целевой файл занят другим процессом"""
+    for attempt in range(1, REPLACE_ATTEMPTS + 1):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if os.name != 'nt' or attempt == REPLACE_ATTEMPTS:
+                raise
+            if attempt == 1:
+                logger.warning(f"Файл {dst} открыт в другой программе, ждем возможности его заменить")
+            time.sleep(REPLACE_DELAY)
+
+
+def write_atomic(path, write, encoding='utf-8', newline=None):
+    """Запись через временный файл в том же каталоге и os.replace.
+
+    Читатель всегда видит либо прежнюю, либо новую версию файла целиком.
+    write(f) получает открытый временный файл.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = DEFAULT_MODE
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, newline=newline) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        _replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_csv(path, fieldnames, rows):
+    """Перезапись CSV целиком под блокировкой файла"""
+
+    def write(f):
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    with file_lock(path):
+        write_atomic(path, write, encoding=CSV_ENCODING, newline='')
+
+
+def read_csv(path):
+    """Согласованный снимок CSV без блокировки: (fieldnames, rows).
+
+    Перезаписываемые файлы заменяются атомарно; у дописываемого файла во время
+    записи отбрасывается недописанная последняя строка. FileNotFoundError - файла нет.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data and not data.endswith(b'\n') and is_locked(path):
+        data = data[:data.rfind(b'\n') + 1]
+
+    reader = csv.DictReader(io.StringIO(data.decode(CSV_ENCODING), newline=''))
+    rows = list(reader)
+    return list(reader.fieldnames or []), rows
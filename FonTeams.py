@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Команды лиг: id -> (название как на fon.bet, псевдонимы со страниц результатов, полные и английские названия).
+# Ключ лиги совпадает с ключом турнира в FonTournaments
+TEAMS = {
+    'khl': {
+        'lada': ('Лада', ['Лада Тольятти', 'Lada']),
+        'sochi': ('ХК Сочи', ['Сочи', 'HC Sochi', 'Sochi']),
+        'ak_bars': ('Ак Барс', ['Ак Барс Казань', 'Ak Bars']),
+        'barys': ('Барыс', ['Барыс Астана', 'Barys']),
+        'torpedo': ('Торпедо НН', ['Торпедо', 'Торпедо Нижний Новгород', 'Torpedo']),
+        'metallurg': ('Металлург Мг', ['Металлург', 'Металлург Магнитогорск', 'Metallurg Magnitogorsk']),
+        'neftekhimik': ('Нефтехимик', ['Нефтехимик Нижнекамск', 'Neftekhimik']),
+        'amur': ('Амур', ['Амур Хабаровск', 'Amur']),
+        'spartak': ('Спартак', ['Спартак Москва', 'Spartak']),
+        'dragons': ('Шанхай Дрэгонс', ['Шанхайские Дрэгонс', 'Дрэгонс', 'Shanghai Dragons', 'Куньлунь', 'Kunlun']),
+        'avtomobilist': ('Автомобилист', ['Автомобилист Екатеринбург', 'Avtomobilist']),
+        'ska': ('СКА', ['СКА Санкт-Петербург', 'SKA']),
+        'dynamo_msk': ('Динамо Москва', ['Динамо М', 'Dynamo Moscow']),
+        'salavat': ('Салават Юлаев', ['Салават Юлаев Уфа', 'Salavat Yulaev']),
+        'traktor': ('Трактор', ['Трактор Челябинск', 'Traktor']),
+        'severstal': ('Северсталь', ['Северсталь Череповец', 'Severstal']),
+        'dynamo_mn': ('Динамо Минск', ['Динамо Мн', 'Dinamo Minsk']),
+        'lokomotiv': ('Локомотив Ярославль', ['Локомотив', 'Lokomotiv']),
+        'cska': ('ЦСКА', ['ЦСКА Москва', 'CSKA']),
+        'sibir': ('Сибирь', ['Сибирь Новосибирск', 'Sibir']),
+        'avangard': ('Авангард', ['Авангард Омск', 'Avangard']),
+        'admiral': ('Адмирал', ['Адмирал Владивосток', 'Admiral']),
+    },
+    'nhl': {
+        'florida': ('Флорида', ['Флорида Пантерз', 'Florida Panthers', 'Florida']),
+        'chicago': ('Чикаго', ['Чикаго Блэкхокс', 'Chicago Blackhawks', 'Chicago']),
+        'rangers': ('Рейнджерс', ['Нью-Йорк Рейнджерс', 'New York Rangers', 'NY Rangers']),
+        'pittsburgh': ('Питтсбург', ['Питтсбург Пингвинз', 'Pittsburgh Penguins', 'Pittsburgh']),
+        'los_angeles': ('Лос-Анджелес', ['Лос-Анджелес Кингз', 'Los Angeles Kings', 'Los Angeles']),
+        'colorado': ('Колорадо', ['Колорадо Эвеланш', 'Colorado Avalanche', 'Colorado']),
+        'toronto': ('Торонто', ['Торонто Мейпл Лифс', 'Toronto Maple Leafs', 'Toronto']),
+        'montreal': ('Монреаль', ['Монреаль Канадиенс', 'Montreal Canadiens', 'Montreal']),
+        'washington': ('Вашингтон', ['Вашингтон Кэпиталз', 'Washington Capitals', 'Washington']),
+        'boston': ('Бостон', ['Бостон Брюинз', 'Boston Bruins', 'Boston']),
+        'vegas': ('Вегас', ['Вегас Голден Найтс', 'Vegas Golden Knights', 'Vegas']),
+        'edmonton': ('Эдмонтон', ['Эдмонтон Ойлерз', 'Edmonton Oilers', 'Edmonton']),
+        'calgary': ('Калгари', ['Калгари Флэймз', 'Calgary Flames', 'Calgary']),
+        'philadelphia': ('Филадельфия', ['Филадельфия Флайерз', 'Philadelphia Flyers', 'Philadelphia']),
+        'detroit': ('Детройт', ['Детройт Ред Уингз', 'Detroit Red Wings', 'Detroit']),
+        'buffalo': ('Баффало', ['Баффало Сейбрз', 'Buffalo Sabres', 'Buffalo']),
+        'tampa_bay': ('Тампа-Бэй', ['Тампа', 'Тампа-Бэй Лайтнинг', 'Tampa Bay Lightning', 'Tampa Bay']),
+        'ottawa': ('Оттава', ['Оттава Сенаторз', 'Ottawa Senators', 'Ottawa']),
+        'islanders': ('Айлендерс', ['Нью-Йорк Айлендерс', 'New York Islanders', 'NY Islanders']),
+        'carolina': ('Каролина', ['Каролина Харрикейнз', 'Carolina Hurricanes', 'Carolina']),
+        'new_jersey': ('Нью-Джерси', ['Нью-Джерси Девилз', 'New Jersey Devils', 'New Jersey']),
+        'st_louis': ('Сент-Луис', ['Сент-Луис Блюз', 'St. Louis Blues', 'St. Louis']),
+        'minnesota': ('Миннесота', ['Миннесота Уайлд', 'Minnesota Wild', 'Minnesota']),
+        'nashville': ('Нэшвилл', ['Нэшвилл Предаторз', 'Nashville Predators', 'Nashville']),
+        'columbus': ('Коламбус', ['Коламбус Блю Джекетс', 'Columbus Blue Jackets', 'Columbus']),
+        'winnipeg': ('Виннипег', ['Виннипег Джетс', 'Winnipeg Jets', 'Winnipeg']),
+        'dallas': ('Даллас', ['Даллас Старз', 'Dallas Stars', 'Dallas']),
+        'utah': ('Юта', ['Юта Мамонт', 'Юта Хоккей Клаб', 'Utah Mammoth', 'Utah Hockey Club', 'Utah']),
+        'san_jose': ('Сан-Хосе', ['Сан-Хосе Шаркс', 'San Jose Sharks', 'San Jose']),
+        'vancouver': ('Ванкувер', ['Ванкувер Кэнакс', 'Vancouver Canucks', 'Vancouver']),
+        'seattle': ('Сиэтл', ['Сиэтл Кракен', 'Seattle Kraken', 'Seattle']),
+        'anaheim': ('Анахайм', ['Анахайм Дакс', 'Anaheim Ducks', 'Anaheim']),
+    },
+}
+
+# Упоминание лиги в названии события тоже относит его к лиге (спецсобытия без команд из реестра)
+LEAGUE_MARKERS = {
+    'khl': ['КХЛ', 'KHL'],
+    'nhl': ['НХЛ', 'NHL'],
+}
+
+# Дополнительные лиги и псевдонимы: {"vhl": {"teams": {"id": ["Название", ["псевдоним", ...]]}, "markers": [...]}}
+TEAMS_FILE = os.environ.get('FONBET_TEAMS_FILE', 'teams.json')
+
+# Латинские буквы, похожие на кириллические (встречаются в названиях со страниц, например "Дрэгонc").
+# Общая таблица для normalize_name и FonFuzzy.fold_name
+LOOKALIKES = str.maketrans('caeopxykb', 'саеорхукб')
+_CYRILLIC_RE = re.compile('[а-я]')
+_PUNCTUATION = str.maketrans({'-': ' ', '.': ' ', 'ё': 'е'})
+
+
+def normalize_name(text):
+    """Нижний регистр, дефисы и точки как пробелы, латинские двойники в кириллических словах"""
+    words = text.lower().translate(_PUNCTUATION).split()
+    return ' '.join(word.translate(LOOKALIKES) if _CYRILLIC_RE.search(word) else word for word in words)
+
+
+class TeamRegistry:
+    """Команды и псевдонимы всех лиг с одним скомпилированным шаблоном поиска"""
+
+    def __init__(self, teams=None, markers=None):
+        teams = TEAMS if teams is None else teams
+        markers = LEAGUE_MARKERS if markers is None else markers
+
+        self.names = {}
+        self.leagues = {}
+        self.markers = {}
+        alias_owners = {}
+
+        for league, league_teams in teams.items():
+            for slug, (name, aliases) in league_teams.items():
+                team_id = f"{league}:{slug}"
+                self.names[team_id] = name
+                self.leagues.setdefault(league, set()).add(team_id)
+                for alias in [name] + list(aliases):
+                    owners = alias_owners.setdefault(normalize_name(alias), [])
+                    if team_id not in owners:
+                        owners.append(team_id)
+
+        for league, league_markers in markers.items():
+            for marker in league_markers:
+                alias_owners.setdefault(normalize_name(marker), [])
+                self.markers.setdefault(normalize_name(marker), set()).add(league)
+
+        self.alias_owners = alias_owners
+        self.known_leagues = set(self.leagues).union(*self.markers.values())
+        # Длинные псевдонимы раньше коротких: "локомотив ярославль" выигрывает у "локомотив"
+        alternation = '|'.join(re.escape(alias).replace(r'\ ', r'\s+')
+                               for alias in sorted(alias_owners, key=len, reverse=True))
+        self.pattern = re.compile(rf'(?<!\w)(?:{alternation})(?!\w)')
+        self._match_cached = lru_cache(maxsize=8192)(self._match)
+
+    def _match(self, event_name, league):
+        team_ids = []
+        leagues = set()
+        for found in self.pattern.finditer(normalize_name(event_name)):
+            alias = found.group(0)
+            leagues.update(self.markers.get(alias, ()))
+            owners = self.alias_owners.get(alias, [])
+            if league:
+                owners = [team_id for team_id in owners if team_id in self.leagues.get(league, ())]
+            if owners and owners[0] not in team_ids:
+                team_ids.append(owners[0])
+                leagues.add(owners[0].split(':', 1)[0])
+        return tuple(team_ids), frozenset(leagues)
+
+    def match(self, event_name, league=None):
+        """Все команды события в порядке упоминания и лиги, к которым оно относится"""
+        return self._match_cached(event_name or '', league)
+
+    def match_teams(self, event_name, league=None):
+        """(id хозяев, id гостей) за один проход по названию; None, если команда не распознана"""
+        team_ids, _ = self.match(event_name, league)
+        return (team_ids[0] if team_ids else None,
+                team_ids[1] if len(team_ids) > 1 else None)
+
+    def is_league_event(self, event_name, league):
+        """Относится ли событие к лиге (для лиг без реестра команд - всегда да)"""
+        if league not in self.known_leagues:
+            return True
+        return league in self.match(event_name, league)[1]
+
+    def find_by_teams(self, event_name, candidates, league=None):
+        """Кандидат с той же парой команд (порядок важен), например "A — B (A)" для "A — B" """
+        home, away = self.match_teams(event_name, league)
+        if not home or not away:
+            return None
+        for candidate in candidates:
+            if self.match_teams(candidate, league) == (home, away):
+                return candidate
+        return None
+
+    def canonical_name(self, team_id):
+        return self.names.get(team_id)
+
+
+def load_teams_file(path=TEAMS_FILE):
+    """Команды и маркеры лиг с учетом дополнительного JSON (файл необязателен)"""
+    teams = {league: dict(league_teams) for league, league_teams in TEAMS.items()}
+    markers = {league: list(league_markers) for league, league_markers in LEAGUE_MARKERS.items()}
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                extra = json.load(f)
+            for league, entry in extra.items():
+                for slug, (name, aliases) in entry.get('teams', {}).items():
+                    teams.setdefault(league, {})[slug] = (name, list(aliases))
+                markers.setdefault(league, []).extend(entry.get('markers', []))
+            logger.info(f"Загружен реестр команд из {path}: лиг {len(extra)}")
+        except Exception as e:
+            logger.error(f"Ошибка при чтении реестра команд {path}: {e}")
+    return teams, markers
+
+
+@lru_cache(maxsize=None)
+def get_team_registry():
+    """Реестр команд, собранный один раз на процесс"""
+    teams, markers = load_teams_file()
+    return TeamRegistry(teams, markers)
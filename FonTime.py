@@ -0,0 +1,84 @@
+import logging
+import re
+from calendar import isleap
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+EVENT_TIME_FORMAT = "%d.%m.%Y %H:%M"
+
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
+}
+
+# "Сегодня в 19:30", "Завтра в 02:00"
+RELATIVE_RE = re.compile(r'(Сегодня|Завтра)\b.*?\sв\s+(\d{1,2}):(\d{2})', re.IGNORECASE)
+# "9 октября в 02:00" (год на странице обычно не пишется, но допускается)
+DATE_RE = re.compile(r'(\d{1,2})\s+(' + '|'.join(MONTHS) + r')(?:\s+(\d{4}))?\s+в\s+(\d{1,2}):(\d{2})',
+                     re.IGNORECASE)
+
+# Дата без года дальше полугода от опорной относится к соседнему году:
+# в декабре "5 января" - это январь следующего года
+ROLLOVER_DAYS = 183
+
+CACHE_SIZE = 4096
+
+
+def resolve_year(day, month, ref_date):
+    """Дата с годом, ближайшая к опорной"""
+    candidate = date(ref_date.year, month, day) if (month, day) != (2, 29) else None
+    if candidate is None:
+        # 29 февраля - ближайший к опорной дате високосный год (они идут не реже раза в 8 лет)
+        leap_days = [date(year, 2, 29) for year in range(ref_date.year - 4, ref_date.year + 5) if isleap(year)]
+        return min(leap_days, key=lambda leap_day: abs((leap_day - ref_date).days))
+
+    delta = (candidate - ref_date).days
+    if delta < -ROLLOVER_DAYS:
+        return candidate.replace(year=ref_date.year + 1)
+    if delta > ROLLOVER_DAYS:
+        return candidate.replace(year=ref_date.year - 1)
+    return candidate
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalize(raw, ref_date):
+    match = RELATIVE_RE.search(raw)
+    if match:
+        day = ref_date + timedelta(days=1 if match.group(1).lower() == 'завтра' else 0)
+        hour, minute = int(match.group(2)), int(match.group(3))
+    else:
+        match = DATE_RE.search(raw)
+        if not match:
+            # Если формат неизвестен, возвращаем оригинальный текст
+            return raw
+        day_of_month, month = int(match.group(1)), MONTHS[match.group(2).lower()]
+        if match.group(3):
+            day = date(int(match.group(3)), month, day_of_month)
+        else:
+            day = resolve_year(day_of_month, month, ref_date)
+        hour, minute = int(match.group(4)), int(match.group(5))
+
+    return datetime(day.year, day.month, day.day, hour, minute).strftime(EVENT_TIME_FORMAT)
+
+
+def normalize_event_time(raw, ref_date=None):
+    """Время события со страницы линии в формате dd.mm.yyyy HH:MM.
+
+    ref_date - дата, относительно которой считаются "Сегодня"/"Завтра" и год (по умолчанию сегодня).
+    Нераспознанный текст возвращается без изменений.
+    """
+    try:
+        return _normalize(raw, ref_date or date.today())
+    except Exception as e:
+        logger.warning(f"Не удалось распарсить время: {raw}, ошибка: {e}")
+        return raw
+
+
+def cache_info():
+    return _normalize.cache_info()
+
+
+def cache_clear():
+    _normalize.cache_clear()
@@ -0,0 +1,104 @@
+import importlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ODDS_URL_TEMPLATE = "https://fon.bet/sports/hockey/tournament/{tournament_id}"
+RESULTS_URL_TEMPLATE = "https://fon.bet/results/hockey/{results_id}"
+
+# Реестр отслеживаемых турниров. tournament_id - id в адресе линии и сегмента в ответах линии,
+# results_id - id турнира на странице результатов
+TOURNAMENTS = {
+    'khl': {
+        'name': 'КХЛ',
+        'tournament_id': 776,
+        'results_id': 13283,
+        'odds_file': 'khl_odds.csv',
+        'history_file': 'khl_odds_history.jsonl',
+        'pending_file': 'khl_pending.json',
+        'results_file': 'khl_results_final.csv',
+        'odds_parser': 'KhlFonParser.KhlFonBetParser',
+        'results_parser': 'KhlFonResParser.KhlResultsParser',
+    },
+    'nhl': {
+        'name': 'НХЛ',
+        'tournament_id': 129,
+        'results_id': 11781,
+        'odds_file': 'nhl_odds.csv',
+        'history_file': 'nhl_odds_history.jsonl',
+        'pending_file': 'nhl_pending.json',
+        'results_file': 'nhl_results_final.csv',
+        'odds_parser': 'NhlFonParser.NhlFonBetParser',
+        'results_parser': 'NhlFonResParser.NhlResultsParser',
+    },
+}
+
+# Дополнительные турниры без правки кода: JSON {"vhl": {"name": ..., "tournament_id": ..., ...}}
+TOURNAMENTS_FILE = os.environ.get('FONBET_TOURNAMENTS_FILE', 'tournaments.json')
+
+
+def register_tournament(key, **fields):
+    """Добавление или обновление турнира в реестре.
+
+    Недостающие поля берутся из КХЛ (парсеры) или строятся по ключу (имена файлов).
+    """
+    if 'tournament_id' not in fields and key not in TOURNAMENTS:
+        raise ValueError(f"Для турнира {key} не указан tournament_id")
+
+    tournament = dict(TOURNAMENTS.get(key) or {
+        'name': key.upper(),
+        'results_id': None,
+        'odds_file': f'{key}_odds.csv',
+        'history_file': f'{key}_odds_history.jsonl',
+        'pending_file': f'{key}_pending.json',
+        'results_file': f'{key}_results_final.csv',
+        'odds_parser': TOURNAMENTS['khl']['odds_parser'],
+        'results_parser': TOURNAMENTS['khl']['results_parser'],
+    })
+    tournament.update(fields)
+    TOURNAMENTS[key] = tournament
+    return tournament
+
+
+def load_tournaments_file(path=TOURNAMENTS_FILE):
+    """Подгрузка дополнительных турниров из JSON (файл необязателен)"""
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        for key, fields in entries.items():
+            register_tournament(key, **fields)
+        logger.info(f"Загружено турниров из {path}: {len(entries)}")
+        return len(entries)
+    except Exception as e:
+        logger.error(f"Ошибка при чтении реестра турниров {path}: {e}")
+        return 0
+
+
+def get_tournament(key):
+    """Описание турнира с адресами страниц линии и результатов"""
+    try:
+        tournament = dict(TOURNAMENTS[key])
+    except KeyError:
+        raise ValueError(f"Неизвестный турнир: {key}. Доступны: {', '.join(TOURNAMENTS)}")
+    tournament['key'] = key
+    tournament['odds_url'] = ODDS_URL_TEMPLATE.format(tournament_id=tournament['tournament_id'])
+    tournament['results_url'] = (RESULTS_URL_TEMPLATE.format(results_id=tournament['results_id'])
+                                 if tournament.get('results_id') else None)
+    return tournament
+
+
+def tournament_keys():
+    return list(TOURNAMENTS)
+
+
+def load_parser_class(dotted_path):
+    """Класс парсера по пути 'Модуль.Класс' (модули парсеров лежат в корне проекта)"""
+    module_name, class_name = dotted_path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+load_tournaments_file()
@@ -1,18 +1,26 @@
-import time
-import csv
 import logging
 import os
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from bs4 import BeautifulSoup
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException
+from FonDriverPool import get_driver_pool
+from FonPageReadiness import wait_for_page_ready, RESULTS_EVENT_SELECTOR, DEFAULT_QUIET_PERIOD
+from FonReplay import save_snapshot
+from FonExtract import (make_soup, resolve_backend, select_team_names, select_final_scores, RESULTS_EVENT,
+                        SCRIPT_BACKEND, OVERTIME_BLOCK, SCORE_BLOCK, SCORE_CELL)
+from FonScriptExtract import extract_results_fragment
+from FonTournaments import get_tournament
+from FonProfile import accept_cookies
+from FonTeams import get_team_registry
+from FonResultsFetch import fetch_results_by_date
+from FonResultsCache import ResultsCache
+from FonFuzzy import fold_name, get_matcher
+from FonAppendCsv import event_key
+from FonPending import PendingIndex
+from FonStorage import file_lock, read_csv, write_csv
+from FonSettlement import settle_rows, has_outcome, with_outcome_fields, OUTCOME_FIELDS
 import shutil
-import difflib
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,33 +28,38 @@ logger = logging.getLogger(__name__)
 
 
 class KhlResultsParser:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, driver_pool=None, quiet_period=DEFAULT_QUIET_PERIOD,
+                 offline=False, snapshot_dir=None, backend=None, tournament=None, workers=None,
+                 use_cache=True):
         self.driver = None
         self.headless = headless
-        self.base_url = "https://fon.bet/results/hockey/13283"  # Прямая ссылка на КХЛ
-        self.setup_driver()
+        self.driver_pool = driver_pool
+        self.quiet_period = quiet_period
+        # offline=True - без браузера, страницы подаются в парсер напрямую (режим воспроизведения)
+        self.offline = offline
+        self.snapshot_dir = snapshot_dir
+        # Бэкенд извлечения: 'lxml' (по умолчанию), 'html.parser' или 'script' (блоки событий из браузера)
+        self.backend = resolve_backend(backend)
+        # Прямая ссылка на результаты турнира из реестра FonTournaments
+        self.tournament = get_tournament(tournament or 'khl')
+        self.teams = get_team_registry()
+        self.base_url = self.tournament['results_url']
+        # Сколько дат загружать одновременно (по умолчанию FONBET_RESULTS_WORKERS)
+        self.workers = workers
+        # Все матчи последней разобранной страницы с итоговым счетом (для кеша результатов)
+        self.last_page_complete = False
+        # Кеш разобранных дат: окончательные даты не загружаются повторно
+        self.results_cache = ResultsCache(self.tournament['key']) if use_cache else None
+        if not offline:
+            self.setup_driver()
 
     def setup_driver(self):
-        """Настройка Selenium WebDriver с автоматической установкой драйвера"""
+        """Получение Selenium WebDriver из пула"""
         try:
-            options = Options()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_experimental_option('excludeSwitches', ['enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
-            options.add_argument(
-                '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--window-size=1920,1080')
-
-            # Правильная инициализация драйвера
-            service = webdriver.chrome.service.Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=options)
-
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # Сессия арендуется из общего пула прогретых браузеров,
+            # driver.quit() возвращает ее обратно в пул
+            pool = self.driver_pool or get_driver_pool(self.headless)
+            self.driver = pool.acquire()
 
             logger.info("WebDriver успешно настроен")
 
@@ -76,7 +89,8 @@ class KhlResultsParser:
 
             # Ожидание загрузки
             self.wait_for_page_load()
-            time.sleep(3)
+            # Ждем появления результатов и затихания DOM вместо фиксированной паузы
+            wait_for_page_ready(self.driver, RESULTS_EVENT_SELECTOR, quiet_period=self.quiet_period)
 
             # Проверяем, что мы на правильной странице
             current_url = self.driver.current_url
@@ -92,34 +106,9 @@ class KhlResultsParser:
             return False
 
     def accept_cookies_if_present(self):
-        """Принятие cookies, если появилось окно"""
+        """Принятие cookies, если появилось окно (при сохраненном согласии баннер не ищется)"""
         try:
-            time.sleep(2)
-
-            cookie_selectors = [
-                'button[class*="cookie"]',
-                'button[class*="accept"]',
-                'div[class*="cookie"] button',
-                '//button[contains(text(), "Принять")]',
-                '//button[contains(text(), "Accept")]',
-                '//button[contains(text(), "Согласен")]'
-            ]
-
-            for selector in cookie_selectors:
-                try:
-                    if selector.startswith('//'):
-                        button = self.driver.find_element(By.XPATH, selector)
-                    else:
-                        button = self.driver.find_element(By.CSS_SELECTOR, selector)
-
-                    if button.is_displayed():
-                        button.click()
-                        logger.info("Cookies приняты")
-                        time.sleep(1)
-                        break
-                except NoSuchElementException:
-                    continue
-
+            accept_cookies(self.driver, quiet_period=self.quiet_period)
         except Exception as e:
             logger.debug(f"Окно cookies не найдено или не может быть закрыто: {e}")
 
@@ -155,83 +144,53 @@ class KhlResultsParser:
             return False
 
     def normalize_team_name(self, name):
-        """Нормализация названия команды для сравнения"""
-        # Заменяем латинские буквы на кириллические
-        replacements = {
-            'c': 'с',  # латинская c -> кириллическая с
-            'a': 'а',  # латинская a -> кириллическая а
-            'e': 'е',  # латинская e -> кириллическая е
-            'o': 'о',  # латинская o -> кириллическая о
-            'p': 'р',  # латинская p -> кириллическая р
-            'x': 'х',  # латинская x -> кириллическая х
-            'y': 'у',  # латинская y -> кириллическая у,
-            'k': 'к',  # латинская k -> кириллическая к
-            'b': 'б',  # латинская b -> кириллическая б
-        }
-
-        normalized = name.lower()
-        for lat, cyr in replacements.items():
-            normalized = normalized.replace(lat, cyr)
-
-        # Убираем лишние пробелы и приводим к нижнему регистру
-        return ' '.join(normalized.split())
+        """Нормализация названия команды для сравнения (латинские двойники -> кириллица, нижний регистр)"""
+        return fold_name(name)
 
     def find_best_match(self, event_name, available_names):
         """Поиск наилучшего совпадения среди доступных названий"""
-        normalized_event = self.normalize_team_name(event_name)
-
-        best_match = None
-        best_ratio = 0
-
-        for available_name in available_names:
-            normalized_available = self.normalize_team_name(available_name)
+        # Сначала по паре команд из реестра: псевдонимы и полные названия сводятся к одним id
+        match = self.teams.find_by_teams(event_name, available_names, self.tournament['key'])
+        if match:
+            return match
 
-            # Простое сравнение строк
-            if normalized_event == normalized_available:
-                return available_name
+        # Нечеткое сравнение только с кандидатами, близкими по триграммам
+        return get_matcher(available_names).best_match(event_name)
 
-            # Сравнение с использованием difflib для частичных совпадений
-            ratio = difflib.SequenceMatcher(None, normalized_event, normalized_available).ratio()
-
-            if ratio > best_ratio and ratio > 0.7:  # Понижен порог до 70% для лучшего сопоставления
-                best_ratio = ratio
-                best_match = available_name
-
-        return best_match
-
-    def parse_all_match_results_on_page(self):
-        """Парсинг ВСЕХ результатов матчей на текущей странице"""
+    def parse_all_match_results_on_page(self, page_source=None):
+        """Парсинг ВСЕХ результатов матчей на текущей странице (page_source - готовый HTML для офлайн-воспроизведения)"""
         try:
-            # Даем время для полной загрузки
-            time.sleep(3)
+            if page_source is None:
+                # Ждем полной загрузки: события на месте и DOM затих
+                wait_for_page_ready(self.driver, RESULTS_EVENT_SELECTOR, quiet_period=self.quiet_period)
+
+                if self.backend == SCRIPT_BACKEND:
+                    # Из браузера передаются только блоки событий, а не весь документ
+                    page_source = extract_results_fragment(self.driver, RESULTS_EVENT_SELECTOR)
+                else:
+                    page_source = self.driver.page_source
+                if self.snapshot_dir:
+                    save_snapshot(self.snapshot_dir, 'khl_results', page_source)
 
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+            soup = make_soup(page_source, self.backend)
 
             # Ищем все события на странице
-            event_elements = soup.find_all('div', class_='results-event--Me6XJ')
+            event_elements = RESULTS_EVENT.select(soup)
             logger.info(f"Найдено событий на странице: {len(event_elements)}")
 
             results = {}
+            # Блоков матчей с командами: страница окончательна, если у каждого есть итоговый счет
+            matches = 0
             available_names = []  # Сохраняем все найденные названия для отладки
 
             for event_element in event_elements:
                 try:
                     # Парсим названия команд - улучшенный поиск
-                    team_name_selectors = [
-                        'div.results-event-team__name--lRkNU div.overflowed-text--JHSWr',
-                        'div.results-event-team__caption--Ra_Se',
-                        'div[class*="event-team__name"]'
-                    ]
-
-                    team_names = []
-                    for selector in team_name_selectors:
-                        name_elements = event_element.select(selector)
-                        if name_elements and len(name_elements) >= 2:
-                            team_names = [elem.get_text(strip=True) for elem in name_elements[:2]]
-                            break
+                    team_names = select_team_names(event_element)
 
                     if len(team_names) < 2:
                         continue
+                    matches += 1
 
                     team1_name = team_names[0]
                     team2_name = team_names[1]
@@ -246,15 +205,14 @@ class KhlResultsParser:
                     logger.info(f"Найдены команды: {team1_name} vs {team2_name}")
 
                     # ПРОВЕРКА НА ОВЕРТАЙМ И БУЛЛИТЫ
-                    overtime_selector = 'div.results-scoreBlock--aHrej.results-scoreBoard__sum-subEvents--_LZ3a'
-                    overtime_elements = event_element.select(overtime_selector)
+                    overtime_elements = OVERTIME_BLOCK.select(event_element)
 
                     is_overtime_or_shootout = False
                     winning_team = None
 
                     if overtime_elements:
                         for ot_element in overtime_elements:
-                            ot_scores = ot_element.select('div.results-scoreBlock__score--XvlMM')
+                            ot_scores = SCORE_CELL.select(ot_element)
                             if len(ot_scores) >= 2:
                                 ot_text_1 = ot_scores[0].get_text(strip=True)
                                 ot_text_2 = ot_scores[1].get_text(strip=True)
@@ -283,20 +241,7 @@ class KhlResultsParser:
                                     break
 
                     # УЛУЧШЕННЫЙ ПАРСИНГ СЧЕТА
-                    score_selectors = [
-                        'div.results-scoreBlock__score--XvlMM._summary--Jt8Ej._bold--JaGTY',
-                        'div[class*="scoreBlock__score"][class*="_summary"]',
-                        'div.results-scoreBlock__score--XvlMM'
-                    ]
-
-                    final_scores = []
-                    for selector in score_selectors:
-                        score_elements = event_element.select(selector)
-                        if score_elements and len(score_elements) >= 2:
-                            # Берем последние два элемента (финальный счет)
-                            final_scores = [elem.get_text(strip=True) for elem in score_elements[-2:]]
-                            if all(score.isdigit() for score in final_scores):
-                                break
+                    final_scores = select_final_scores(event_element)
 
                     if len(final_scores) >= 2 and all(score.isdigit() for score in final_scores):
                         score1 = final_scores[0]
@@ -319,11 +264,11 @@ class KhlResultsParser:
                         logger.info(f"Результат матча: {event_key_1} - {result}")
                     else:
                         # Альтернативный метод: поиск по структуре таблицы
-                        score_blocks = event_element.select('div.results-scoreBlock--aHrej')
+                        score_blocks = SCORE_BLOCK.select(event_element)
                         if score_blocks:
                             # Последний блок обычно содержит финальный счет
                             last_block = score_blocks[-1]
-                            scores = last_block.select('div.results-scoreBlock__score--XvlMM')
+                            scores = SCORE_CELL.select(last_block)
                             if len(scores) >= 2:
                                 score1 = scores[0].get_text(strip=True)
                                 score2 = scores[1].get_text(strip=True)
@@ -350,38 +295,18 @@ class KhlResultsParser:
 
             logger.info(f"Всего найдено результатов на странице: {len(results)}")
             logger.info(f"Доступные названия событий: {available_names}")
+            # Каждый матч дает два ключа (прямой и обратный порядок команд)
+            self.last_page_complete = matches > 0 and len(results) == 2 * matches
             return results
 
         except Exception as e:
             logger.error(f"Ошибка при парсинге результатов на странице: {e}")
+            self.last_page_complete = False
             return {}
 
     def is_already_processed(self, row):
-        """Проверяем, обработана ли уже строка (есть ли WIN/LOSS в котировках)"""
-        try:
-            # Проверяем основные котировки на наличие WIN/LOSS
-            odds_1 = str(row.get('odds_1', ''))
-            odds_x = str(row.get('odds_x', ''))
-            odds_2 = str(row.get('odds_2', ''))
-
-            # Если в любой из основных котировок есть WIN или LOSS - строка уже обработана
-            if any(marker in odds_1.upper() or marker in odds_x.upper() or marker in odds_2.upper()
-                   for marker in ['WIN', 'LOSS']):
-                return True
-
-            # Также проверяем тоталы
-            total_over = str(row.get('total_over', ''))
-            total_under = str(row.get('total_under', ''))
-
-            if any(marker in total_over.upper() or marker in total_under.upper()
-                   for marker in ['WIN', 'LOSS']):
-                return True
-
-            return False
-
-        except Exception as e:
-            logger.error(f"Ошибка при проверке обработки строки: {e}")
-            return False
+        """Проверяем, обработана ли уже строка (заполнены колонки исходов res_*)"""
+        return has_outcome(row)
 
     def has_match_result(self, row):
         """Проверяем, есть ли уже результат матча"""
@@ -392,126 +317,31 @@ class KhlResultsParser:
             logger.error(f"Ошибка при проверке результата матча: {e}")
             return False
 
-    def update_odds_with_results(self, row, result):
-        """Обновление котировок на основе результата"""
-        try:
-            # Проверяем, является ли результат матчем с овертаймом/буллитами
-            is_overtime_or_shootout = 'OT' in result or 'Б' in result or 'ОТ' in result
-
-            if is_overtime_or_shootout:
-                # Для матчей с овертаймом/буллитами ставим WIN на ничью (X)
-                row['odds_1'] = f"LOSS {row['odds_1']}"
-                row['odds_x'] = f"WIN {row['odds_x']}"
-                row['odds_2'] = f"LOSS {row['odds_2']}"
-
-                # Извлекаем счет для тоталов (убираем OT/Б часть)
-                score_part = result.split()[0]  # Берем только часть со счетом "3:2"
-                score1, score2 = map(int, score_part.split(':'))
-
-                # Обновляем event_name с информацией о победителе
-                if '(' in result and ')' in result:
-                    # Извлекаем имя победившей команды из скобок
-                    winner_start = result.find('(') + 1
-                    winner_end = result.find(')')
-                    winning_team = result[winner_start:winner_end]
-
-                    # Добавляем информацию о победителе в название события
-                    if winning_team and winning_team not in row['event_name']:
-                        row['event_name'] = f"{row['event_name']} ({winning_team})"
-                        logger.info(f"Добавлен победитель в название события: {winning_team}")
-
-            else:
-                # Обычный матч (основное время)
-                score1, score2 = map(int, result.split(':'))
-
-                # Определяем исход матча
-                if score1 > score2:
-                    # Победа первой команды
-                    row['odds_1'] = f"WIN {row['odds_1']}"
-                    row['odds_x'] = f"LOSS {row['odds_x']}"
-                    row['odds_2'] = f"LOSS {row['odds_2']}"
-                elif score1 < score2:
-                    # Победа второй команды
-                    row['odds_1'] = f"LOSS {row['odds_1']}"
-                    row['odds_x'] = f"LOSS {row['odds_x']}"
-                    row['odds_2'] = f"WIN {row['odds_2']}"
-                else:
-                    # Ничья
-                    row['odds_1'] = f"LOSS {row['odds_1']}"
-                    row['odds_x'] = f"WIN {row['odds_x']}"
-                    row['odds_2'] = f"LOSS {row['odds_2']}"
-
-            # Обновляем тоталы (для обоих случаев)
-            total_score = score1 + score2
-            total_value = float(row['total_value']) if row['total_value'] and row['total_value'].replace('.',
-                                                                                                         '').isdigit() else 5.5
-
-            if total_score > total_value:
-                row['total_over'] = f"WIN {row['total_over']}"
-                row['total_under'] = f"LOSS {row['total_under']}"
-            elif total_score < total_value:
-                row['total_over'] = f"LOSS {row['total_over']}"
-                row['total_under'] = f"WIN {row['total_under']}"
-            else:
-                # Если тотал равен - обе котировки WIN
-                row['total_over'] = f"WIN {row['total_over']}"
-                row['total_under'] = f"WIN {row['total_under']}"
-
-            return row
-
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении котировок: {e}")
-            return row
-
-    def safe_file_operation(self, filename, operation, *args):
-        """Безопасная операция с файлом с несколькими попытками"""
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            try:
-                return operation(filename, *args)
-            except PermissionError:
-                if attempt < max_attempts - 1:
-                    logger.warning(f"Файл {filename} заблокирован, попытка {attempt + 1} из {max_attempts}")
-                    time.sleep(2)
-                else:
-                    logger.error(f"Файл {filename} все еще заблокирован после {max_attempts} попыток")
-                    raise
-            except Exception as e:
-                logger.error(f"Ошибка при работе с файлом {filename}: {e}")
-                raise
-
     def load_csv_data(self, filename):
-        """Загрузка данных из CSV файла"""
-
-        def read_file(fname):
-            with open(fname, 'r', encoding='utf-8-sig') as csvfile:
-                reader = csv.DictReader(csvfile)
-                fieldnames = reader.fieldnames
-                rows = list(reader)
-                return fieldnames, rows
-
-        return self.safe_file_operation(filename, read_file)
+        """Загрузка данных из CSV файла (согласованный снимок, даже если файл сейчас дописывается)"""
+        return read_csv(filename)
 
     def save_csv_data(self, filename, fieldnames, rows):
-        """Сохранение данных в CSV файл"""
+        """Сохранение данных в CSV файл: временный файл и атомарная замена под блокировкой"""
+        write_csv(filename, fieldnames, rows)
 
-        def write_file(fname, fnames, rws):
-            with open(fname, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fnames)
-                writer.writeheader()
-                writer.writerows(rws)
-
-        return self.safe_file_operation(filename, write_file, fieldnames, rows)
+    def is_settled(self, row):
+        """Строка уже рассчитана (есть исходы рынков или результат матча)"""
+        return self.is_already_processed(row) or self.has_match_result(row)
 
     def merge_rows(self, existing_rows, new_rows):
-        """Объединение существующих и новых строк с сохранением результатов"""
-        merged_rows = []
+        """Объединение существующих и новых строк с сохранением результатов.
+
+        Строки файла результатов остаются на своих местах (новые строки приходят
+        только из индекса нерассчитанных событий, а не из всего файла линии).
+        """
+        merged_rows = list(existing_rows)
 
         # Создаем словарь для быстрого поиска существующих строк
         existing_dict = {}
-        for row in existing_rows:
+        for i, row in enumerate(merged_rows):
             key = (row.get('event_name', ''), row.get('event_time', ''), row.get('parse_timestamp', ''))
-            existing_dict[key] = row
+            existing_dict[key] = i
 
         # Обрабатываем новые строки
         for new_row in new_rows:
@@ -519,32 +349,45 @@ class KhlResultsParser:
 
             if key in existing_dict:
                 # Если строка уже существует, проверяем есть ли результат
-                existing_row = existing_dict[key]
-                if self.has_match_result(existing_row) or self.is_already_processed(existing_row):
+                i = existing_dict[key]
+                if self.is_settled(merged_rows[i]):
                     # Сохраняем существующую строку с результатом
-                    merged_rows.append(existing_row)
-                    logger.info(f"Сохранен существующий результат для: {existing_row['event_name']}")
+                    logger.info(f"Сохранен существующий результат для: {merged_rows[i]['event_name']}")
                 else:
                     # Используем новую строку (без результата)
-                    merged_rows.append(new_row)
+                    merged_rows[i] = new_row
             else:
                 # Новая строка, добавляем как есть
+                existing_dict[key] = len(merged_rows)
                 merged_rows.append(new_row)
 
         return merged_rows
 
     def process_csv_file(self, input_filename='khl_odds.csv', output_filename='khl_results_final.csv'):
+        """Обработка CSV под блокировкой файла результатов: второй прогон по той же лиге ждет первый"""
+        with file_lock(output_filename):
+            return self.settle_csv_file(input_filename, output_filename)
+
+    def settle_csv_file(self, input_filename, output_filename):
         """Основной метод обработки CSV файла с сохранением существующих результатов"""
         try:
             logger.info(f"Используем выходной файл: {output_filename}")
 
-            # Загружаем данные из исходного файла
+            # Нерассчитанные события из индекса вместо всего файла линии
+            pending = PendingIndex(self.tournament['pending_file'])
             try:
-                fieldnames, input_rows = self.load_csv_data(input_filename)
-                logger.info(f"Загружено {len(input_rows)} событий из {input_filename}")
+                pending_events = pending.open(input_filename, output_filename, self.is_settled)
             except FileNotFoundError:
                 logger.error(f"Исходный файл {input_filename} не найден")
                 return False
+            fieldnames = list(pending.fieldnames)
+            input_rows = list(pending_events.values())
+            due, expired = pending.partition()
+            logger.info(f"Нерассчитанных событий в {pending.path}: {len(input_rows)}, готовы к расчету: {len(due)}, "
+                        f"вышли из окна расчета: {len(expired)}")
+            if not due and not expired:
+                logger.info("Нет событий, готовых к расчету")
+                return True
 
             # Проверяем, существует ли уже выходной файл
             if os.path.exists(output_filename):
@@ -552,48 +395,45 @@ class KhlResultsParser:
                 try:
                     existing_fieldnames, existing_rows = self.load_csv_data(output_filename)
                     logger.info(f"Загружено {len(existing_rows)} существующих записей из {output_filename}")
+                    if existing_rows and 'res_1' not in existing_fieldnames:
+                        logger.warning(f"Файл {output_filename} в прежнем формате (WIN/LOSS в коэффициентах), "
+                                       f"переведите его командой manage.py migrate_results")
 
                     # Объединяем данные, сохраняя существующие результаты
                     all_rows = self.merge_rows(existing_rows, input_rows)
+                    fieldnames = existing_fieldnames + [name for name in fieldnames if name not in existing_fieldnames]
                     logger.info(f"После объединения: {len(all_rows)} записей")
 
                 except Exception as e:
-                    logger.warning(f"Не удалось загрузить существующий файл {output_filename}: {e}")
-                    all_rows = input_rows
+                    # Перезапись только строками из индекса потеряла бы рассчитанные события
+                    logger.error(f"Не удалось загрузить существующий файл {output_filename}: {e}")
+                    return False
             else:
                 logger.info(f"Выходной файл {output_filename} не существует, создаем новый")
                 all_rows = input_rows
 
-            # Добавляем колонку для результатов если ее нет
-            if 'match_result' not in fieldnames:
-                fieldnames.append('match_result')
-                for row in all_rows:
-                    if 'match_result' not in row:
-                        row['match_result'] = ''
-                logger.info("Добавлена колонка match_result")
+            # Колонки результата и исходов рынков (недостающие значения DictWriter запишет пустыми)
+            if not set(OUTCOME_FIELDS) <= set(fieldnames):
+                logger.info("Добавлены колонки исходов res_*")
+            fieldnames = with_outcome_fields(fieldnames)
 
-            # Принимаем cookies на первой странице
-            self.navigate_to_date(datetime.now().date())
-            self.accept_cookies_if_present()
+            # Ключи событий, которые больше не нужно держать в индексе
+            settled = list(expired)
 
-            # Группируем события по датам для оптимизации
+            # Группируем события по датам для оптимизации (только готовые к расчету события индекса)
             events_by_date = {}
             for i, row in enumerate(all_rows):
-                # Пропускаем уже обработанные строки (с WIN/LOSS)
-                if self.is_already_processed(row):
-                    logger.info(f"Строка {i} уже обработана (есть WIN/LOSS) - пропускаем")
+                key = event_key(row)
+                if key not in due:
                     continue
 
-                # Пропускаем если результат уже есть
-                if self.has_match_result(row):
-                    logger.info(f"Строка {i} уже имеет результат - пропускаем")
+                # Строка уже рассчитана в файле результатов
+                if self.is_settled(row):
+                    logger.info(f"Строка {i} уже обработана - пропускаем")
+                    settled.append(key)
                     continue
 
                 event_time = row['event_time']
-                if not self.should_process_event(event_time):
-                    logger.info(f"Событие {event_time} не подходит для обработки - пропускаем")
-                    continue
-
                 try:
                     event_date = datetime.strptime(event_time, "%d.%m.%Y %H:%M").date()
                     if event_date not in events_by_date:
@@ -608,16 +448,19 @@ class KhlResultsParser:
 
             updated_count = 0
             skipped_count = 0
+            # Строки с новым результатом - рассчитываются одной пачкой перед сохранением
+            settled_rows = []
+
+            # Страницы дат загружаются параллельно в нескольких сессиях браузера (cookies принимаются там же)
+            results_by_date = fetch_results_by_date(self, events_by_date, self.workers)
 
             # Обрабатываем события по датам
             for event_date, date_events in events_by_date.items():
                 logger.info(f"Обработка даты: {event_date}, событий: {len(date_events)}")
 
-                # Устанавливаем дату в календаре
-                if self.navigate_to_date(event_date):
-                    # Парсим ВСЕ результаты на этой дате
-                    date_results = self.parse_all_match_results_on_page()
-
+                # Результаты всех матчей даты (None - страницу открыть не удалось)
+                date_results = results_by_date.get(event_date)
+                if date_results is not None:
                     if not date_results:
                         logger.warning(f"Не найдено результатов для даты {event_date}")
                         continue
@@ -627,7 +470,7 @@ class KhlResultsParser:
                         event_name = row['event_name']
 
                         # Дополнительная проверка на случай если строка уже обработана
-                        if self.is_already_processed(row) or self.has_match_result(row):
+                        if self.is_settled(row):
                             skipped_count += 1
                             logger.info(f"Строка {i} ({event_name}) уже обработана - пропускаем")
                             continue
@@ -645,23 +488,26 @@ class KhlResultsParser:
                                 logger.info(f"Найдено совпадение для '{event_name}' -> '{best_match}'")
 
                         if result:
+                            settled.append(event_key(row))
                             # Обновляем результат
                             all_rows[i]['match_result'] = result
-                            # Обновляем котировки
-                            all_rows[i] = self.update_odds_with_results(all_rows[i], result)
+                            settled_rows.append(all_rows[i])
                             updated_count += 1
                             logger.info(f"Обновлено событие: {event_name} - {result}")
                         else:
                             logger.warning(f"Не удалось найти результат для: {event_name}")
                             logger.warning(f"Доступные результаты: {list(date_results.keys())}")
 
-                    # Небольшая пауза между датами
-                    time.sleep(2)
+            # Исходы всех рынков по новым результатам
+            settle_rows(settled_rows)
 
             # Сохраняем обновленные данные
             try:
                 self.save_csv_data(output_filename, fieldnames, all_rows)
                 logger.info(f"Данные успешно сохранены в {output_filename}")
+                # Рассчитанные и устаревшие события убираются из индекса только после записи результатов
+                remaining = pending.update(remove=settled)
+                logger.info(f"Убрано из индекса: {len(set(settled))}, осталось нерассчитанных: {remaining}")
                 logger.info(
                     f"Обработка завершена. Обновлено: {updated_count}, Пропущено (уже обработаны): {skipped_count}")
                 return True
@@ -693,8 +539,10 @@ class KhlResultsParser:
 
         finally:
             if self.driver:
+                # Для сессии из пула quit() возвращает браузер в пул
                 self.driver.quit()
-                logger.info("Браузер закрыт")
+                self.driver = None
+                logger.info("Браузер возвращен в пул")
 
 
 def main():
@@ -1,18 +1,24 @@
 import time
-import csv
 import logging
-import os
-from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
+from datetime import datetime
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from bs4 import BeautifulSoup
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException
+from FonDriverPool import get_driver_pool
+from FonPageReadiness import wait_for_page_ready, ODDS_EVENT_SELECTOR, DEFAULT_QUIET_PERIOD
+from FonReplay import save_snapshot
+from FonExtract import (make_soup, resolve_backend, select_first_text, read_factor_cells, assign_markets,
+                        SCRIPT_BACKEND, NETWORK_BACKEND, ODDS_EVENT_SELECTORS, EVENT_NAME_SELECTORS,
+                        EVENT_TIME_SELECTORS)
+from FonScriptExtract import iter_odds_blocks, extract_visible_fragments, page_contains
+from FonAppendCsv import AppendOnlyCsv, event_key
+from FonScroll import harvest_while_scrolling
+from FonTime import normalize_event_time
+from FonTournaments import get_tournament
+from FonProfile import accept_cookies
+from FonTeams import get_team_registry
+from FonOddsHistory import OddsHistory
+from FonPending import PendingIndex
+from FonNetwork import capture_line_payloads, decode_line_payload, drain_performance_log, dump_line_payloads
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,32 +26,38 @@ logger = logging.getLogger(__name__)
 
 
 class NhlFonBetParser:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, driver_pool=None, quiet_period=DEFAULT_QUIET_PERIOD,
+                 offline=False, snapshot_dir=None, backend=None, tournament=None, driver=None):
         self.driver = None
         self.headless = headless
-        self.setup_driver()
+        self.driver_pool = driver_pool
+        self.quiet_period = quiet_period
+        # offline=True - без браузера, страницы подаются в парсер напрямую (режим воспроизведения)
+        self.offline = offline
+        self.snapshot_dir = snapshot_dir
+        # Бэкенд извлечения: 'lxml' (по умолчанию), 'html.parser', 'script' (разбор внутри страницы)
+        # или 'network' (JSON-ответы линии из журнала производительности Chrome)
+        self.backend = resolve_backend(backend)
+        # Хранилища CSV с индексом ключей по имени файла и строки, добавленные последним save_to_csv
+        self.stores = {}
+        self.history = None
+        self.new_events = []
+        # Турнир из реестра FonTournaments (адрес линии, файл котировок)
+        self.tournament = get_tournament(tournament or 'nhl')
+        self.teams = get_team_registry()
+        if driver is not None:
+            # Готовая сессия или вкладка (краулер турниров), браузер из пула не арендуется
+            self.driver = driver
+        elif not offline:
+            self.setup_driver()
 
     def setup_driver(self):
-        """Настройка Selenium WebDriver с автоматической установкой драйвера"""
+        """Получение Selenium WebDriver из пула"""
         try:
-            options = Options()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_experimental_option('excludeSwitches', ['enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
-            options.add_argument(
-                '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--window-size=1920,1080')
-
-            # Правильная инициализация драйвера
-            service = webdriver.chrome.service.Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=options)
-
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # Сессия арендуется из общего пула прогретых браузеров,
+            # driver.quit() возвращает ее обратно в пул
+            pool = self.driver_pool or get_driver_pool(self.headless, network_capture=self.backend == NETWORK_BACKEND)
+            self.driver = pool.acquire()
 
             logger.info("WebDriver успешно настроен")
 
@@ -63,41 +75,6 @@ class NhlFonBetParser:
         except TimeoutException:
             logger.warning("Страница не загрузилась полностью за отведенное время")
 
-    def scroll_page(self, scroll_pause_time=2, max_scrolls=10):
-        """Прокрутка страницы для загрузки всех событий"""
-        try:
-            logger.info("Начинаем прокрутку страницы для загрузки всех событий...")
-
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
-            scroll_attempts = 0
-
-            while scroll_attempts < max_scrolls:
-                # Прокручиваем до конца страницы
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-
-                # Ждем загрузки нового контента
-                time.sleep(scroll_pause_time)
-
-                # Проверяем новую высоту страницы
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
-
-                if new_height == last_height:
-                    logger.info("Достигнут конец страницы, новая прокрутка не увеличивает высоту")
-                    break
-
-                last_height = new_height
-                scroll_attempts += 1
-                logger.info(f"Прокрутка {scroll_attempts}/{max_scrolls}, высота страницы: {new_height}px")
-
-            # Дополнительная прокрутка вверх для надежности
-            self.driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
-
-            logger.info(f"Прокрутка завершена. Всего прокруток: {scroll_attempts}")
-
-        except Exception as e:
-            logger.error(f"Ошибка при прокрутке страницы: {e}")
-
     def scroll_to_element(self, element):
         """Прокрутка к конкретному элементу"""
         try:
@@ -109,66 +86,43 @@ class NhlFonBetParser:
     def navigate_to_nhl(self):
         """Переход к разделу НХЛ"""
         try:
-            url = "https://fon.bet/sports/hockey/tournament/129"
+            url = self.tournament['odds_url']
             logger.info(f"Переход на страницу: {url}")
+            if self.backend == NETWORK_BACKEND:
+                # Ответы предыдущих страниц этой сессии не должны попасть в разбор
+                drain_performance_log(self.driver)
             self.driver.get(url)
 
             # Ожидание загрузки
             self.wait_for_page_load()
-            time.sleep(5)  # Дополнительное время для загрузки динамического контента
-
-            # Прокручиваем страницу для загрузки всех событий
-            self.scroll_page()
+            # Ждем появления событий и затихания DOM вместо фиксированной паузы
+            wait_for_page_ready(self.driver, ODDS_EVENT_SELECTOR, quiet_period=self.quiet_period)
 
             # Проверяем, что мы на правильной странице
             page_title = self.driver.title
-            page_source = self.driver.page_source
             logger.info(f"Заголовок страницы: {page_title}")
 
-            if "НХЛ" in page_title or "хоккей" in page_source.lower() or "NHL" in page_source:
+            # Поиск маркеров выполняется в браузере, page_source выгружается только для отладки
+            if "НХЛ" in page_title or page_contains(self.driver, ["хоккей"], ["NHL"]):
                 logger.info("Успешно перешли на страницу НХЛ")
             else:
                 logger.warning("Возможно, не удалось загрузить нужную страницу")
                 # Сохраним страницу для отладки
                 with open('debug_nhl_page.html', 'w', encoding='utf-8') as f:
-                    f.write(page_source)
+                    f.write(self.driver.page_source)
                 logger.info("Страница сохранена в debug_nhl_page.html для отладки")
 
         except Exception as e:
             logger.error(f"Ошибка при переходе на страницу: {e}")
             raise
 
+    # Общее имя перехода на страницу линии (используется опросом линии FonPoller)
+    navigate = navigate_to_nhl
+
     def accept_cookies_if_present(self):
-        """Принятие cookies, если появилось окно"""
+        """Принятие cookies, если появилось окно (при сохраненном согласии баннер не ищется)"""
         try:
-            # Даем время для появления cookies окна
-            time.sleep(2)
-
-            # Попробуем найти и закрыть cookies окна
-            cookie_selectors = [
-                'button[class*="cookie"]',
-                'button[class*="accept"]',
-                'div[class*="cookie"] button',
-                '//button[contains(text(), "Принять")]',
-                '//button[contains(text(), "Accept")]',
-                '//button[contains(text(), "Согласен")]'
-            ]
-
-            for selector in cookie_selectors:
-                try:
-                    if selector.startswith('//'):
-                        button = self.driver.find_element(By.XPATH, selector)
-                    else:
-                        button = self.driver.find_element(By.CSS_SELECTOR, selector)
-
-                    if button.is_displayed():
-                        button.click()
-                        logger.info("Cookies приняты")
-                        time.sleep(1)
-                        break
-                except NoSuchElementException:
-                    continue
-
+            accept_cookies(self.driver, quiet_period=self.quiet_period)
         except Exception as e:
             logger.debug(f"Окно cookies не найдено или не может быть закрыто: {e}")
 
@@ -180,87 +134,32 @@ class NhlFonBetParser:
         return text.replace(' ', '').replace(' ', '').strip()
 
     def parse_event_time(self, time_text):
-        """Преобразование времени события в формат dd.mm.yyyy"""
-        try:
-            now = datetime.now()
-            current_year = now.year
-
-            if "Завтра" in time_text:
-                # Завтра
-                date = now + timedelta(days=1)
-                # Извлекаем время
-                time_part = time_text.split(" в ")[1]
-                event_datetime = datetime.combine(date.date(), datetime.strptime(time_part, "%H:%M").time())
-                return event_datetime.strftime("%d.%m.%Y %H:%M")
-
-            elif any(month in time_text.lower() for month in [
-                'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
-                'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'
-            ]):
-                # Дата в формате "9 октября в 02:00"
-                parts = time_text.split(" ")
-                day = int(parts[0])
-                time_part = parts[3]  # время после "в"
-
-                # Определяем месяц
-                month_text = parts[1].lower()
-                month_mapping = {
-                    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
-                    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
-                }
-
-                month = month_mapping.get(month_text)
-                if month:
-                    # Используем текущий год (2025)
-                    event_datetime = datetime(current_year, month, day,
-                                              datetime.strptime(time_part, "%H:%M").hour,
-                                              datetime.strptime(time_part, "%H:%M").minute)
-                    return event_datetime.strftime("%d.%m.%Y %H:%M")
-
-            elif "Сегодня" in time_text:
-                # Сегодня
-                time_part = time_text.split(" в ")[1]
-                event_datetime = datetime.combine(now.date(), datetime.strptime(time_part, "%H:%M").time())
-                return event_datetime.strftime("%d.%m.%Y %H:%M")
-
-            else:
-                # Если формат неизвестен, возвращаем оригинальный текст
-                return time_text
-
-        except Exception as e:
-            logger.warning(f"Не удалось распарсить время: {time_text}, ошибка: {e}")
-            return time_text
+        """Преобразование времени события в формат dd.mm.yyyy HH:MM (общий нормализатор FonTime)"""
+        return normalize_event_time(time_text)
 
     def parse_event_data(self, event_element):
         """Парсинг данных одного события НХЛ"""
         try:
-            # Название события
-            name_selectors = [
-                'a[class*="sport-event__name"]',
-                'div[class*="event-name"]',
-                'span[class*="event-name"]'
-            ]
-
-            event_name = "Название не найдено"
-            for selector in name_selectors:
-                name_element = event_element.select_one(selector)
-                if name_element and name_element.text.strip():
-                    event_name = name_element.text.strip()
-                    break
+            # Название события (селекторы скомпилированы один раз в FonExtract)
+            event_name = select_first_text(event_element, EVENT_NAME_SELECTORS)
 
             # Время и дата
-            time_selectors = [
-                'span[class*="event-block-planned-time"]',
-                'span[class*="time"]',
-                'div[class*="time"]'
-            ]
+            event_time_raw = select_first_text(event_element, EVENT_TIME_SELECTORS)
 
-            event_time_raw = "Время не найдено"
-            for selector in time_selectors:
-                time_element = event_element.select_one(selector)
-                if time_element and time_element.text.strip():
-                    event_time_raw = time_element.text.strip()
-                    break
+            # Котировки: один проход по ячейкам блока в порядке документа
+            cells, values = read_factor_cells(event_element)
+
+            return self.build_event_data(event_name, event_time_raw, cells, values)
+
+        except Exception as e:
+            logger.error(f"Ошибка при парсинге события: {e}")
+            return None
+
+    def build_event_data(self, event_name, event_time_raw, cells, values):
+        """Запись события из извлеченных полей блока (общая для HTML и скриптового бэкенда)"""
+        try:
+            event_name = event_name or "Название не найдено"
+            event_time_raw = event_time_raw or "Время не найдено"
 
             # ПРЕОБРАЗОВАНИЕ: конвертируем в формат dd.mm.yyyy
             if event_time_raw != "Время не найдено":
@@ -268,153 +167,123 @@ class NhlFonBetParser:
             else:
                 event_time = event_time_raw
 
-            # Все простые котировки (значения без параметров)
-            value_spans = event_element.find_all('span', class_='value--OUKql')
-            all_simple_values = [span.text.strip() for span in value_spans]
-
-            # Основные котировки (1, X, 2) - первые три значения
-            main_odds = all_simple_values[:3] if len(all_simple_values) >= 3 else ["", "", ""]
-
-            # Двойные шансы (1X, 12, X2) - следующие три значения
-            double_chance_odds = all_simple_values[3:6] if len(all_simple_values) >= 6 else ["", "", ""]
-
-            # УЛУЧШЕННЫЙ ПАРСИНГ ФОР
-            fora_1 = ""
-            fora_2 = ""
-
-            # Ищем все комплексные элементы (форы)
-            complex_elements = event_element.find_all('div', class_='table-component-factor-value_complex')
-
-            for i, complex_element in enumerate(complex_elements):
-                # Ищем параметр и значение внутри комплексного элемента
-                param_spans = complex_element.find_all('span', class_='param--qbIN_')
-                value_spans = complex_element.find_all('span', class_='value--OUKql')
-
-                if len(param_spans) >= 1 and len(value_spans) >= 1:
-                    param = self.clean_text(param_spans[0].text)
-                    value = value_spans[0].text.strip()
-
-                    if i == 0:
-                        fora_1 = f"{param} {value}"
-                    elif i == 1:
-                        fora_2 = f"{param} {value}"
-
-            # УЛУЧШЕННЫЙ ПАРСИНГ ТОТАЛОВ
-            total_value = ""
-            total_over = ""
-            total_under = ""
-
-            # Ищем элемент с параметром тотала
-            total_param_elements = event_element.find_all('div', class_='table-component-factor-value_param')
-
-            for total_element in total_param_elements:
-                param_spans = total_element.find_all('span', class_='param--qbIN_')
-                if param_spans:
-                    total_value = self.clean_text(param_spans[0].text)
-
-                    # Находим индекс этого элемента среди всех factor-value элементов
-                    all_factors = event_element.find_all('div', class_='factor-value--zrkpK')
-
-                    for idx, factor in enumerate(all_factors):
-                        if factor == total_element:
-                            # Следующие два элементы должны быть Over и Under
-                            if idx + 1 < len(all_factors):
-                                over_span = all_factors[idx + 1].find('span', class_='value--OUKql')
-                                if over_span:
-                                    total_over = over_span.text.strip()
-
-                            if idx + 2 < len(all_factors):
-                                under_span = all_factors[idx + 2].find('span', class_='value--OUKql')
-                                if under_span:
-                                    total_under = under_span.text.strip()
-                            break
-
-            # АЛЬТЕРНАТИВНЫЙ МЕТОД: поиск по позициям после двойных шансов
-            if not fora_1 and not fora_2 and len(all_simple_values) >= 9:
-                # Позиции 6-7 могут быть форами, 8-10 - тоталы
-                if len(all_simple_values) > 6:
-                    fora_1 = all_simple_values[6] if all_simple_values[6] else ""
-                if len(all_simple_values) > 7:
-                    fora_2 = all_simple_values[7] if all_simple_values[7] else ""
-                if len(all_simple_values) > 8:
-                    total_value = "5.5"  # Стандартное значение для хоккея
-                    total_over = all_simple_values[8] if all_simple_values[8] else ""
-                if len(all_simple_values) > 9:
-                    total_under = all_simple_values[9] if all_simple_values[9] else ""
-
-            # Формат даты парсинга dd.mm.yyyy
+            # Раскладка ячеек по рынкам по позиции и типу ячейки
+            markets = assign_markets(cells, values, self.clean_text)
+
+            # Формат даты парсинга dd.mm.yyyy HH:MM:SS
             parse_timestamp = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
 
             return {
                 'parse_timestamp': parse_timestamp,
                 'event_name': event_name,
                 'event_time': event_time,  # Теперь в формате dd.mm.yyyy
-                'odds_1': main_odds[0],
-                'odds_x': main_odds[1],
-                'odds_2': main_odds[2],
-                'odds_1x': double_chance_odds[0] if len(double_chance_odds) > 0 else "",
-                'odds_12': double_chance_odds[1] if len(double_chance_odds) > 1 else "",
-                'odds_x2': double_chance_odds[2] if len(double_chance_odds) > 2 else "",
-                'fora_1': fora_1,
-                'fora_2': fora_2,
-                'total_value': total_value,
-                'total_over': total_over,
-                'total_under': total_under
+                **markets
             }
 
         except Exception as e:
             logger.error(f"Ошибка при парсинге события: {e}")
             return None
 
-    def parse_all_events(self):
-        """Парсинг всех событий НХЛ"""
-        try:
-            # Принимаем cookies перед парсингом
-            self.accept_cookies_if_present()
+    def iter_event_groups(self, page_source=None, payloads=None, visible_only=False):
+        """Разобранные события по селекторам блоков в порядке приоритета: (селектор, список событий).
+
+        visible_only=True - только блоки в окне: бэкенд script разбирает их внутри страницы,
+        HTML-бэкенды получают HTML этих блоков и разбирают его make_soup.
+        """
+        if payloads is not None:
+            rows = decode_line_payload(payloads, tournament_ids=[self.tournament['tournament_id']])
+            if rows:
+                yield 'ответы линии', rows
+                return
+            if self.offline:
+                return
+            # Запасной путь: ответы не перехвачены, разбираем отрисованную страницу
+            logger.warning("В перехваченных ответах линии нет событий, разбираем страницу")
+            page_source = self.driver.page_source
 
-            # Даем время на обновление страницы после прокрутки
-            time.sleep(3)
+        if page_source is None and visible_only and self.backend != SCRIPT_BACKEND:
+            selectors = dict(ODDS_EVENT_SELECTORS)
+            for selector, html in extract_visible_fragments(self.driver, selectors):
+                event_blocks = selectors[selector].select(make_soup(html, self.backend))
+                if event_blocks:
+                    yield selector, [self.parse_event_data(event_block) for event_block in event_blocks]
+            return
+
+        if page_source is None and self.backend == SCRIPT_BACKEND:
+            # Один вызов execute_script на селектор, HTML страницы в Python не передается
+            for selector, blocks in iter_odds_blocks(self.driver, visible_only):
+                yield selector, [self.build_event_data(block['name'], block['time'], block['cells'], block['values'])
+                                 for block in blocks]
+            return
+
+        soup = make_soup(page_source, self.backend)
+        for selector, compiled_selector in ODDS_EVENT_SELECTORS:
+            event_blocks = compiled_selector.select(soup)
+            if event_blocks:
+                yield selector, [self.parse_event_data(event_block) for event_block in event_blocks]
+
+    def collect_events(self, page_source=None, payloads=None, visible_only=False):
+        """События НХЛ из текущего DOM, готового HTML или ответов линии (с проверкой команд, без дедупликации)"""
+        # Ищем события по различным возможным классам
+        events_data = []
+
+        for selector, parsed_events in self.iter_event_groups(page_source, payloads, visible_only):
+            if parsed_events:
+                logger.info(f"Найдено {len(parsed_events)} элементов с селектором {selector}")
+                for event_data in parsed_events:
+                    if event_data and event_data['event_name'] != "Название не найдено":
+                        # Проверяем, что это действительно хоккейное событие НХЛ
+                        if self.teams.is_league_event(event_data['event_name'], self.tournament['key']):
+                            events_data.append(event_data)
+                if events_data:
+                    break
 
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+        return events_data
 
-            # Ищем события по различным возможным классам
-            event_selectors = [
-                '[class*="sport-base-event"]',
-                '[class*="sport-event"]',
-                '[class*="event-block"]',
-                '.sport-base-event--W4qkO'
-            ]
+    def read_viewport(self):
+        """События в окне браузера (один шаг сбора при прокрутке).
 
-            events_data = []
+        Из браузера берутся только видимые блоки (данными для script, HTML для lxml и
+        html.parser): перечитывать весь page_source на каждом шаге - O(шагов x размер страницы).
+        """
+        if self.snapshot_dir:
+            save_snapshot(self.snapshot_dir, 'nhl_odds', self.driver.page_source)
+        return self.collect_events(visible_only=True)
 
-            for selector in event_selectors:
-                event_blocks = soup.select(selector)
-                if event_blocks:
-                    logger.info(f"Найдено {len(event_blocks)} элементов с селектором {selector}")
-                    for event_block in event_blocks:
-                        event_data = self.parse_event_data(event_block)
-                        if event_data and event_data['event_name'] != "Название не найдено":
-                            # Проверяем, что это действительно хоккейное событие НХЛ
-                            if any(team in event_data['event_name'] for team in [
-                                'Флорида', 'Чикаго', 'Рейнджерс', 'Питтсбург', 'Лос-Анджелес', 'Колорадо',
-                                'Торонто', 'Монреаль', 'Вашингтон', 'Бостон', 'Вегас', 'Эдмонтон', 'Калгари',
-                                'Филадельфия', 'Детройт', 'Баффало', 'Тампа-Бэй', 'Оттава', 'Айлендерс',
-                                'Каролина', 'Нью-Джерси', 'Сент-Луис', 'Миннесота', 'Нэшвилл', 'Коламбус',
-                                'Виннипег', 'Даллас', 'Юта', 'Сан-Хосе', 'Ванкувер', 'Сиэтл', 'Анахайм',
-                                'НХЛ', 'NHL'
-                            ]):
-                                events_data.append(event_data)
-                    if events_data:
-                        break
+    def parse_all_events(self, page_source=None, payloads=None):
+        """Парсинг всех событий НХЛ.
+
+        page_source - готовый HTML, payloads - записанные JSON-ответы линии (офлайн-воспроизведение).
+        """
+        try:
+            if page_source is None and payloads is None:
+                # Принимаем cookies перед парсингом
+                self.accept_cookies_if_present()
+
+                # Ждем обновления страницы
+                wait_for_page_ready(self.driver, ODDS_EVENT_SELECTOR, quiet_period=self.quiet_period)
+
+                if self.backend == NETWORK_BACKEND:
+                    # Котировки берутся из ответов линии, DOM не разбирается
+                    payloads = capture_line_payloads(self.driver)
+                    if self.snapshot_dir and payloads:
+                        save_snapshot(self.snapshot_dir, 'nhl_feed', dump_line_payloads(payloads), extension='jsonl')
+                    events_data = self.collect_events(payloads=payloads)
+                else:
+                    # Сбор по экранам при прокрутке: строки, убранные виртуализированным списком, не теряются
+                    events_data = harvest_while_scrolling(self.driver, self.read_viewport, event_key,
+                                                          quiet_period=self.quiet_period)
+            else:
+                events_data = self.collect_events(page_source, payloads)
 
             # Убираем дубликаты по улучшенному ключу
             unique_events = []
             seen_keys = set()
             for event in events_data:
                 # Ключ: только название + время (без котировок)
-                event_key = f"{event['event_name']}|{event['event_time']}"
-                if event_key not in seen_keys:
-                    seen_keys.add(event_key)
+                key = event_key(event)
+                if key not in seen_keys:
+                    seen_keys.add(key)
                     unique_events.append(event)
 
             logger.info(f"Уникальных хоккейных событий НХЛ найдено: {len(unique_events)}")
@@ -424,80 +293,69 @@ class NhlFonBetParser:
             logger.error(f"Ошибка при парсинге событий: {e}")
             return []
 
-    def load_existing_data(self, filename='nhl_odds.csv'):
-        """Загрузка существующих данных из CSV файла"""
-        existing_data = []
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r', encoding='utf-8-sig') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for row in reader:
-                        existing_data.append(row)
-                logger.info(f"Загружено {len(existing_data)} существующих событий из {filename}")
-            except Exception as e:
-                logger.error(f"Ошибка при чтении существующего файла: {e}")
-        else:
-            logger.info(f"Файл {filename} не существует, будет создан новый")
-
-        return existing_data
-
-    def get_existing_event_keys(self, existing_data):
-        """Получение ключей существующих событий для проверки дубликатов"""
-        event_keys = set()
-        for event in existing_data:
-            # Ключ: только название + время (без котировок)
-            key = f"{event['event_name']}|{event['event_time']}"
-            event_keys.add(key)
-        return event_keys
-
-    def save_to_csv(self, events_data, filename='nhl_odds.csv'):
-        """Сохранение данных в CSV файл с проверкой дубликатов"""
+    def get_store(self, filename=None):
+        """Хранилище CSV с индексом ключей (индекс читается один раз на экземпляр парсера)"""
+        filename = filename or self.tournament['odds_file']
+        store = self.stores.get(filename)
+        if store is None:
+            # Обновляем fieldnames для НХЛ
+            fieldnames = [
+                'parse_timestamp', 'event_name', 'event_time',
+                'odds_1', 'odds_x', 'odds_2',
+                'odds_1x', 'odds_12', 'odds_x2',
+                'fora_1', 'fora_2',
+                'total_value', 'total_over', 'total_under'
+            ]
+            store = AppendOnlyCsv(filename, fieldnames)
+            self.stores[filename] = store
+        return store
+
+    def get_history(self):
+        """История котировок турнира (индекс читается один раз на экземпляр парсера)"""
+        if self.history is None:
+            self.history = OddsHistory(self.tournament['history_file'])
+        return self.history
+
+    def save_to_csv(self, events_data, filename=None):
+        """Дозапись новых событий в CSV с проверкой дубликатов по индексу ключей"""
+        self.new_events = []
         if not events_data:
             logger.warning("Нет новых данных для сохранения")
             return 0, 0
 
-        # Загружаем существующие данные
-        existing_data = self.load_existing_data(filename)
-        existing_event_keys = self.get_existing_event_keys(existing_data)
-
-        # Определяем новые события
-        new_events = []
-        for event in events_data:
-            # Ключ: только название + время (без котировок)
-            event_key = f"{event['event_name']}|{event['event_time']}"
-            if event_key not in existing_event_keys:
-                new_events.append(event)
-
-        if not new_events:
-            logger.info("Новых событий для добавления не найдено")
-            return len(existing_data), 0
-
-        # Объединяем старые и новые данные
-        all_events = existing_data + new_events
-
-        # Обновляем fieldnames для НХЛ
-        fieldnames = [
-            'parse_timestamp', 'event_name', 'event_time',
-            'odds_1', 'odds_x', 'odds_2',
-            'odds_1x', 'odds_12', 'odds_x2',
-            'fora_1', 'fora_2',
-            'total_value', 'total_over', 'total_under'
-        ]
-
         try:
-            with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                for event in all_events:
-                    # Убедимся, что у всех событий есть parse_timestamp
-                    if 'parse_timestamp' not in event:
-                        event['parse_timestamp'] = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
-                    writer.writerow(event)
+            store = self.get_store(filename)
+            filename = store.path
 
-            logger.info(f"Данные обновлены в файле: {filename}")
-            logger.info(f"Всего событий: {len(all_events)} (добавлено новых: {len(new_events)})")
+            # Убедимся, что у всех событий есть parse_timestamp
+            for event in events_data:
+                if 'parse_timestamp' not in event:
+                    event['parse_timestamp'] = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
 
-            return len(all_events), len(new_events)
+            # Дописываются только события с новым ключом (название + время, без котировок)
+            self.new_events = store.append(events_data)
+
+            # Движение котировок уже известных событий - дельтами в историю
+            try:
+                self.get_history().record(events_data)
+            except Exception as e:
+                logger.error(f"Ошибка при записи истории котировок: {e}")
+
+            # Новые события ждут расчета в индексе нерассчитанных событий
+            if self.new_events:
+                try:
+                    PendingIndex(self.tournament['pending_file']).add(self.new_events, store.fieldnames)
+                except Exception as e:
+                    logger.error(f"Ошибка при обновлении индекса нерассчитанных событий: {e}")
+
+            if not self.new_events:
+                logger.info("Новых событий для добавления не найдено")
+                return store.row_count, 0
+
+            logger.info(f"Данные дописаны в файл: {filename}")
+            logger.info(f"Всего событий: {store.row_count} (добавлено новых: {len(self.new_events)})")
+
+            return store.row_count, len(self.new_events)
 
         except Exception as e:
             logger.error(f"Ошибка при сохранении в CSV: {e}")
@@ -525,17 +383,8 @@ class NhlFonBetParser:
                     print("ПЕРВЫЕ 3 НОВЫХ СОБЫТИЯ НХЛ:")
                     print("=" * 60)
 
-                    # Находим новые события для отображения
-                    existing_data = self.load_existing_data()
-                    existing_keys = self.get_existing_event_keys(existing_data)
-                    new_events_to_show = []
-
-                    for event in events_data:
-                        event_key = f"{event['event_name']}|{event['event_time']}"
-                        if event_key not in existing_keys:
-                            new_events_to_show.append(event)
-                        if len(new_events_to_show) >= 3:
-                            break
+                    # Новые события запомнены в save_to_csv, файл повторно не читается
+                    new_events_to_show = self.new_events[:3]
 
                     for i, event in enumerate(new_events_to_show, 1):
                         print(f"\n🏒 Событие {i}: {event['event_name']}")
@@ -573,8 +422,10 @@ class NhlFonBetParser:
 
         finally:
             if self.driver:
+                # Для сессии из пула quit() возвращает браузер в пул
                 self.driver.quit()
-                logger.info("Браузер закрыт")
+                self.driver = None
+                logger.info("Браузер возвращен в пул")
 
 
 def main():
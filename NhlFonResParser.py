@@ -1,53 +1,75 @@
-import time
-import csv
 import logging
 import os
 from datetime import datetime, timedelta
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.keys import Keys
-from bs4 import BeautifulSoup
-from webdriver_manager.chrome import ChromeDriverManager
+from FonDriverPool import get_driver_pool
+from FonPageReadiness import wait_for_page_ready, RESULTS_EVENT_SELECTOR, DEFAULT_QUIET_PERIOD
+from FonReplay import save_snapshot
+from FonExtract import (make_soup, resolve_backend, select_team_names, select_final_scores, RESULTS_EVENT,
+                        SCRIPT_BACKEND, OVERTIME_BLOCK, SCORE_BLOCK, SCORE_CELL, SUMMARY_SCORE_CELL)
+from FonScriptExtract import extract_results_fragment
+from FonTournaments import get_tournament
+from FonProfile import accept_cookies
+from FonTeams import get_team_registry
+from FonResultsFetch import fetch_results_by_date
+from FonResultsCache import ResultsCache
+from FonFuzzy import fold_name, get_matcher
+from FonAppendCsv import event_key
+from FonPending import PendingIndex
+from FonStorage import file_lock, read_csv, write_csv
+from FonSettlement import settle_rows, has_outcome, with_outcome_fields
+from collections import Counter
 import shutil
-import difflib
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SEARCH_INPUT_SELECTOR = 'input.search-panel__input--xW3P5'
+# Сколько ждать перестроения списка после ввода в строку поиска
+SEARCH_TIMEOUT = 5
+
 
 class NhlResultsParser:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, driver_pool=None, quiet_period=DEFAULT_QUIET_PERIOD,
+                 offline=False, snapshot_dir=None, backend=None, tournament=None, workers=None,
+                 use_cache=True):
         self.driver = None
         self.headless = headless
-        self.base_url = "https://fon.bet/results/hockey/11781"  # Прямая ссылка на НХЛ
-        self.setup_driver()
+        self.driver_pool = driver_pool
+        self.quiet_period = quiet_period
+        # offline=True - без браузера, страницы подаются в парсер напрямую (режим воспроизведения)
+        self.offline = offline
+        self.snapshot_dir = snapshot_dir
+        # Бэкенд извлечения: 'lxml' (по умолчанию), 'html.parser' или 'script' (блоки событий из браузера)
+        self.backend = resolve_backend(backend)
+        # Прямая ссылка на результаты турнира из реестра FonTournaments
+        self.tournament = get_tournament(tournament or 'nhl')
+        self.teams = get_team_registry()
+        self.base_url = self.tournament['results_url']
+        # Сколько дат загружать одновременно (по умолчанию FONBET_RESULTS_WORKERS)
+        self.workers = workers
+        # Все матчи последней разобранной страницы с итоговым счетом (для кеша результатов)
+        self.last_page_complete = False
+        # Кеш разобранных дат: окончательные даты не загружаются повторно
+        self.results_cache = ResultsCache(self.tournament['key']) if use_cache else None
+        # Результаты строки поиска за прогон: (дата, команда) -> результаты
+        self.search_cache = {}
+        self.search_page_date = None
+        if not offline:
+            self.setup_driver()
 
     def setup_driver(self):
-        """Настройка Selenium WebDriver с автоматической установкой драйвера"""
+        """Получение Selenium WebDriver из пула"""
         try:
-            options = Options()
-            if self.headless:
-                options.add_argument('--headless')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_experimental_option('excludeSwitches', ['enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
-            options.add_argument(
-                '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--window-size=1920,1080')
-
-            # Правильная инициализация драйвера
-            service = webdriver.chrome.service.Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=options)
-
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # Сессия арендуется из общего пула прогретых браузеров,
+            # driver.quit() возвращает ее обратно в пул
+            pool = self.driver_pool or get_driver_pool(self.headless)
+            self.driver = pool.acquire()
 
             logger.info("WebDriver успешно настроен")
 
@@ -77,7 +99,8 @@ class NhlResultsParser:
 
             # Ожидание загрузки
             self.wait_for_page_load()
-            time.sleep(3)
+            # Ждем появления результатов и затихания DOM вместо фиксированной паузы
+            wait_for_page_ready(self.driver, RESULTS_EVENT_SELECTOR, quiet_period=self.quiet_period)
 
             # Проверяем, что мы на правильной странице
             current_url = self.driver.current_url
@@ -93,31 +116,29 @@ class NhlResultsParser:
             return False
 
     def search_event_by_name(self, event_name):
-        """Поиск события по названию через строку поиска"""
+        """Поиск событий через строку поиска на странице текущей даты (обычно по названию команды)"""
         try:
             logger.info(f"Поиск события через строку поиска: {event_name}")
 
             # Находим поле поиска
-            search_input = self.driver.find_element(By.CSS_SELECTOR, 'input.search-panel__input--xW3P5')
+            search_input = self.driver.find_element(By.CSS_SELECTOR, SEARCH_INPUT_SELECTOR)
 
-            # Очищаем поле поиска
+            # Очистка прежнего запроса тоже перестраивает список: снимок берется после нее,
+            # чтобы ожидание ниже сработало на ответ на новый запрос, а не на очистку
+            had_query = bool(search_input.get_attribute('value'))
             search_input.clear()
-            time.sleep(1)
-
-            # Вводим название события
+            if had_query:
+                wait_for_page_ready(self.driver, RESULTS_EVENT_SELECTOR, quiet_period=self.quiet_period,
+                                    timeout=SEARCH_TIMEOUT)
+            before = self.driver.find_elements(By.CSS_SELECTOR, RESULTS_EVENT_SELECTOR)
             search_input.send_keys(event_name)
-            time.sleep(2)  # Ждем обновления результатов
 
-            # Ждем появления результатов поиска
-            time.sleep(3)
+            # Ждем перестроения списка под запрос вместо фиксированных пауз
+            self.wait_for_results_change(before)
 
-            # Парсим результаты поиска
+            # Парсим результаты поиска (внутри - ожидание затихания DOM)
             search_results = self.parse_all_match_results_on_page()
 
-            # Очищаем поле поиска для следующего поиска
-            search_input.clear()
-            time.sleep(1)
-
             logger.info(f"Найдено результатов в поиске: {len(search_results)}")
             return search_results
 
@@ -125,93 +146,132 @@ class NhlResultsParser:
             logger.error(f"Ошибка при поиске события '{event_name}': {e}")
             return {}
 
-    def accept_cookies_if_present(self):
-        """Принятие cookies, если появилось окно"""
+    def wait_for_results_change(self, before, timeout=SEARCH_TIMEOUT):
+        """Ожидание, пока список событий на странице сменится (другое число блоков или новые блоки)"""
+        def changed(driver):
+            current = driver.find_elements(By.CSS_SELECTOR, RESULTS_EVENT_SELECTOR)
+            if len(current) != len(before):
+                return True
+            return bool(before) and EC.staleness_of(before[0])(driver)
+
         try:
-            time.sleep(2)
-
-            cookie_selectors = [
-                'button[class*="cookie"]',
-                'button[class*="accept"]',
-                'div[class*="cookie"] button',
-                '//button[contains(text(), "Принять")]',
-                '//button[contains(text(), "Accept")]',
-                '//button[contains(text(), "Согласен")]'
-            ]
-
-            for selector in cookie_selectors:
-                try:
-                    if selector.startswith('//'):
-                        button = self.driver.find_element(By.XPATH, selector)
+            WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(changed)
+            return True
+        except TimeoutException:
+            logger.debug("Список событий не изменился после ввода в строку поиска")
+            return False
+
+    def search_terms(self, event_name):
+        """Команды события для строки поиска (названия из реестра или части названия события)"""
+        team_ids = [team_id for team_id in self.teams.match_teams(event_name, self.tournament['key']) if team_id]
+        if team_ids:
+            return [self.teams.canonical_name(team_id) for team_id in team_ids]
+        base = event_name.split(' (', 1)[0]
+        return [team.strip() for team in base.split(' — ') if team.strip()]
+
+    def match_in_results(self, event_name, results):
+        """(результат, название события) по точному или нечеткому совпадению; None, если не найдено"""
+        if event_name in results:
+            logger.info(f"Точное совпадение для: {event_name}")
+            return results[event_name], event_name
+
+        # Используем улучшенный поиск совпадений
+        best_match = self.find_best_match(event_name, results.keys())
+        if best_match:
+            logger.info(f"Найдено совпадение для '{event_name}' -> '{best_match}'")
+            # Если нашли совпадение с овертаймом, обновляем event_name
+            if '(' in best_match and ')' in best_match:
+                return results[best_match], best_match
+            return results[best_match], event_name
+        return None
+
+    def cached_search(self, event_date, term):
+        """Результаты поиска по команде на странице даты (один запрос на команду и дату за прогон).
+
+        Если дату открыть не удалось, результат пустой и не кешируется: поиск по странице
+        другой даты нашел бы другую встречу тех же команд с чужим счетом.
+        """
+        key = (event_date, term)
+        if key not in self.search_cache:
+            if self.search_page_date != event_date:
+                # Строка поиска фильтрует список открытой даты
+                self.search_page_date = event_date if self.navigate_to_date(event_date) else None
+                if self.search_page_date is None:
+                    logger.warning(f"Не удалось открыть дату {event_date}, поиск по '{term}' пропущен")
+                    return {}
+            self.search_cache[key] = self.search_event_by_name(term)
+        return self.search_cache[key]
+
+    def search_unmatched(self, unmatched):
+        """Поиск результатов для строк без совпадения на странице даты.
+
+        Внутри даты первой ищется команда, общая для наибольшего числа оставшихся строк;
+        строка, не найденная по одной команде, ищется по второй. Возвращает
+        {позиция в unmatched: (результат, название события)}.
+        """
+        found = {}
+        by_date = {}
+        for position, (event_date, row) in enumerate(unmatched):
+            by_date.setdefault(event_date, []).append(position)
+
+        searches = 0
+        for event_date, positions in by_date.items():
+            pending = {position: list(self.search_terms(unmatched[position][1]['event_name']))
+                       for position in positions}
+            pending = {position: terms for position, terms in pending.items() if terms}
+
+            while pending:
+                counts = Counter(term for terms in pending.values() for term in terms)
+                term = counts.most_common(1)[0][0]
+                cached = (event_date, term) in self.search_cache
+                search_results = self.cached_search(event_date, term)
+                searches += not cached
+
+                for position in [p for p, terms in pending.items() if term in terms]:
+                    match = self.match_in_results(unmatched[position][1]['event_name'], search_results)
+                    if match:
+                        logger.info(f"Найден результат через поиск '{term}' для: "
+                                    f"{unmatched[position][1]['event_name']}")
+                        found[position] = match
+                        del pending[position]
                     else:
-                        button = self.driver.find_element(By.CSS_SELECTOR, selector)
-
-                    if button.is_displayed():
-                        button.click()
-                        logger.info("Cookies приняты")
-                        time.sleep(1)
-                        break
-                except NoSuchElementException:
-                    continue
+                        pending[position].remove(term)
+                        if not pending[position]:
+                            del pending[position]
 
+        logger.info(f"Поиск через строку поиска: строк {len(unmatched)}, запросов {searches}, найдено {len(found)}")
+        return found
+
+    def accept_cookies_if_present(self):
+        """Принятие cookies, если появилось окно (при сохраненном согласии баннер не ищется)"""
+        try:
+            accept_cookies(self.driver, quiet_period=self.quiet_period)
         except Exception as e:
             logger.debug(f"Окно cookies не найдено или не может быть закрыто: {e}")
 
     def normalize_team_name(self, name):
-        """Нормализация названия команды для сравнения"""
-        # Заменяем латинские буквы на кириллические
-        replacements = {
-            'c': 'с',  # латинская c -> кириллическая с
-            'a': 'а',  # латинская a -> кириллическая а
-            'e': 'е',  # латинская e -> кириллическая е
-            'o': 'о',  # латинская o -> кириллическая о
-            'p': 'р',  # латинская p -> кириллическая р
-            'x': 'х',  # латинская x -> кириллическая х
-            'y': 'у',  # латинская y -> кириллическая у,
-            'k': 'к',  # латинская k -> кириллическая к
-            'b': 'б',  # латинская b -> кириллическая б
-        }
-
-        normalized = name.lower()
-        for lat, cyr in replacements.items():
-            normalized = normalized.replace(lat, cyr)
-
-        # Убираем лишние пробелы и приводим к нижнему регистру
-        return ' '.join(normalized.split())
+        """Нормализация названия команды для сравнения (латинские двойники -> кириллица, нижний регистр)"""
+        return fold_name(name)
 
     def find_best_match(self, event_name, available_names):
         """Поиск наилучшего совпадения среди доступных названий"""
-        normalized_event = self.normalize_team_name(event_name)
-
-        best_match = None
-        best_ratio = 0
-
-        for available_name in available_names:
-            normalized_available = self.normalize_team_name(available_name)
-
-            # Простое сравнение строк
-            if normalized_event == normalized_available:
-                return available_name
+        # Сначала по паре команд из реестра: псевдонимы и полные названия сводятся к одним id
+        match = self.teams.find_by_teams(event_name, available_names, self.tournament['key'])
+        if match:
+            return match
 
-            # Сравнение с использованием difflib для частичных совпадений
-            ratio = difflib.SequenceMatcher(None, normalized_event, normalized_available).ratio()
-
-            if ratio > best_ratio and ratio > 0.7:  # Понизил порог до 70% для лучшего сопоставления
-                best_ratio = ratio
-                best_match = available_name
-
-        return best_match
+        # Нечеткое сравнение только с кандидатами, близкими по триграммам
+        return get_matcher(available_names).best_match(event_name)
 
     def check_overtime_indicator(self, event_element):
         """Проверка наличия индикатора овертайма/буллитов"""
         try:
             # Ищем блок с овертаймом по классам из HTML шаблона
-            overtime_blocks = event_element.select(
-                'div.results-scoreBlock--aHrej.results-scoreBoard__sum-subEvents--_LZ3a')
+            overtime_blocks = OVERTIME_BLOCK.select(event_element)
 
             for block in overtime_blocks:
                 # Ищем элементы с текстом OT (овертайм) или Б (буллиты)
-                ot_elements = block.select('div.results-scoreBlock__score--XvlMM')
+                ot_elements = SCORE_CELL.select(block)
                 for element in ot_elements:
                     element_text = element.get_text(strip=True)
                     if element_text in ['OT', 'ОТ', 'Б']:
@@ -227,37 +287,13 @@ class NhlResultsParser:
         """Получение результата матча с овертаймом/буллитами"""
         try:
             # Ищем названия команд
-            team_name_selectors = [
-                'div.results-event-team__name--lRkNU div.overflowed-text--JHSWr',
-                'div.results-event-team__caption--Ra_Se',
-                'div[class*="event-team__name"]'
-            ]
-
-            team_names = []
-            for selector in team_name_selectors:
-                name_elements = event_element.select(selector)
-                if name_elements and len(name_elements) >= 2:
-                    team_names = [elem.get_text(strip=True) for elem in name_elements[:2]]
-                    break
+            team_names = select_team_names(event_element)
 
             if len(team_names) < 2:
                 return None, None
 
             # Ищем финальный счет
-            score_selectors = [
-                'div.results-scoreBlock__score--XvlMM._summary--Jt8Ej._bold--JaGTY',
-                'div[class*="scoreBlock__score"][class*="_summary"]',
-                'div.results-scoreBlock__score--XvlMM'
-            ]
-
-            final_scores = []
-            for selector in score_selectors:
-                score_elements = event_element.select(selector)
-                if score_elements and len(score_elements) >= 2:
-                    # Берем последние два элемента (финальный счет)
-                    final_scores = [elem.get_text(strip=True) for elem in score_elements[-2:]]
-                    if all(score.isdigit() for score in final_scores):
-                        break
+            final_scores = select_final_scores(event_element)
 
             if len(final_scores) >= 2 and all(score.isdigit() for score in final_scores):
                 score1 = int(final_scores[0])
@@ -285,39 +321,40 @@ class NhlResultsParser:
             logger.error(f"Ошибка при определении результата в овертайме: {e}")
             return None, None
 
-    def parse_all_match_results_on_page(self):
-        """Парсинг ВСЕХ результатов матчей на текущей странице"""
+    def parse_all_match_results_on_page(self, page_source=None):
+        """Парсинг ВСЕХ результатов матчей на текущей странице (page_source - готовый HTML для офлайн-воспроизведения)"""
         try:
-            # Даем время для полной загрузки (прокрутка убрана)
-            time.sleep(3)
+            if page_source is None:
+                # Ждем полной загрузки: события на месте и DOM затих (прокрутка убрана)
+                wait_for_page_ready(self.driver, RESULTS_EVENT_SELECTOR, quiet_period=self.quiet_period)
 
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
+                if self.backend == SCRIPT_BACKEND:
+                    # Из браузера передаются только блоки событий, а не весь документ
+                    page_source = extract_results_fragment(self.driver, RESULTS_EVENT_SELECTOR)
+                else:
+                    page_source = self.driver.page_source
+                if self.snapshot_dir:
+                    save_snapshot(self.snapshot_dir, 'nhl_results', page_source)
+
+            soup = make_soup(page_source, self.backend)
 
             # Ищем все события на странице
-            event_elements = soup.find_all('div', class_='results-event--Me6XJ')
+            event_elements = RESULTS_EVENT.select(soup)
             logger.info(f"Найдено событий на странице: {len(event_elements)}")
 
             results = {}
+            # Блоков матчей с командами: страница окончательна, если у каждого есть итоговый счет
+            matches = 0
             available_names = []  # Сохраняем все найденные названия для отладки
 
             for event_element in event_elements:
                 try:
                     # Парсим названия команд - улучшенный поиск
-                    team_name_selectors = [
-                        'div.results-event-team__name--lRkNU div.overflowed-text--JHSWr',
-                        'div.results-event-team__caption--Ra_Se',
-                        'div[class*="event-team__name"]'
-                    ]
-
-                    team_names = []
-                    for selector in team_name_selectors:
-                        name_elements = event_element.select(selector)
-                        if name_elements and len(name_elements) >= 2:
-                            team_names = [elem.get_text(strip=True) for elem in name_elements[:2]]
-                            break
+                    team_names = select_team_names(event_element)
 
                     if len(team_names) < 2:
                         continue
+                    matches += 1
 
                     team1_name = team_names[0]
                     team2_name = team_names[1]
@@ -352,25 +389,12 @@ class NhlResultsParser:
 
                     # Обычные матчи (без овертайма)
                     # Ищем финальный счет - РАСШИРЕННЫЙ ПОИСК
-                    score_selectors = [
-                        'div.results-scoreBlock__score--XvlMM._summary--Jt8Ej._bold--JaGTY',
-                        'div[class*="scoreBlock__score"][class*="_summary"]',
-                        'div.results-scoreBlock__score--XvlMM'
-                    ]
-
-                    final_scores = []
-                    for selector in score_selectors:
-                        score_elements = event_element.select(selector)
-                        if score_elements and len(score_elements) >= 2:
-                            # Берем последние два элемента (финальный счет)
-                            final_scores = [elem.get_text(strip=True) for elem in score_elements[-2:]]
-                            if all(score.isdigit() for score in final_scores):
-                                break
+                    final_scores = select_final_scores(event_element)
 
                     # Если не нашли через селекторы, пробуем альтернативные методы
                     if not final_scores or len(final_scores) < 2:
                         # Метод 1: Поиск по всем элементам счета
-                        all_score_elements = event_element.select('div.results-scoreBlock__score--XvlMM')
+                        all_score_elements = SCORE_CELL.select(event_element)
                         if len(all_score_elements) >= 2:
                             # Берем последние два цифровых значения
                             digit_scores = []
@@ -385,11 +409,11 @@ class NhlResultsParser:
 
                     # Метод 2: Поиск по структуре блоков
                     if not final_scores or len(final_scores) < 2:
-                        score_blocks = event_element.select('div.results-scoreBlock--aHrej')
+                        score_blocks = SCORE_BLOCK.select(event_element)
                         if score_blocks:
                             # Последний блок обычно содержит финальный счет
                             last_block = score_blocks[-1]
-                            scores = last_block.select('div.results-scoreBlock__score--XvlMM')
+                            scores = SCORE_CELL.select(last_block)
                             if len(scores) >= 2:
                                 score1 = scores[0].get_text(strip=True)
                                 score2 = scores[1].get_text(strip=True)
@@ -398,7 +422,7 @@ class NhlResultsParser:
 
                     # Метод 3: Поиск по элементам с классом _summary
                     if not final_scores or len(final_scores) < 2:
-                        summary_scores = event_element.select('div.results-scoreBlock__score--XvlMM._summary--Jt8Ej')
+                        summary_scores = SUMMARY_SCORE_CELL.select(event_element)
                         if len(summary_scores) >= 2:
                             score1 = summary_scores[-2].get_text(strip=True)
                             score2 = summary_scores[-1].get_text(strip=True)
@@ -417,7 +441,7 @@ class NhlResultsParser:
                     else:
                         # Если счет не найден, логируем для отладки
                         all_score_texts = [elem.get_text(strip=True) for elem in
-                                           event_element.select('div.results-scoreBlock__score--XvlMM')]
+                                           SCORE_CELL.select(event_element)]
                         logger.warning(f"Не удалось найти счет для: {event_key_1}")
                         logger.warning(f"Все найденные элементы счета: {all_score_texts}")
 
@@ -432,10 +456,13 @@ class NhlResultsParser:
             for key, value in results.items():
                 logger.info(f"Найден результат: {key} -> {value}")
 
+            # Каждый матч дает два ключа (прямой и обратный порядок команд)
+            self.last_page_complete = matches > 0 and len(results) == 2 * matches
             return results
 
         except Exception as e:
             logger.error(f"Ошибка при парсинге результатов на странице: {e}")
+            self.last_page_complete = False
             return {}
 
     def should_process_event(self, event_time_str):
@@ -470,145 +497,16 @@ class NhlResultsParser:
             return False
 
     def is_already_processed(self, row):
-        """Проверяем, обработана ли уже строка (есть ли WIN/LOSS в котировках)"""
-        try:
-            # Проверяем основные котировки на наличие WIN/LOSS
-            odds_1 = str(row.get('odds_1', ''))
-            odds_x = str(row.get('odds_x', ''))
-            odds_2 = str(row.get('odds_2', ''))
-
-            # Если в любой из основных котировок есть WIN или LOSS - строка уже обработана
-            if any(marker in odds_1.upper() or marker in odds_x.upper() or marker in odds_2.upper()
-                   for marker in ['WIN', 'LOSS']):
-                return True
-
-            # Также проверяем тоталы
-            total_over = str(row.get('total_over', ''))
-            total_under = str(row.get('total_under', ''))
-
-            if any(marker in total_over.upper() or marker in total_under.upper()
-                   for marker in ['WIN', 'LOSS']):
-                return True
-
-            return False
-
-        except Exception as e:
-            logger.error(f"Ошибка при проверке обработки строки: {e}")
-            return False
-
-    def update_odds_with_results(self, row, result):
-        """Обновление котировок на основе результата"""
-        try:
-            # Проверяем, является ли результат матчем с овертаймом (по наличию скобок в event_name)
-            event_name = row.get('event_name', '')
-            is_overtime_match = '(' in event_name and ')' in event_name
-
-            if is_overtime_match:
-                # Для матчей с овертаймом ставим WIN в odds_x и LOSS в остальные
-                row['odds_1'] = f"LOSS {row['odds_1']}"
-                row['odds_x'] = f"WIN {row['odds_x']}"
-                row['odds_2'] = f"LOSS {row['odds_2']}"
-
-                # Для тоталов используем стандартную логику с корректным счетом
-                score1, score2 = map(int, result.split(':'))
-                total_score = score1 + score2
-                total_value = float(row['total_value']) if row['total_value'] and row['total_value'].replace('.',
-                                                                                                             '').isdigit() else 5.5
-
-                if total_score > total_value:
-                    row['total_over'] = f"WIN {row['total_over']}"
-                    row['total_under'] = f"LOSS {row['total_under']}"
-                elif total_score < total_value:
-                    row['total_over'] = f"LOSS {row['total_over']}"
-                    row['total_under'] = f"WIN {row['total_under']}"
-                else:
-                    # Если тотал равен - обе котировки WIN
-                    row['total_over'] = f"WIN {row['total_over']}"
-                    row['total_under'] = f"WIN {row['total_under']}"
-
-                return row
-
-            # Стандартная обработка для обычных матчей
-            score1, score2 = map(int, result.split(':'))
-
-            # Определяем исход матча
-            if score1 > score2:
-                # Победа первой команды
-                row['odds_1'] = f"WIN {row['odds_1']}"
-                row['odds_x'] = f"LOSS {row['odds_x']}"
-                row['odds_2'] = f"LOSS {row['odds_2']}"
-            elif score1 < score2:
-                # Победа второй команды
-                row['odds_1'] = f"LOSS {row['odds_1']}"
-                row['odds_x'] = f"LOSS {row['odds_x']}"
-                row['odds_2'] = f"WIN {row['odds_2']}"
-            else:
-                # Ничья
-                row['odds_1'] = f"LOSS {row['odds_1']}"
-                row['odds_x'] = f"WIN {row['odds_x']}"
-                row['odds_2'] = f"LOSS {row['odds_2']}"
-
-            # Обновляем тоталы
-            total_score = score1 + score2
-            total_value = float(row['total_value']) if row['total_value'] and row['total_value'].replace('.',
-                                                                                                         '').isdigit() else 5.5
-
-            if total_score > total_value:
-                row['total_over'] = f"WIN {row['total_over']}"
-                row['total_under'] = f"LOSS {row['total_under']}"
-            elif total_score < total_value:
-                row['total_over'] = f"LOSS {row['total_over']}"
-                row['total_under'] = f"WIN {row['total_under']}"
-            else:
-                # Если тотал равен - обе котировки WIN
-                row['total_over'] = f"WIN {row['total_over']}"
-                row['total_under'] = f"WIN {row['total_under']}"
-
-            return row
-
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении котировок: {e}")
-            return row
-
-    def safe_file_operation(self, filename, operation, *args):
-        """Безопасная операция с файлом с несколькими попытками"""
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            try:
-                return operation(filename, *args)
-            except PermissionError:
-                if attempt < max_attempts - 1:
-                    logger.warning(f"Файл {filename} заблокирован, попытка {attempt + 1} из {max_attempts}")
-                    time.sleep(2)
-                else:
-                    logger.error(f"Файл {filename} все еще заблокирован после {max_attempts} попыток")
-                    raise
-            except Exception as e:
-                logger.error(f"Ошибка при работе с файлом {filename}: {e}")
-                raise
+        """Проверяем, обработана ли уже строка (заполнены колонки исходов res_*)"""
+        return has_outcome(row)
 
     def load_csv_data(self, filename):
-        """Загрузка данных из CSV файла"""
-
-        def read_file(fname):
-            with open(fname, 'r', encoding='utf-8-sig') as csvfile:
-                reader = csv.DictReader(csvfile)
-                fieldnames = reader.fieldnames
-                rows = list(reader)
-                return fieldnames, rows
-
-        return self.safe_file_operation(filename, read_file)
+        """Загрузка данных из CSV файла (согласованный снимок, даже если файл сейчас дописывается)"""
+        return read_csv(filename)
 
     def save_csv_data(self, filename, fieldnames, rows):
-        """Сохранение данных в CSV файл"""
-
-        def write_file(fname, fnames, rws):
-            with open(fname, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fnames)
-                writer.writeheader()
-                writer.writerows(rws)
-
-        return self.safe_file_operation(filename, write_file, fieldnames, rows)
+        """Сохранение данных в CSV файл: временный файл и атомарная замена под блокировкой"""
+        write_csv(filename, fieldnames, rows)
 
     def merge_csv_data(self, existing_data, new_data):
         """Объединение существующих данных с новыми"""
@@ -637,17 +535,35 @@ class NhlResultsParser:
             return new_data  # В случае ошибки возвращаем новые данные
 
     def process_csv_file(self, input_filename='nhl_odds.csv', output_filename='nhl_results_final.csv'):
+        """Обработка CSV под блокировкой файла результатов: второй прогон по той же лиге ждет первый"""
+        with file_lock(output_filename):
+            return self.settle_csv_file(input_filename, output_filename)
+
+    def settle_csv_file(self, input_filename, output_filename):
         """Основной метод обработки CSV файла с сохранением существующих данных"""
         try:
             logger.info(f"Используем выходной файл: {output_filename}")
 
-            # Загружаем данные из исходного файла
+            # Результаты строки поиска действуют только в пределах прогона
+            self.search_cache = {}
+            self.search_page_date = None
+
+            # Нерассчитанные события из индекса вместо всего файла линии
+            pending = PendingIndex(self.tournament['pending_file'])
             try:
-                fieldnames, input_rows = self.load_csv_data(input_filename)
-                logger.info(f"Загружено {len(input_rows)} событий из {input_filename}")
+                pending_events = pending.open(input_filename, output_filename, self.is_already_processed)
             except FileNotFoundError:
                 logger.error(f"Исходный файл {input_filename} не найден")
                 return False
+            fieldnames = list(pending.fieldnames)
+            due, expired = pending.partition()
+            logger.info(f"Нерассчитанных событий в {pending.path}: {len(pending_events)}, "
+                        f"готовы к расчету: {len(due)}, вышли из окна расчета: {len(expired)}")
+            if not due:
+                if expired:
+                    pending.update(remove=expired)
+                logger.info("Нет событий, готовых к расчету")
+                return 0
 
             # Проверяем, существует ли уже выходной файл
             if os.path.exists(output_filename):
@@ -655,6 +571,9 @@ class NhlResultsParser:
                 try:
                     existing_fieldnames, existing_rows = self.load_csv_data(output_filename)
                     logger.info(f"Загружено {len(existing_rows)} существующих записей из {output_filename}")
+                    if existing_rows and 'res_1' not in existing_fieldnames:
+                        logger.warning(f"Файл {output_filename} в прежнем формате (WIN/LOSS в коэффициентах), "
+                                       f"переведите его командой manage.py migrate_results")
 
                     # Используем существующие данные как основу
                     all_rows = existing_rows
@@ -664,20 +583,17 @@ class NhlResultsParser:
                         for row in all_rows:
                             row['match_result'] = ''
                         logger.info("Добавлена колонку match_result в существующие данные")
+                    fieldnames = existing_fieldnames + [name for name in fieldnames if name not in existing_fieldnames]
                 except Exception as e:
-                    logger.warning(f"Не удалось загрузить существующий файл {output_filename}: {e}")
-                    all_rows = []
+                    # Перезапись только новыми результатами потеряла бы уже рассчитанные события
+                    logger.error(f"Не удалось загрузить существующий файл {output_filename}: {e}")
+                    return 0
             else:
                 logger.info(f"Выходной файл {output_filename} не существует, создаем новый")
                 all_rows = []
 
-            # Добавляем колонку для результатов если ее нет
-            if 'match_result' not in fieldnames:
-                fieldnames.append('match_result')
-
-            # Принимаем cookies на первой странице
-            self.navigate_to_date(datetime.now().date())  # Переходим на текущую дату для принятия cookies
-            self.accept_cookies_if_present()
+            # Колонки результата и исходов рынков
+            fieldnames = with_outcome_fields(fieldnames)
 
             # Создаем словарь для быстрого поиска существующих записей по уникальному ключу
             existing_dict = {}
@@ -690,20 +606,19 @@ class NhlResultsParser:
                 )
                 existing_dict[key] = row
 
-            # Группируем события по датам для оптимизации
+            # Ключи событий, которые больше не нужно держать в индексе
+            settled = list(expired)
+
+            # Группируем события по датам для оптимизации (только готовые к расчету события индекса)
             events_by_date = {}
-            for i, row in enumerate(input_rows):
+            for i, (key, row) in enumerate(due.items()):
                 # Пропускаем уже обработанные строки (с WIN/LOSS)
                 if self.is_already_processed(row):
                     logger.info(f"Строка {i} уже обработана (есть WIN/LOSS) - пропускаем")
+                    settled.append(key)
                     continue
 
                 event_time = row['event_time']
-                if not self.should_process_event(event_time):
-                    logger.info(
-                        f"Событие {event_time} не подходит для обработки (будущее, недавно началось или прошло более 3 дней)")
-                    continue
-
                 try:
                     # Извлекаем дату окончания события (дата, когда матч завершился)
                     event_date = datetime.strptime(event_time, "%d.%m.%Y %H:%M").date()
@@ -723,110 +638,93 @@ class NhlResultsParser:
             old_events_count = 0
             duplicate_count = 0
 
+            # Страницы дат загружаются параллельно в нескольких сессиях браузера (cookies принимаются там же)
+            results_by_date = fetch_results_by_date(self, events_by_date, self.workers)
+
+            # Найденные результаты: (дата, строка, результат, название события после сопоставления)
+            matched = []
+            # Строки без совпадения на странице даты - для поиска через строку поиска после всех дат
+            unmatched = []
+
             # Обрабатываем события по датам
             for event_date, date_events in events_by_date.items():
                 logger.info(f"Обработка даты: {event_date}, событий: {len(date_events)}")
 
-                # Переходим на страницу с результатами для этой даты
-                if self.navigate_to_date(event_date):
-                    # Парсим ВСЕ результаты на этой дате
-                    date_results = self.parse_all_match_results_on_page()
-
-                    # Обновляем все события этой даты
-                    for i, row in date_events:
-                        event_name = row['event_name']
-                        event_time = row['event_time']
-                        parse_timestamp = row['parse_timestamp']
-
-                        # Создаем уникальный ключ для поиска
-                        key = (event_name, event_time, parse_timestamp)
-
-                        # Дополнительная проверка на случай если строка уже обработана
-                        if self.is_already_processed(row):
-                            skipped_count += 1
-                            logger.info(f"Строка {i} ({event_name}) уже обработана - пропускаем")
-                            continue
-
-                        # Ищем результат в распарсенных данных
-                        result = None
-                        new_event_name = event_name  # Сохраняем оригинальное название
-
-                        if event_name in date_results:
-                            result = date_results[event_name]
-                            logger.info(f"Точное совпадение для: {event_name}")
-                        else:
-                            # Используем улучшенный поиск совпадений
-                            best_match = self.find_best_match(event_name, date_results.keys())
-                            if best_match:
-                                result = date_results[best_match]
-                                # Если нашли совпадение с овертаймом, обновляем event_name
-                                if '(' in best_match and ')' in best_match:
-                                    new_event_name = best_match
-                                logger.info(f"Найдено совпадение для '{event_name}' -> '{best_match}'")
-
-                        # Если результат не найден обычным способом, пробуем поиск через строку поиска
-                        if not result:
-                            logger.warning(f"Результат не найден обычным способом для: {event_name}")
-                            logger.info(f"Пробуем поиск через строку поиска...")
-
-                            search_results = self.search_event_by_name(event_name)
-                            if search_results:
-                                # Ищем в результатах поиска
-                                if event_name in search_results:
-                                    result = search_results[event_name]
-                                    logger.info(f"Найден результат через поиск для: {event_name}")
-                                else:
-                                    # Используем улучшенный поиск совпадений в результатах поиска
-                                    best_match = self.find_best_match(event_name, search_results.keys())
-                                    if best_match:
-                                        result = search_results[best_match]
-                                        # Если нашли совпадение с овертаймом, обновляем event_name
-                                        if '(' in best_match and ')' in best_match:
-                                            new_event_name = best_match
-                                        logger.info(
-                                            f"Найдено совпадение через поиск для '{event_name}' -> '{best_match}'")
-
-                        if result:
-                            # Обновляем результат и event_name (если изменился)
-                            row['match_result'] = result
-                            row['event_name'] = new_event_name
-                            # Обновляем котировки
-                            updated_row = self.update_odds_with_results(row, result)
-
-                            # Проверяем, существует ли уже такая запись
-                            if key in existing_dict:
-                                # Обновляем существующую запись (полностью заменяем)
-                                existing_row = existing_dict[key]
-                                existing_row.update(updated_row)
-                                duplicate_count += 1
-                                logger.info(f"Обновлена существующая запись: {new_event_name} - {result}")
-                            else:
-                                # Добавляем новую запись
-                                all_rows.append(updated_row)
-                                existing_dict[key] = updated_row
-
-                            updated_count += 1
-                            logger.info(f"Обновлено событие: {new_event_name} - {result}")
-                        else:
-                            logger.warning(f"Не удалось найти результат для: {event_name}")
-                            # Проверяем, может быть матч еще не сыгран
-                            current_date = datetime.now().date()
-                            if event_date >= current_date:
-                                logger.info(f"Матч {event_name} на дату {event_date} возможно еще не сыгран")
-                                future_events_count += 1
-                            else:
-                                # Проверяем, не слишком ли старый матч
-                                event_time_dt = datetime.strptime(event_time, "%d.%m.%Y %H:%M")
-                                time_since_event = datetime.now() - event_time_dt
-                                if time_since_event > timedelta(days=3):
-                                    old_events_count += 1
-                                    logger.info(f"Матч {event_name} слишком старый (более 3 дней) - пропускаем")
-                            logger.warning(f"Доступные результаты: {list(date_results.keys())}")
-
-                    # Небольшая пауза между датами
-                    time.sleep(2)
-                else:
+                # Результаты всех матчей даты (None - страницу открыть не удалось)
+                date_results = results_by_date.get(event_date)
+                if date_results is None:
                     logger.error(f"Не удалось перейти на дату {event_date}")
+                    continue
+
+                for i, row in date_events:
+                    event_name = row['event_name']
+
+                    # Дополнительная проверка на случай если строка уже обработана
+                    if self.is_already_processed(row):
+                        skipped_count += 1
+                        settled.append(event_key(row))
+                        logger.info(f"Строка {i} ({event_name}) уже обработана - пропускаем")
+                        continue
+
+                    # Ищем результат в распарсенных данных
+                    match = self.match_in_results(event_name, date_results)
+                    if match:
+                        matched.append((event_date, row) + match)
+                    else:
+                        logger.warning(f"Результат не найден обычным способом для: {event_name}")
+                        unmatched.append((event_date, row))
+
+            # Поиск через строку поиска: один запрос на команду и дату, результаты общие для всех строк
+            found = self.search_unmatched(unmatched) if unmatched else {}
+            for position, (event_date, row) in enumerate(unmatched):
+                if position in found:
+                    matched.append((event_date, row) + found[position])
+                    continue
+
+                event_name = row['event_name']
+                logger.warning(f"Не удалось найти результат для: {event_name}")
+                # Проверяем, может быть матч еще не сыгран
+                current_date = datetime.now().date()
+                if event_date >= current_date:
+                    logger.info(f"Матч {event_name} на дату {event_date} возможно еще не сыгран")
+                    future_events_count += 1
+                else:
+                    # Проверяем, не слишком ли старый матч
+                    event_time_dt = datetime.strptime(row['event_time'], "%d.%m.%Y %H:%M")
+                    time_since_event = datetime.now() - event_time_dt
+                    if time_since_event > timedelta(days=3):
+                        old_events_count += 1
+                        logger.info(f"Матч {event_name} слишком старый (более 3 дней) - пропускаем")
+                logger.warning(f"Доступные результаты: {list(results_by_date[event_date].keys())}")
+
+            keys = []
+            for event_date, row, result, new_event_name in matched:
+                # Создаем уникальный ключ для поиска (по названию до сопоставления)
+                keys.append((row['event_name'], row['event_time'], row['parse_timestamp']))
+                settled.append(event_key(row))
+
+                # Обновляем результат и event_name (если изменился)
+                row['match_result'] = result
+                row['event_name'] = new_event_name
+
+            # Исходы всех рынков по новым результатам - одной пачкой
+            settle_rows([row for _, row, _, _ in matched])
+
+            for key, (event_date, updated_row, result, new_event_name) in zip(keys, matched):
+                # Проверяем, существует ли уже такая запись
+                if key in existing_dict:
+                    # Обновляем существующую запись (полностью заменяем)
+                    existing_row = existing_dict[key]
+                    existing_row.update(updated_row)
+                    duplicate_count += 1
+                    logger.info(f"Обновлена существующая запись: {new_event_name} - {result}")
+                else:
+                    # Добавляем новую запись
+                    all_rows.append(updated_row)
+                    existing_dict[key] = updated_row
+
+                updated_count += 1
+                logger.info(f"Обновлено событие: {new_event_name} - {result}")
 
             # УДАЛЯЕМ ДУБЛИКАТЫ перед сохранением
             unique_rows = []
@@ -848,6 +746,9 @@ class NhlResultsParser:
             try:
                 self.save_csv_data(output_filename, fieldnames, unique_rows)
                 logger.info(f"Данные успешно сохранены в {output_filename}")
+                # Рассчитанные и устаревшие события убираются из индекса только после записи результатов
+                remaining = pending.update(remove=settled)
+                logger.info(f"Убрано из индекса: {len(set(settled))}, осталось нерассчитанных: {remaining}")
                 logger.info(
                     f"Обработка завершена. Обновлено: {updated_count}, Пропущено (уже обработаны): {skipped_count}, "
                     f"Будущие события: {future_events_count}, События старше 3 дней: {old_events_count}, "
@@ -884,8 +785,10 @@ class NhlResultsParser:
 
         finally:
             if self.driver:
+                # Для сессии из пула quit() возвращает браузер в пул
                 self.driver.quit()
-                logger.info("Браузер закрыт")
+                self.driver = None
+                logger.info("Браузер возвращен в пул")
 
 
 def main():
@@ -0,0 +1,149 @@
+"""Сравнение бэкендов извлечения на больших страницах турнира.
+
+Запуск из корня проекта:
+    python benchmarks/bench_extraction.py --events 400 --repeat 5
+    python benchmarks/bench_extraction.py --snapshots snapshots/  # реальные снимки из --snapshot-dir
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from FonExtract import make_soup, select_first_text, ODDS_EVENT_SELECTORS, EVENT_NAME_SELECTORS, EVENT_TIME_SELECTORS
+from FonReplay import iter_snapshots
+from KhlFonParser import KhlFonBetParser
+from KhlFonResParser import KhlResultsParser
+
+TEAMS = ['Лада', 'ХК Сочи', 'Ак Барс', 'Барыс', 'Торпедо', 'Металлург Мг', 'Нефтехимик', 'Амур',
+         'Спартак', 'Автомобилист', 'СКА', 'Динамо Москва', 'Салават Юлаев', 'Трактор', 'Северсталь',
+         'Динамо Минск', 'Локомотив', 'ЦСКА']
+
+
+def build_odds_page(events, seed=1):
+    """Синтетическая страница линии со структурой блоков fon.bet"""
+    rnd = random.Random(seed)
+    blocks = []
+    for i in range(events):
+        home, away = rnd.sample(TEAMS, 2)
+        odds = ''.join(
+            f'<div class="factor-value--zrkpK"><span class="value--OUKql">{rnd.uniform(1.1, 5):.2f}</span></div>'
+            for _ in range(6))
+        handicaps = ''.join(
+            f'<div class="factor-value--zrkpK table-component-factor-value_complex">'
+            f'<span class="param--qbIN_">{sign}1.5</span><span class="value--OUKql">{rnd.uniform(1.5, 2.5):.2f}</span></div>'
+            for sign in '-+')
+        totals = ('<div class="factor-value--zrkpK table-component-factor-value_param"><span class="param--qbIN_">5.5</span></div>'
+                  + ''.join(f'<div class="factor-value--zrkpK"><span class="value--OUKql">{rnd.uniform(1.5, 2.5):.2f}</span></div>'
+                            for _ in range(2)))
+        blocks.append(
+            f'<div class="sport-base-event--W4qkO"><div class="sport-event__info--Wq1nP">'
+            f'<a class="sport-event__name--HefZL" href="/sports/hockey/{i}">{home} — {away}</a>'
+            f'<span class="event-block-planned-time--MpcPi">{rnd.randint(1, 28)} октября в {rnd.randint(10, 22)}:00</span>'
+            f'</div><div class="table-component-factor-row--V4r3M">{odds}{handicaps}{totals}</div></div>')
+    filler = '<div class="promo-banner--abc"><img src="x.png"><span>реклама</span></div>' * events
+    return f'<html><head><title>Хоккей. КХЛ</title></head><body>{filler}{"".join(blocks)}</body></html>'
+
+
+def build_results_page(events, seed=1):
+    """Синтетическая страница результатов со структурой блоков fon.bet"""
+    rnd = random.Random(seed)
+    blocks = []
+    for _ in range(events):
+        home, away = rnd.sample(TEAMS, 2)
+        periods = ''.join(
+            f'<div class="results-scoreBlock--aHrej"><div class="results-scoreBlock__score--XvlMM">{rnd.randint(0, 2)}</div>'
+            f'<div class="results-scoreBlock__score--XvlMM">{rnd.randint(0, 2)}</div></div>'
+            for _ in range(3))
+        summary = (f'<div class="results-scoreBlock--aHrej">'
+                   f'<div class="results-scoreBlock__score--XvlMM _summary--Jt8Ej _bold--JaGTY">{rnd.randint(0, 6)}</div>'
+                   f'<div class="results-scoreBlock__score--XvlMM _summary--Jt8Ej _bold--JaGTY">{rnd.randint(0, 6)}</div></div>')
+        teams = ''.join(
+            f'<div class="results-event-team__name--lRkNU"><div class="overflowed-text--JHSWr">{team}</div></div>'
+            for team in (home, away))
+        blocks.append(f'<div class="results-event--Me6XJ">{teams}{periods}{summary}</div>')
+    return f'<html><body>{"".join(blocks)}</body></html>'
+
+
+def legacy_odds_extract(page_source):
+    """Прежний путь: html.parser и строковые селекторы soupsieve на каждый блок"""
+    soup = BeautifulSoup(page_source, 'html.parser')
+    names = []
+    for block in soup.select('[class*="sport-base-event"]'):
+        for selector in ['a[class*="sport-event__name"]', 'div[class*="event-name"]', 'span[class*="event-name"]']:
+            element = block.select_one(selector)
+            if element and element.text.strip():
+                names.append(element.text.strip())
+                break
+        for selector in ['span[class*="event-block-planned-time"]', 'span[class*="time"]', 'div[class*="time"]']:
+            element = block.select_one(selector)
+            if element and element.text.strip():
+                break
+        block.find_all('span', class_='value--OUKql')
+    return names
+
+
+def compiled_odds_extract(page_source):
+    """Та же работа через lxml и селекторы, скомпилированные в FonExtract"""
+    soup = make_soup(page_source, 'lxml')
+    names = []
+    for block in ODDS_EVENT_SELECTORS[0][1].select(soup):
+        names.append(select_first_text(block, EVENT_NAME_SELECTORS))
+        select_first_text(block, EVENT_TIME_SELECTORS)
+        block.find_all('span', class_='value--OUKql')
+    return names
+
+
+def timed(func, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            func(page)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--events', type=int, default=400, help='Событий на синтетической странице')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Повторов (берется лучший)')
+    arg_parser.add_argument('--snapshots', help='Каталог с HTML-снимками страниц линии вместо синтетики')
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    if args.snapshots:
+        odds_pages = [html for _, html in iter_snapshots(args.snapshots)]
+    else:
+        odds_pages = [build_odds_page(args.events)]
+    results_pages = [build_results_page(args.events)]
+
+    odds_html = KhlFonBetParser(offline=True, backend='html.parser')
+    odds_lxml = KhlFonBetParser(offline=True, backend='lxml')
+    res_html = KhlResultsParser(offline=True, backend='html.parser')
+    res_lxml = KhlResultsParser(offline=True, backend='lxml')
+
+    cases = [
+        ('блоки линии: html.parser + строковые селекторы (прежний путь)', legacy_odds_extract, odds_pages),
+        ('блоки линии: lxml + скомпилированные селекторы', compiled_odds_extract, odds_pages),
+        ('линия: parse_all_events, html.parser', lambda p: odds_html.parse_all_events(page_source=p), odds_pages),
+        ('линия: parse_all_events, lxml', lambda p: odds_lxml.parse_all_events(page_source=p), odds_pages),
+        ('результаты: html.parser', lambda p: res_html.parse_all_match_results_on_page(page_source=p), results_pages),
+        ('результаты: lxml', lambda p: res_lxml.parse_all_match_results_on_page(page_source=p), results_pages),
+    ]
+
+    total_kb = sum(len(p.encode('utf-8')) for p in odds_pages) / 1024
+    print(f"Страниц линии: {len(odds_pages)} ({total_kb:.0f} KB), событий на синтетической странице: {args.events}")
+    for title, func, pages in cases:
+        elapsed = timed(func, pages, args.repeat)
+        print(f"{title:<64} {elapsed * 1000 / len(pages):9.1f} мс/стр")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Стоимость нечеткого сопоставления названий событий с результатами даты.
+
+Запуск из корня проекта:
+    python benchmarks/bench_matching.py --queries 200 --matches 16
+"""
+import argparse
+import difflib
+import logging
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FonFuzzy import get_matcher, TrigramMatcher
+from FonTeams import TEAMS
+
+
+def legacy_normalize(name):
+    """Прежний normalize_team_name: девять последовательных str.replace"""
+    normalized = name.lower()
+    for lat, cyr in zip('caeopxykb', 'саеорхукб'):
+        normalized = normalized.replace(lat, cyr)
+    return ' '.join(normalized.split())
+
+
+def legacy_find_best_match(event_name, available_names):
+    """Прежний find_best_match: difflib для каждой пары (событие, кандидат)"""
+    normalized_event = legacy_normalize(event_name)
+    best_match = None
+    best_ratio = 0
+    for available_name in available_names:
+        normalized_available = legacy_normalize(available_name)
+        if normalized_event == normalized_available:
+            return available_name
+        ratio = difflib.SequenceMatcher(None, normalized_event, normalized_available).ratio()
+        if ratio > best_ratio and ratio > 0.7:
+            best_ratio = ratio
+            best_match = available_name
+    return best_match
+
+
+def build_day(matches, rnd):
+    """Ключи страницы результатов НХЛ: оба порядка команд, у части матчей - "(победитель)" """
+    teams = [name for name, _ in TEAMS['nhl'].values()]
+    rnd.shuffle(teams)
+    keys, pairs = [], []
+    for i in range(matches):
+        home, away = teams[2 * i], teams[2 * i + 1]
+        pairs.append(f"{home} — {away}")
+        suffix = f" ({rnd.choice([home, away])})" if rnd.random() < 0.3 else ''
+        keys += [f"{home} — {away}{suffix}", f"{away} — {home}{suffix}"]
+    return keys, pairs
+
+
+def perturb(name, rnd):
+    """Названия из линии: латинские двойники, пропущенные буквы или точное совпадение"""
+    kind = rnd.random()
+    if kind < 0.3:
+        return name.replace('с', 'c')
+    if kind < 0.6:
+        i = rnd.randrange(len(name))
+        return name[:i] + name[i + 1:]
+    return name
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--queries', type=int, default=200, help='Поисков на одну дату')
+    arg_parser.add_argument('--matches', type=int, default=16, help='Матчей на странице даты')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Повторов (берется лучший)')
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    rnd = random.Random(1)
+    keys, pairs = build_day(min(args.matches, 16), rnd)
+    queries = [perturb(rnd.choice(pairs), rnd) for _ in range(args.queries)]
+
+    def legacy():
+        for query in queries:
+            legacy_find_best_match(query, keys)
+
+    def indexed_per_query():
+        # find_best_match без кэша: индекс строится заново на каждую строку CSV
+        for query in queries:
+            TrigramMatcher(keys).best_match(query)
+
+    def indexed_cold():
+        matcher = TrigramMatcher(keys)
+        for query in queries:
+            matcher.best_match(query)
+
+    def indexed():
+        for query in queries:
+            get_matcher(keys).best_match(query)
+
+    # Кэш прогревается до замера: в парсере индекс даты строится первым поиском
+    indexed()
+
+    print(f"Кандидатов: {len(keys)}, поисков: {len(queries)}")
+    for title, func in [
+        ('прежний find_best_match (difflib на пару)', legacy),
+        ('индекс триграмм на каждый поиск', indexed_per_query),
+        ('индекс триграмм, построение + поиски', indexed_cold),
+        ('индекс триграмм из кэша', indexed),
+    ]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{title:<44} {best * 1e6 / len(queries):8.1f} мкс/поиск")
+
+    agree = sum(legacy_find_best_match(q, keys) == get_matcher(keys).best_match(q) for q in queries)
+    print(f"Совпадает с прежним результатом: {agree} из {len(queries)}")
+
+
+if __name__ == '__main__':
+    main()
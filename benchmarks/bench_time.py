@@ -0,0 +1,118 @@
+"""Стоимость одного вызова нормализации времени события.
+
+Запуск из корня проекта:
+    python benchmarks/bench_time.py --calls 100000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FonTime import normalize_event_time, cache_clear, cache_info, MONTHS
+
+
+def legacy_parse_event_time(time_text):
+    """Прежняя реализация parse_event_time из парсеров котировок (для сравнения)"""
+    try:
+        now = datetime.now()
+        current_year = now.year
+
+        if "Завтра" in time_text:
+            date = now + timedelta(days=1)
+            time_part = time_text.split(" в ")[1]
+            event_datetime = datetime.combine(date.date(), datetime.strptime(time_part, "%H:%M").time())
+            return event_datetime.strftime("%d.%m.%Y %H:%M")
+
+        elif any(month in time_text.lower() for month in [
+            'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+            'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря'
+        ]):
+            parts = time_text.split(" ")
+            day = int(parts[0])
+            time_part = parts[3]
+            month_text = parts[1].lower()
+            month_mapping = {
+                'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+                'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
+            }
+            month = month_mapping.get(month_text)
+            if month:
+                event_datetime = datetime(current_year, month, day,
+                                          datetime.strptime(time_part, "%H:%M").hour,
+                                          datetime.strptime(time_part, "%H:%M").minute)
+                return event_datetime.strftime("%d.%m.%Y %H:%M")
+
+        elif "Сегодня" in time_text:
+            time_part = time_text.split(" в ")[1]
+            event_datetime = datetime.combine(now.date(), datetime.strptime(time_part, "%H:%M").time())
+            return event_datetime.strftime("%d.%m.%Y %H:%M")
+
+        else:
+            return time_text
+
+    except Exception:
+        return time_text
+
+
+def build_samples(count, seed=1):
+    """Тексты времени в пропорциях страницы линии: в основном даты, немного "Сегодня/Завтра" """
+    rnd = random.Random(seed)
+    months = list(MONTHS)
+    samples = []
+    for _ in range(count):
+        clock = f"{rnd.randint(0, 23):02d}:{rnd.choice(['00', '30'])}"
+        kind = rnd.random()
+        if kind < 0.1:
+            samples.append(f"Сегодня в {clock}")
+        elif kind < 0.2:
+            samples.append(f"Завтра в {clock}")
+        else:
+            samples.append(f"{rnd.randint(1, 28)} {rnd.choice(months)} в {clock}")
+    return samples
+
+
+def per_call_us(func, samples, repeat):
+    def run():
+        for sample in samples:
+            func(sample)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best * 1e6 / len(samples)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--calls', type=int, default=100000, help='Вызовов в одном прогоне')
+    arg_parser.add_argument('--events', type=int, default=400, help='Событий на странице линии')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Повторов (берется лучший)')
+    args = arg_parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    # Страница линии: несколько сотен событий, при повторных разборах строки времени те же
+    page_samples = build_samples(args.events) * max(1, args.calls // args.events)
+    unique_samples = list(dict.fromkeys(page_samples))
+
+    def cold(sample):
+        cache_clear()
+        return normalize_event_time(sample)
+
+    cases = [
+        ('прежний parse_event_time', legacy_parse_event_time, page_samples),
+        ('FonTime без кэша (очистка перед вызовом)', cold, page_samples),
+        ('FonTime, поток страницы (повторы из кэша)', normalize_event_time, page_samples),
+    ]
+
+    print(f"Вызовов: {len(page_samples)}, различных строк: {len(unique_samples)}")
+    for title, func, samples in cases:
+        cache_clear()
+        print(f"{title:<48} {per_call_us(func, samples, args.repeat):8.2f} мкс/вызов")
+    print(f"Кэш: {cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
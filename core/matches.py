@@ -0,0 +1,292 @@
+"""Матчи из CSV для страниц расписания и результатов.
+
+Файл разбирается и сортируется один раз; пока размер и mtime файла не изменились,
+повторный запрос страницы стоит одного обращения к словарю. Фильтры, сортировка
+и разбиение на страницы применяются к закешированной таблице, и в шаблон попадает
+только одна страница. Таблицы общие для всех запросов - изменять их нельзя.
+"""
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time
+from operator import itemgetter
+from django.core.paginator import Paginator
+from django.utils.http import urlencode
+from FonFuzzy import fold_name
+from FonStorage import read_csv
+from FonTeams import get_team_registry
+from FonTime import EVENT_TIME_FORMAT
+from FonTournaments import get_tournament
+
+DISPLAY_TIME_FORMAT = '%d.%m %H:%M'
+# Формат дат в фильтрах (поле <input type="date">)
+FILTER_DATE_FORMAT = '%Y-%m-%d'
+
+PAGE_SIZE = 50
+PAGE_SIZE_OPTIONS = (25, 50, 100, 200)
+
+SORT_OPTIONS = (
+    ('-time', 'Сначала новые'),
+    ('time', 'Сначала старые'),
+    ('event', 'По названию А-Я'),
+    ('-event', 'По названию Я-А'),
+)
+DEFAULT_SORT = '-time'
+
+# Фильтр исхода (страницы результатов): значение параметра -> (колонка исхода, подпись)
+OUTCOME_FILTERS = {
+    '1': ('res_1', 'Победа хозяев'),
+    'x': ('res_x', 'Ничья в основное время'),
+    '2': ('res_2', 'Победа гостей'),
+    'over': ('res_over', 'Тотал больше'),
+    'under': ('res_under', 'Тотал меньше'),
+}
+
+# (путь, построитель, турнир) -> ((размер, mtime), таблица)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class MatchTable:
+    """Матчи файла по возрастанию времени начала с заранее посчитанными ключами.
+
+    Диапазон дат - срез по bisect, остальные порядки сортировки строятся
+    один раз на версию файла.
+    """
+
+    def __init__(self, matches):
+        matches.sort(key=itemgetter('kickoff'))
+        self.matches = matches
+        self.kickoffs = [match['kickoff'] for match in matches]
+        self._orders = {'time': matches}
+
+    def __len__(self):
+        return len(self.matches)
+
+    def __iter__(self):
+        return iter(self.matches)
+
+    def order(self, sort):
+        ordered = self._orders.get(sort)
+        if ordered is None:
+            if sort == '-time':
+                ordered = self.matches[::-1]
+            else:
+                ordered = sorted(self.matches, key=itemgetter('sort_name', 'kickoff'), reverse=sort == '-event')
+            self._orders[sort] = ordered
+        return ordered
+
+    def select(self, sort=DEFAULT_SORT, date_from=None, date_to=None, predicate=None):
+        """Матчи в порядке sort в диапазоне дат (включительно), прошедшие predicate"""
+        start = datetime.combine(date_from, time.min) if date_from else None
+        end = datetime.combine(date_to, time.max) if date_to else None
+
+        if sort in ('time', '-time'):
+            selected = self.order(sort)
+            if start or end:
+                lo = bisect_left(self.kickoffs, start) if start else 0
+                hi = bisect_right(self.kickoffs, end) if end else len(self.kickoffs)
+                selected = self.matches[lo:hi] if sort == 'time' else self.matches[lo:hi][::-1]
+        else:
+            selected = self.order(sort)
+            if start or end:
+                selected = [match for match in selected
+                            if (not start or match['kickoff'] >= start) and (not end or match['kickoff'] <= end)]
+
+        if predicate:
+            selected = [match for match in selected if predicate(match)]
+        return selected
+
+
+def cached_matches(path, build, league=None):
+    """Таблица матчей файла, разобранных build(rows, league); разбор повторяется только при изменении файла"""
+    version = file_version(path)
+    if version is None:
+        return MatchTable([])
+
+    key = (os.path.abspath(path), build, league)
+    entry = _cache.get(key)
+    if entry and entry[0] == version:
+        return entry[1]
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == version:
+            return entry[1]
+        try:
+            _, rows = read_csv(path)
+        except FileNotFoundError:
+            return MatchTable([])
+        matches = build(rows, league)
+        # Версия снята до чтения: если файл успел смениться, следующий запрос просто разберет его еще раз
+        _cache[key] = (version, matches)
+    return matches
+
+
+def _kickoff(row):
+    try:
+        return datetime.strptime(row['event_time'], EVENT_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def _sort_keys(event_name, league):
+    """Ключи сортировки и фильтра по команде, посчитанные один раз при разборе файла"""
+    team_ids, _ = get_team_registry().match(event_name, league)
+    return {'sort_name': fold_name(event_name), 'team_ids': frozenset(team_ids)}
+
+
+def build_schedule(rows, league=None):
+    """Матчи линии без результата"""
+    matches = []
+    for row in rows:
+        if row.get('match_result'):
+            continue
+        kickoff = _kickoff(row)
+        if kickoff is None:
+            continue
+        matches.append({
+            'event_name': row['event_name'],
+            'event_time': row['event_time'],
+            'kickoff': kickoff,
+            'formatted_time': kickoff.strftime(DISPLAY_TIME_FORMAT),
+            'odds_1': row.get('odds_1', ''),
+            'odds_x': row.get('odds_x', ''),
+            'odds_2': row.get('odds_2', ''),
+            'total_value': row.get('total_value', ''),
+            'total_over': row.get('total_over', ''),
+            'total_under': row.get('total_under', ''),
+            **_sort_keys(row['event_name'], league),
+        })
+    return MatchTable(matches)
+
+
+def build_results(rows, league=None):
+    """Рассчитанные матчи с исходами рынков"""
+    # pandas подгружается только при первом разборе файла результатов
+    from FonSettlement import OUTCOME_FIELDS, needs_migration, migrate_rows
+
+    # Файл, еще не переведенный migrate_results, показывается с исходами, рассчитанными в памяти
+    if needs_migration(rows):
+        rows = migrate_rows(rows)
+
+    matches = []
+    for row in rows:
+        if not (row.get('match_result') or '').strip():
+            continue
+        kickoff = _kickoff(row)
+        if kickoff is None:
+            continue
+        matches.append({
+            'event_name': row['event_name'],
+            'event_time': row['event_time'],
+            'kickoff': kickoff,
+            'formatted_time': kickoff.strftime(DISPLAY_TIME_FORMAT),
+            'match_result': row['match_result'],
+            # Овертайм/буллиты: победитель в скобках в названии события
+            'is_overtime': '(' in row['event_name'] and ')' in row['event_name'],
+            'odds_1': row.get('odds_1', ''),
+            'odds_x': row.get('odds_x', ''),
+            'odds_2': row.get('odds_2', ''),
+            'total_over': row.get('total_over', ''),
+            'total_under': row.get('total_under', ''),
+            # Исходы рынков: WIN, LOSS, PUSH или пусто
+            **{field: row.get(field, '') for field in OUTCOME_FIELDS},
+            **_sort_keys(row['event_name'], league),
+        })
+    return MatchTable(matches)
+
+
+def league_schedule(league):
+    """Расписание турнира из реестра (файл линии)"""
+    return cached_matches(get_tournament(league)['odds_file'], build_schedule, league)
+
+
+def league_results(league):
+    """Результаты турнира из реестра (файл результатов)"""
+    return cached_matches(get_tournament(league)['results_file'], build_results, league)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, FILTER_DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_filters(params, outcomes=False):
+    """Параметры страницы из GET-запроса; некорректные значения заменяются значениями по умолчанию"""
+    try:
+        page_size = int(params.get('page_size', PAGE_SIZE))
+    except ValueError:
+        page_size = PAGE_SIZE
+    sort = params.get('sort', DEFAULT_SORT)
+    outcome = params.get('outcome', '') if outcomes else ''
+    return {
+        'date_from': _parse_date(params.get('date_from')),
+        'date_to': _parse_date(params.get('date_to')),
+        'team': params.get('team', '').strip(),
+        'outcome': outcome if outcome in OUTCOME_FILTERS else '',
+        'sort': sort if sort in dict(SORT_OPTIONS) else DEFAULT_SORT,
+        'page_size': page_size if page_size in PAGE_SIZE_OPTIONS else PAGE_SIZE,
+    }
+
+
+def match_predicate(filters, league=None):
+    """Проверка матча по команде и исходу (None - фильтров нет)"""
+    checks = []
+
+    team = filters['team']
+    if team:
+        # Команда из реестра находится по любому псевдониму, остальное - по подстроке названия
+        team_ids = set(get_team_registry().match(team, league)[0])
+        query = fold_name(team)
+        checks.append(lambda match: query in match['sort_name'] or bool(team_ids & match['team_ids']))
+
+    if filters['outcome']:
+        column = OUTCOME_FILTERS[filters['outcome']][0]
+        checks.append(lambda match: match.get(column) == 'WIN')
+
+    if not checks:
+        return None
+    return lambda match: all(check(match) for check in checks)
+
+
+def match_listing(table, params, league=None, outcomes=False):
+    """Контекст страницы списка матчей: одна страница отфильтрованной и отсортированной таблицы"""
+    filters = parse_filters(params, outcomes)
+    selected = table.select(filters['sort'], filters['date_from'], filters['date_to'],
+                            match_predicate(filters, league))
+    page_obj = Paginator(selected, filters['page_size']).get_page(params.get('page'))
+
+    # Значения фильтров для формы и ссылок пагинации
+    form = {
+        'date_from': filters['date_from'].strftime(FILTER_DATE_FORMAT) if filters['date_from'] else '',
+        'date_to': filters['date_to'].strftime(FILTER_DATE_FORMAT) if filters['date_to'] else '',
+        'team': filters['team'],
+        'outcome': filters['outcome'],
+        'sort': filters['sort'],
+        'page_size': filters['page_size'],
+    }
+    # В ссылки страниц попадают только заданные фильтры, без значений по умолчанию
+    defaults = {'sort': DEFAULT_SORT, 'page_size': PAGE_SIZE}
+    query = {name: value for name, value in form.items() if value and value != defaults.get(name)}
+    return {
+        'matches': page_obj.object_list,
+        'page_obj': page_obj,
+        'filters': form,
+        'query_string': urlencode(query),
+        'total_matches': len(table),
+        'found_matches': page_obj.paginator.count,
+        'sort_options': SORT_OPTIONS,
+        'page_size_options': PAGE_SIZE_OPTIONS,
+        'outcome_options': [(value, label) for value, (_, label) in OUTCOME_FILTERS.items()] if outcomes else [],
+    }
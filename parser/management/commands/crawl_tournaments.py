@@ -0,0 +1,63 @@
+import os
+import sys
+from django.core.management.base import BaseCommand
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+
+class Command(BaseCommand):
+    help = 'Параллельный сбор котировок нескольких турниров во вкладках одного браузера'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tournaments',
+            nargs='*',
+            help='Ключи турниров из реестра FonTournaments (по умолчанию все)',
+        )
+        parser.add_argument(
+            '--headless',
+            action='store_true',
+            help='Запуск в фоновом режиме (без браузера)',
+        )
+        parser.add_argument(
+            '--max-tabs',
+            type=int,
+            default=None,
+            help='Сколько вкладок грузится одновременно',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['lxml', 'html.parser', 'script'],
+            help='Бэкенд извлечения: lxml, html.parser или script (разбор внутри страницы)',
+        )
+        parser.add_argument(
+            '--no-save',
+            action='store_true',
+            help='Только разбор, без записи в CSV',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from FonCrawler import crawl_tournaments, DEFAULT_MAX_TABS
+            from FonTournaments import get_tournament
+
+            self.stdout.write('Запуск обхода турниров...')
+
+            results = crawl_tournaments(
+                keys=options['tournaments'] or None,
+                headless=options['headless'],
+                max_tabs=options['max_tabs'] or DEFAULT_MAX_TABS,
+                backend=options['backend'],
+                save=not options['no_save'],
+            )
+
+            for key, result in results.items():
+                self.stdout.write(
+                    f"{get_tournament(key)['name']}: событий {result['events']}, новых {result['new']} "
+                    f"({result['state']}, готовность {result['ready_after']:.2f} с, разбор {result['parse_time']:.2f} с)"
+                )
+
+            self.stdout.write(self.style.SUCCESS('Обход турниров завершен успешно!'))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Ошибка при обходе турниров: {e}'))
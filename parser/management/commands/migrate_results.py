@@ -0,0 +1,45 @@
+import os
+import sys
+from django.core.management.base import BaseCommand
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+
+class Command(BaseCommand):
+    help = 'Перевод файлов результатов на колонки исходов res_* (WIN/LOSS убираются из коэффициентов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--league',
+            action='append',
+            help='Ключ турнира из реестра (можно несколько раз), по умолчанию - все',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что изменится, не перезаписывая файлы',
+        )
+
+    def handle(self, *args, **options):
+        from FonTournaments import get_tournament, tournament_keys
+        from FonSettlement import migrate_results_file
+
+        for key in options['league'] or tournament_keys():
+            try:
+                path = get_tournament(key)['results_file']
+                if not os.path.exists(path):
+                    self.stdout.write(f"{key}: файл {path} не найден - пропускаем")
+                    continue
+
+                stats = migrate_results_file(path, dry_run=options['dry_run'])
+                if stats['migrated']:
+                    self.stdout.write(f"{key}: {path} уже переведен ({stats['rows']} строк)")
+                    continue
+
+                self.stdout.write(
+                    f"{key}: {path} - строк {stats['rows']}, очищено ячеек {stats['cleaned']}, "
+                    f"исход основных рынков изменился в {stats['changed']} строках"
+                    f"{' (пробный прогон)' if options['dry_run'] else f', прежняя версия в {path}.bak'}")
+
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Ошибка при переводе результатов {key}: {e}'))
@@ -15,16 +15,50 @@ class Command(BaseCommand):
             action='store_true',
             help='Запуск в фоновом режиме (без браузера)',
         )
+        parser.add_argument(
+            '--replay',
+            metavar='DIR',
+            help='Офлайн-прогон извлечения по сохраненным HTML-снимкам из каталога (без Selenium)',
+        )
+        parser.add_argument(
+            '--snapshot-dir',
+            metavar='DIR',
+            help='Сохранять HTML разобранных страниц в каталог для последующего --replay',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['lxml', 'html.parser', 'script', 'network'],
+            help='Бэкенд извлечения: lxml, html.parser, script (разбор внутри страницы) '
+                 'или network (JSON-ответы линии; --replay читает записанные *.json)',
+        )
 
     def handle(self, *args, **options):
         try:
             # Импортируем ваш парсер КХЛ
             from KhlFonParser import KhlFonBetParser
+            from FonDriverPool import get_driver_pool
+
+            if options['replay']:
+                from FonReplay import replay_odds, replay_feed, format_replay_stats
+
+                self.stdout.write(f"Воспроизведение снимков из {options['replay']}...")
+                parser = KhlFonBetParser(offline=True, backend=options['backend'])
+                if options['backend'] == 'network':
+                    stats = replay_feed(parser, options['replay'])
+                else:
+                    stats = replay_odds(parser, options['replay'])
+                self.stdout.write(format_replay_stats(stats))
+                return
 
             self.stdout.write('Запуск парсера котировок КХЛ...')
 
-            # Создаем экземпляр парсера
-            parser = KhlFonBetParser(headless=options['headless'])
+            # Создаем экземпляр парсера, браузер арендуется из общего пула процесса
+            parser = KhlFonBetParser(
+                headless=options['headless'],
+                driver_pool=get_driver_pool(options['headless'], network_capture=options['backend'] == 'network'),
+                snapshot_dir=options['snapshot_dir'],
+                backend=options['backend'],
+            )
 
             # Запускаем парсинг
             parser.run()
@@ -15,17 +15,60 @@ class Command(BaseCommand):
             action='store_true',
             help='Запуск в фоновом режиме (без браузера)',
         )
+        parser.add_argument(
+            '--replay',
+            metavar='DIR',
+            help='Офлайн-прогон извлечения по сохраненным HTML-снимкам из каталога (без Selenium)',
+        )
+        parser.add_argument(
+            '--snapshot-dir',
+            metavar='DIR',
+            help='Сохранять HTML разобранных страниц в каталог для последующего --replay',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['lxml', 'html.parser', 'script'],
+            help='Бэкенд извлечения: lxml, html.parser или script (разбор внутри страницы)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Сколько дат загружать одновременно (по умолчанию FONBET_RESULTS_WORKERS, не больше размера пула)',
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Загружать все даты заново, не используя кеш результатов',
+        )
 
     def handle(self, *args, **options):
         try:
             # Импортируем ваш парсер результатов КХЛ
             from KhlFonResParser import KhlResultsParser
+            from FonDriverPool import get_driver_pool
+
+            if options['replay']:
+                from FonReplay import replay_results, format_replay_stats
+
+                self.stdout.write(f"Воспроизведение снимков из {options['replay']}...")
+                parser = KhlResultsParser(offline=True, backend=options['backend'])
+                stats = replay_results(parser, options['replay'])
+                self.stdout.write(format_replay_stats(stats))
+                return
 
             # Используем простой текст вместо emoji для Windows
             self.stdout.write('Запуск парсера результатов КХЛ...')
 
-            # Создаем экземпляр парсера
-            parser = KhlResultsParser(headless=options['headless'])
+            # Создаем экземпляр парсера, браузер арендуется из общего пула процесса
+            parser = KhlResultsParser(
+                headless=options['headless'],
+                driver_pool=get_driver_pool(options['headless']),
+                snapshot_dir=options['snapshot_dir'],
+                backend=options['backend'],
+                workers=options['workers'],
+                use_cache=not options['no_cache'],
+            )
 
             # Запускаем парсинг
             parser.run()
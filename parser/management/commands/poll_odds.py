@@ -0,0 +1,69 @@
+import os
+import signal
+import sys
+from django.core.management.base import BaseCommand
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+
+class Command(BaseCommand):
+    help = 'Постоянный опрос линии турниров в одной сессии браузера с интервалом по времени до матчей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tournaments',
+            nargs='*',
+            help='Ключи турниров из реестра FonTournaments (по умолчанию все)',
+        )
+        parser.add_argument(
+            '--headless',
+            action='store_true',
+            help='Запуск в фоновом режиме (без браузера)',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=['lxml', 'html.parser', 'script', 'network'],
+            help='Бэкенд извлечения: lxml, html.parser, script (разбор внутри страницы) '
+                 'или network (ответы линии)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Один цикл опроса и выход',
+        )
+        parser.add_argument(
+            '--max-cycles',
+            type=int,
+            default=None,
+            help='Остановиться после указанного числа циклов',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from FonPoller import OddsPoller
+            from FonDriverPool import close_all_pools
+
+            poller = OddsPoller(
+                keys=options['tournaments'] or None,
+                headless=options['headless'],
+                backend=options['backend'],
+            )
+
+            # Остановка по SIGTERM/SIGINT дожидается конца текущего цикла
+            def stop(signum, frame):
+                self.stdout.write('Остановка опроса после текущего цикла...')
+                poller.stop()
+
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+
+            self.stdout.write(f"Опрос линии: {', '.join(poller.keys)} (состояние в {poller.status_file})")
+            try:
+                status = poller.run(max_cycles=options['max_cycles'], once=options['once'])
+            finally:
+                close_all_pools()
+
+            self.stdout.write(self.style.SUCCESS(f"Опрос завершен, циклов: {status['cycles']}"))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Ошибка при опросе линии: {e}'))
@@ -1,3 +1,338 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from FonAppendCsv import event_key
+from FonNetwork import decode_line_payload, dump_line_payloads, load_line_payloads
+from FonOddsHistory import OddsHistory
+from FonPending import PendingIndex
+from FonSettlement import (WIN, LOSS, PUSH, settle_rows, has_outcome, needs_migration, migrate_results_file,
+                           with_outcome_fields)
+from FonStorage import read_csv, write_csv
+from FonTime import EVENT_TIME_FORMAT, normalize_event_time, resolve_year
 
-# Create your tests here.
+# Записанные ответы линии (бэкенд network): разбор проверяется без браузера и сети
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'line')
+PARSE_TIMESTAMP = '24.10.2025 12:00:00'
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def event_time(timestamp):
+    # Время события в decode_line_payload переводится в локальное
+    return datetime.fromtimestamp(timestamp).strftime("%d.%m.%Y %H:%M")
+
+
+class DecodeLinePayloadTests(unittest.TestCase):
+    def decode(self, name, tournament_ids=None):
+        payloads = load_line_payloads(read_fixture(name))
+        rows = decode_line_payload(payloads, tournament_ids=tournament_ids, parse_timestamp=PARSE_TIMESTAMP)
+        return {row['event_name']: row for row in rows}
+
+    def test_full_packet_with_delta(self):
+        rows = self.decode('khl_feed.jsonl', tournament_ids=[776])
+
+        # Период (parentId) и матч другого сегмента не попадают в строки
+        self.assertEqual(list(rows), ['СКА — ЦСКА', 'Авангард — Металлург Мг'])
+        self.assertEqual(rows['СКА — ЦСКА'], {
+            'parse_timestamp': PARSE_TIMESTAMP,
+            'event_name': 'СКА — ЦСКА',
+            'event_time': event_time(1761319800),
+            # 921 и 923 обновлены дельтой, 922 - из полного пакета
+            'odds_1': '2.15',
+            'odds_x': '4.05',
+            'odds_2': '2.80',
+            'odds_1x': '1.42',
+            'odds_12': '1.25',
+            'odds_x2': '1.70',
+            'fora_1': '-1.5 3.10',
+            'fora_2': '+1.5 1.35',
+            'total_value': '5.5',
+            'total_over': '1.90',
+            'total_under': '1.95',
+        })
+
+    def test_param_from_hundredths(self):
+        row = self.decode('khl_feed.jsonl', tournament_ids=[776])['Авангард — Металлург Мг']
+
+        # Без pt параметр берется из p: фора со знаком, тотал без
+        self.assertEqual(row['fora_1'], '+0 1.80')
+        self.assertEqual(row['fora_2'], '+0 2.00')
+        self.assertEqual(row['total_value'], '5')
+        self.assertEqual((row['total_over'], row['total_under']), ('2.05', '1.75'))
+        self.assertEqual((row['odds_1x'], row['odds_12'], row['odds_x2']), ('', '', ''))
+
+    def test_unknown_tournament_keeps_all_matches(self):
+        rows = self.decode('khl_feed.jsonl', tournament_ids=[99999])
+
+        self.assertEqual(sorted(rows), ['Авангард — Металлург Мг', 'Рубин — Динамо СПб', 'СКА — ЦСКА'])
+        self.assertEqual(rows['Рубин — Динамо СПб']['odds_x'], '4.50')
+
+    def test_legacy_array_snapshot(self):
+        rows = self.decode('nhl_feed_legacy.json', tournament_ids=[129])
+
+        self.assertEqual(rows['Эдмонтон — Монреаль']['event_time'], event_time(1761267600))
+        self.assertEqual((rows['Эдмонтон — Монреаль']['odds_1'], rows['Эдмонтон — Монреаль']['odds_x'],
+                          rows['Эдмонтон — Монреаль']['odds_2']), ('1.85', '4.40', '3.60'))
+        self.assertEqual(rows['Эдмонтон — Монреаль']['fora_1'], '-1.5 2.35')
+        self.assertEqual(rows['Эдмонтон — Монреаль']['fora_2'], '+1.5 1.58')
+        # Линия тотала берется из "меньше", если "больше" в ответе нет
+        self.assertEqual(rows['Эдмонтон — Монреаль']['total_value'], '6.5')
+        self.assertEqual(rows['Эдмонтон — Монреаль']['total_over'], '')
+        self.assertEqual(rows['Эдмонтон — Монреаль']['total_under'], '1.88')
+
+        # Событие без startTime и без коэффициентов
+        self.assertEqual(rows['Даллас — Коламбус']['event_time'], 'Время не найдено')
+        self.assertEqual(rows['Даллас — Коламбус']['odds_1'], '')
+        self.assertEqual(rows['Даллас — Коламбус']['total_value'], '')
+
+
+class LineSnapshotTests(unittest.TestCase):
+    def test_broken_body_does_not_spoil_snapshot(self):
+        with self.assertLogs('FonNetwork', level='WARNING'):
+            payloads = load_line_payloads(read_fixture('khl_feed.jsonl'))
+        self.assertEqual([payload['packetVersion'] for payload in payloads], [61240178, 61240195])
+
+    def test_dump_skips_invalid_bodies(self):
+        bodies = ['{"events": [], "packetVersion": 1}', '<html>502 Bad Gateway</html>', '{"packetVersion": 2}']
+        text = dump_line_payloads(bodies)
+
+        self.assertEqual(len(text.splitlines()), 2)
+        self.assertEqual([payload['packetVersion'] for payload in load_line_payloads(text)], [1, 2])
+
+
+class SettleFrameTests(unittest.TestCase):
+    def settle(self, **fields):
+        row = {'event_name': 'СКА — ЦСКА', 'match_result': '3:2', 'odds_1': '2.10', 'odds_x': '4.05',
+               'odds_2': '2.80', 'total_value': '5', 'total_over': '1.90', 'total_under': '1.95',
+               'fora_1': '-1.5 3.10', 'fora_2': '+1.5 1.35'}
+        row.update(fields)
+        return settle_rows([row])[0]
+
+    def test_win_loss_push(self):
+        row = self.settle()
+
+        self.assertEqual((row['res_1'], row['res_x'], row['res_2']), (WIN, LOSS, LOSS))
+        # Тотал ровно по линии - возврат обеих ставок
+        self.assertEqual((row['res_over'], row['res_under']), (PUSH, PUSH))
+        self.assertEqual((row['res_fora_1'], row['res_fora_2']), (LOSS, WIN))
+
+    def test_extra_time_is_regular_draw(self):
+        self.assertEqual(self.settle(match_result='3:2 OT')['res_x'], WIN)
+        # НХЛ: ничья основного времени в счете, победитель - в названии
+        row = self.settle(event_name='Эдмонтон — Монреаль (Эдмонтон)', match_result='2:2')
+        self.assertEqual((row['res_1'], row['res_x']), (LOSS, WIN))
+
+    def test_missing_odds_stay_unsettled(self):
+        row = self.settle(odds_x='', total_value='', fora_1='3.10')
+
+        self.assertEqual(row['res_x'], '')
+        # Нет линии тотала - берется DEFAULT_TOTAL
+        self.assertEqual((row['res_over'], row['res_under']), (LOSS, WIN))
+        # Фора без параметра не рассчитывается
+        self.assertEqual(row['res_fora_1'], '')
+        # Рынков двойного шанса в строке нет совсем
+        self.assertEqual(row['res_1x'], '')
+
+    def test_unreadable_score(self):
+        row = self.settle(match_result='Отменен')
+        self.assertFalse(has_outcome(row))
+
+
+class MigrateResultsFileTests(unittest.TestCase):
+    LEGACY_ROWS = [
+        {'event_name': 'СКА — ЦСКА', 'event_time': '24.10.2025 19:30', 'odds_1': 'WIN 2.40', 'odds_x': 'LOSS 4.05',
+         'odds_2': 'LOSS 2.80', 'total_value': '5.5', 'total_over': 'WIN 1.90', 'total_under': 'LOSS 1.95',
+         'match_result': '4:2'},
+        {'event_name': 'Рубин — Динамо СПб', 'event_time': '24.10.2025 17:00', 'odds_1': 'LOSS 1.70', 'odds_x': '',
+         'odds_2': 'WIN 4.50', 'total_value': '', 'total_over': '', 'total_under': 'WIN 1.80',
+         'match_result': '1:3'},
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'khl_results_final.csv')
+        write_csv(self.path, list(self.LEGACY_ROWS[0]), self.LEGACY_ROWS)
+
+    def test_migration_keeps_numbers_and_outcomes(self):
+        self.assertTrue(needs_migration(read_csv(self.path)[1]))
+
+        stats = migrate_results_file(self.path)
+
+        self.assertEqual(stats, {'rows': 2, 'cleaned': 8, 'changed': 0, 'migrated': False})
+        fieldnames, rows = read_csv(self.path)
+        self.assertEqual(fieldnames, with_outcome_fields(list(self.LEGACY_ROWS[0])))
+        self.assertFalse(needs_migration(rows))
+        # Коэффициенты остаются теми же числами, без пометок
+        self.assertEqual([(row['odds_1'], row['odds_x'], row['total_under']) for row in rows],
+                         [('2.40', '4.05', '1.95'), ('1.70', '', '1.80')])
+        self.assertEqual([(row['res_1'], row['res_2'], row['res_over'], row['res_under']) for row in rows],
+                         [(WIN, LOSS, WIN, LOSS), (LOSS, WIN, '', WIN)])
+        self.assertEqual(read_csv(f"{self.path}.bak")[1], self.LEGACY_ROWS)
+
+    def test_repeated_migration_is_noop(self):
+        migrate_results_file(self.path)
+        with open(self.path, 'rb') as f:
+            migrated = f.read()
+        os.remove(f"{self.path}.bak")
+
+        stats = migrate_results_file(self.path)
+
+        self.assertTrue(stats['migrated'])
+        self.assertEqual((stats['cleaned'], stats['changed']), (0, 0))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), migrated)
+        self.assertFalse(os.path.exists(f"{self.path}.bak"))
+
+    def test_dry_run_leaves_file(self):
+        stats = migrate_results_file(self.path, dry_run=True)
+
+        self.assertEqual((stats['cleaned'], stats['changed']), (8, 0))
+        self.assertEqual(read_csv(self.path)[1], self.LEGACY_ROWS)
+
+
+class NormalizeEventTimeTests(unittest.TestCase):
+    def test_year_rollover(self):
+        self.assertEqual(normalize_event_time('5 января в 19:00', date(2025, 12, 20)), '05.01.2026 19:00')
+        self.assertEqual(normalize_event_time('28 декабря в 02:30', date(2026, 1, 3)), '28.12.2025 02:30')
+        self.assertEqual(normalize_event_time('Завтра в 02:00', date(2025, 12, 31)), '01.01.2026 02:00')
+        # Год, написанный на странице, не меняется
+        self.assertEqual(normalize_event_time('5 января 2025 в 19:00', date(2025, 12, 20)), '05.01.2025 19:00')
+
+    def test_rollover_boundary(self):
+        # Ровно ROLLOVER_DAYS - тот же год, на день больше - соседний
+        self.assertEqual(resolve_year(1, 1, date(2025, 7, 3)), date(2025, 1, 1))
+        self.assertEqual(resolve_year(1, 1, date(2025, 7, 4)), date(2026, 1, 1))
+        self.assertEqual(resolve_year(3, 7, date(2025, 1, 1)), date(2025, 7, 3))
+        self.assertEqual(resolve_year(4, 7, date(2025, 1, 1)), date(2024, 7, 4))
+
+    def test_february_29(self):
+        self.assertEqual(normalize_event_time('29 февраля в 21:00', date(2025, 10, 24)), '29.02.2024 21:00')
+        self.assertEqual(normalize_event_time('29 февраля в 21:00', date(2027, 12, 1)), '29.02.2028 21:00')
+        self.assertEqual(resolve_year(29, 2, date(2024, 2, 28)), date(2024, 2, 29))
+        # В 2100 году 29 февраля нет: ближайшие - 2096 и 2104
+        self.assertEqual(resolve_year(29, 2, date(2100, 6, 1)), date(2104, 2, 29))
+
+    def test_unknown_text_is_kept(self):
+        self.assertEqual(normalize_event_time('Перерыв', date(2025, 10, 24)), 'Перерыв')
+
+
+class PendingIndexRecoveryTests(unittest.TestCase):
+    FIELDNAMES = ['event_name', 'event_time', 'odds_1']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.odds_path = os.path.join(directory.name, 'khl_odds.csv')
+        self.results_path = os.path.join(directory.name, 'khl_results_final.csv')
+        self.index_path = os.path.join(directory.name, 'khl_pending.json')
+
+        now = datetime.now()
+        recent = (now - timedelta(hours=5)).strftime(EVENT_TIME_FORMAT)
+        self.pending_row = {'event_name': 'СКА — ЦСКА', 'event_time': recent, 'odds_1': '2.10'}
+        settled_row = {'event_name': 'Рубин — Динамо СПб', 'event_time': recent, 'odds_1': '1.70'}
+        expired_row = {'event_name': 'Авангард — Металлург Мг',
+                       'event_time': (now - timedelta(days=5)).strftime(EVENT_TIME_FORMAT), 'odds_1': '1.80'}
+        write_csv(self.odds_path, self.FIELDNAMES, [self.pending_row, settled_row, expired_row])
+        # Победитель овертайма в названии не мешает узнать рассчитанное событие
+        write_csv(self.results_path, self.FIELDNAMES + ['match_result'],
+                  [dict(settled_row, event_name='Рубин — Динамо СПб (Рубин)', match_result='2:2')])
+
+    def open_index(self):
+        return PendingIndex(self.index_path).open(self.odds_path, self.results_path,
+                                                  lambda row: bool(row.get('match_result')))
+
+    def assertRebuilt(self, events):
+        self.assertEqual(list(events), [event_key(self.pending_row)])
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['events'], events)
+
+    def test_partial_file_is_rebuilt(self):
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            f.write('{"fieldnames": ["event_name"], "events": {"СКА')
+
+        with self.assertLogs('FonPending', level='WARNING'):
+            events = self.open_index()
+        self.assertRebuilt(events)
+
+    def test_wrong_structure_is_rebuilt(self):
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump({'fieldnames': self.FIELDNAMES, 'events': []}, f)
+
+        with self.assertLogs('FonPending', level='WARNING'):
+            events = self.open_index()
+        self.assertRebuilt(events)
+
+    def test_update_keeps_corrupt_file(self):
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            f.write('{"events": ')
+
+        with self.assertLogs('FonPending', level='WARNING'):
+            self.assertEqual(PendingIndex(self.index_path).add([self.pending_row]), 0)
+        # Поврежденный файл не заменяется пустым индексом и перестраивается при следующем открытии
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '{"events": ')
+        with self.assertLogs('FonPending', level='WARNING'):
+            self.assertRebuilt(self.open_index())
+
+
+class OddsHistoryTests(unittest.TestCase):
+    FIELDS = ['odds_1', 'odds_x', 'odds_2']
+    EVENT = {'event_name': 'СКА — ЦСКА', 'event_time': '24.10.2025 19:30'}
+    # Состояния рынков по опросам; ключевой кадр пишется после каждых двух дельт (keyframe_interval=2)
+    POLLS = [
+        ('2025-10-24T10:00:00', ('2.10', '4.05', '2.80')),
+        ('2025-10-24T11:00:00', ('2.15', '4.05', '2.80')),
+        ('2025-10-24T12:00:00', ('2.15', '4.05', '2.80')),
+        ('2025-10-24T13:00:00', ('2.20', '4.00', '2.75')),
+        ('2025-10-24T14:00:00', ('2.20', '4.10', '2.75')),
+        ('2025-10-24T19:40:00', ('', '', '')),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'khl_odds_history.jsonl')
+        self.key = event_key(self.EVENT)
+
+    def history(self):
+        return OddsHistory(self.path, fields=self.FIELDS, keyframe_interval=2)
+
+    def state(self, odds):
+        return dict(zip(self.FIELDS, odds))
+
+    def record_polls(self, history):
+        return [history.record([dict(self.EVENT, **self.state(odds))], ts) for ts, odds in self.POLLS]
+
+    def test_rebuild_from_keyframes_and_deltas(self):
+        # Неизменившийся опрос в 12:00 не пишется
+        self.assertEqual(self.record_polls(self.history()), [1, 1, 0, 1, 1, 1])
+        with open(self.path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([bool(record.get('kf')) for record in records], [True, False, False, True, False])
+        self.assertEqual(records[1]['odds'], {'odds_1': '2.15'})
+
+        history = self.history()
+        self.assertEqual(history.keys(), [self.key])
+        for ts, odds in self.POLLS:
+            self.assertEqual(history.odds_at(self.key, ts), self.state(odds))
+        self.assertEqual(history.odds_at(self.key, '2025-10-24T12:30:00'), self.state(self.POLLS[1][1]))
+        self.assertIsNone(history.odds_at(self.key, '2025-10-24T09:00:00'))
+        # Закрывающие котировки - последние до начала матча, а не пустая линия после него
+        self.assertEqual(history.closing_odds(self.key), self.state(self.POLLS[4][1]))
+        self.assertEqual([state for _, state in history.iter_states(self.key)],
+                         [self.state(odds) for ts, odds in self.POLLS if ts != '2025-10-24T12:00:00'])
+
+    def test_catches_up_with_other_writer(self):
+        first, second = self.history(), self.history()
+        first.record([dict(self.EVENT, **self.state(self.POLLS[0][1]))], self.POLLS[0][0])
+        second.record([dict(self.EVENT, **self.state(self.POLLS[1][1]))], self.POLLS[1][0])
+
+        # Дельта считается от записи второго писателя, а не от устаревшего состояния в памяти
+        self.assertEqual(first.record([dict(self.EVENT, **self.state(self.POLLS[1][1]))], self.POLLS[2][0]), 0)
+        self.assertEqual(first.odds_at(self.key), self.state(self.POLLS[1][1]))
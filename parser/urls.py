@@ -6,4 +6,5 @@ app_name = 'parser'
 urlpatterns = [
     path('', views.control_panel, name='control_panel'),
     path('run/', views.run_parser, name='run_parser'),
+    path('poll-status/', views.poll_status, name='poll_status'),
 ]
\ No newline at end of file
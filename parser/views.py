@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-import subprocess
+from django.core.management import call_command
+import io
 import threading
 import json
 import os
@@ -66,10 +67,10 @@ def run_parser(request):
 
             # Определяем команду в зависимости от типа парсера
             command_map = {
-                'nhl_odds': ['python', 'manage.py', 'parse_nhl_odds'],
-                'nhl_results': ['python', 'manage.py', 'parse_nhl_results'],
-                'khl_odds': ['python', 'manage.py', 'parse_khl_odds'],
-                'khl_results': ['python', 'manage.py', 'parse_khl_results'],
+                'nhl_odds': 'parse_nhl_odds',
+                'nhl_results': 'parse_nhl_results',
+                'khl_odds': 'parse_khl_odds',
+                'khl_results': 'parse_khl_results',
             }
 
             if parser_type not in command_map:
@@ -77,32 +78,24 @@ def run_parser(request):
 
             command = command_map[parser_type]
 
-            # Добавляем флаг headless если нужно (инвертируем логику)
-            if not headless:  # Если галочка НЕ установлена - показываем браузер
-                command.append('--headless')
-            # Если headless=True, то не добавляем флаг (по умолчанию в парсерах headless=True)
+            # Флаг headless инвертирован: если галочка НЕ установлена - передаем --headless
+            command_headless = not headless
 
-            print(f"Выполняемая команда: {' '.join(command)}")
+            print(f"Выполняемая команда: {command}{' --headless' if command_headless else ''}")
 
+            # Команда выполняется в процессе сервера, чтобы парсеры арендовали
+            # уже прогретые браузеры из общего пула, а не запускали Chrome заново.
             # Запускаем в отдельном потоке чтобы не блокировать ответ
             def run_parser_thread():
                 try:
-                    result = subprocess.run(
-                        command,
-                        capture_output=True,
-                        text=True,
-                        cwd='.',  # Рабочая директория проекта
-                        encoding='utf-8',  # Явно указываем кодировку
-                        errors='ignore'  # Игнорируем ошибки кодировки
-                    )
+                    stdout = io.StringIO()
+                    call_command(command, headless=command_headless, stdout=stdout, stderr=stdout)
 
-                    print(f"Парсер {parser_type} завершил работу с кодом: {result.returncode}")
+                    print(f"Парсер {parser_type} завершил работу")
 
-                    if result.stdout:
-                        print(f"Парсер {parser_type} stdout: {result.stdout}")
-
-                    if result.stderr:
-                        print(f"Парсер {parser_type} stderr: {result.stderr}")
+                    output = stdout.getvalue()
+                    if output:
+                        print(f"Парсер {parser_type} stdout: {output}")
 
                 except Exception as e:
                     print(f"Ошибка при запуске парсера {parser_type}: {e}")
@@ -120,4 +113,14 @@ def run_parser(request):
             print(f"Ошибка при запуске парсера: {e}")
             return JsonResponse({'status': 'error', 'message': str(e)})
 
-    return JsonResponse({'status': 'error', 'message': 'Only POST requests allowed'})
\ No newline at end of file
+    return JsonResponse({'status': 'error', 'message': 'Only POST requests allowed'})
+
+
+def poll_status(request):
+    """Состояние демона опроса линии (poll_odds): последний цикл, его тайминги и время следующего опроса"""
+    from FonPoller import read_status
+
+    status = read_status()
+    if status is None:
+        return JsonResponse({'status': 'error', 'message': 'Опрос линии не запускался'})
+    return JsonResponse({'status': 'success', 'poller': status})